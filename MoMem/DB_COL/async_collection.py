@@ -0,0 +1,180 @@
+"""
+async_collection.py
+Created on 2026-10-18 8:30:00 PM
+By: Will Selke
+
+This file contains the asyncio version of the collection class. Every method is a coroutine which runs the blocking
+Collection method on the executors of its AsyncDatabase, so the event loop is never blocked by file I/O or decoding.
+The number of operations running at once on a collection is capped, the others wait for their turn on the event loop.
+Cancelling an operation which has not started yet drops it, an operation already running on a thread is finished but
+its result is discarded.
+"""
+import asyncio
+import functools
+
+from MoMem.MoNode.monode import MoNode
+from MoMem.MoNode.blob_ref import BlobRef
+from MoMem.config.config import SCAN_BATCH_SIZE, SCAN_PREFETCH
+from MoMem.DB_COL.collection import Collection, BulkResult
+from MoMem.DB_COL.monode_cache import get_cache
+
+
+class AsyncCollection:
+    def __init__(self, collection: Collection, database, max_in_flight):
+        """
+        YOU SHOULD NOT BE CALLING THIS FUNCTION, USE THE AsyncDatabase.get_collection() FUNCTION or the
+        AsyncDatabase.create_collection() FUNCTION
+
+        :param collection: the Collection
+        :param database: the AsyncDatabase (its executors are used)
+        :param max_in_flight: max number of operations running at once on the collection
+        """
+        self.sync = collection
+        self.name = collection.name
+        self.database = database
+        self.max_in_flight = max_in_flight
+        self.__semaphore = None
+
+    async def _run(self, function, *args, decode=False, **kwargs):
+        """
+        Run a blocking function on an executor once the collection has a free slot
+        :param function: the function
+        :param decode: run it on the decode executor instead of the io executor
+        :return: the result of the function
+        """
+        # created here so it belongs to the running event loop
+        if self.__semaphore is None:
+            self.__semaphore = asyncio.Semaphore(self.max_in_flight)
+
+        executor = self.database.decode_executor if decode else self.database.io_executor
+        async with self.__semaphore:
+            return await asyncio.get_running_loop().run_in_executor(executor,
+                                                                    functools.partial(function, *args, **kwargs))
+
+    """========================================DOCUMENTS FUNCTIONS========================================="""
+
+    async def ls_documents(self, details=False):
+        """
+        see Collection.ls_documents
+        """
+        return await self._run(self.sync.ls_documents, details)
+
+    async def save_monode(self, monode: MoNode, id=None, overwrite=False, indexed=True):
+        """
+        see Collection.save_monode
+        """
+        return await self._run(self.sync.save_monode, monode, id, overwrite, indexed)
+
+    async def save_file_as_monode(self, file_name, file_data, id=None, desc="", notes={}, tags=[], modi=None,
+                                  overwrite=False, indexed=True):
+        """
+        see Collection.save_file_as_monode
+        """
+        return await self._run(self.sync.save_file_as_monode, file_name, file_data, id, desc, notes, tags, modi,
+                               overwrite, indexed)
+
+    async def get_monode(self, id, fields=None):
+        """
+        see Collection.get_monode, a whole monode is read on the io executor and decoded on the decode executor (a
+        monode in the cache of the collection and the fields read one by one are left to Collection.get_monode)
+        """
+        if fields is not None or get_cache(self.sync.database, self.name) is not None:
+            return await self._run(self.sync.get_monode, id, fields)
+
+        raw = await self._run(self.sync.read_raw, id)
+        monode = await self._run(MoNode.unpickle, raw, decode=True)
+        if isinstance(monode.data, BlobRef):
+            monode = await self._run(self.sync.resolve_monode, monode)
+        return monode
+
+    async def del_monode(self, id):
+        """
+        see Collection.del_monode
+        """
+        return await self._run(self.sync.del_monode, id)
+
+    async def save_many(self, monodes, ids=None, overwrite=False, indexed=True):
+        """
+        see Collection.save_many (the files are written by the io executor)
+        """
+        return await self._run(self.sync.save_many, monodes, ids, overwrite, indexed, workers=1)
+
+    async def get_many(self, ids, fields=None):
+        """
+        see Collection.get_many, every monode is read concurrently within the cap of the collection
+        """
+        ids = list(ids)
+        results = await asyncio.gather(*(self.get_monode(id, fields) for id in ids), return_exceptions=True)
+        return [BulkResult(id, None, result) if isinstance(result, Exception) else BulkResult(id, result, None)
+                for id, result in zip(ids, results)]
+
+    async def delete_many(self, ids):
+        """
+        see Collection.delete_many
+        """
+        return await self._run(self.sync.delete_many, ids, workers=1)
+
+    async def scan(self, batch_size=SCAN_BATCH_SIZE, projection=None, prefetch=SCAN_PREFETCH, token=None):
+        """
+        see Collection.scan, an async generator of ScanBatch, the next batches are still read ahead by the threads of
+        the scan. A cancelled scan waits for the batch being read before closing the scan (and its threads)
+        """
+        batches = await self._run(self.sync.scan, batch_size, projection, prefetch, token)
+        pending = None
+        try:
+            while True:
+                # shielded so the thread reading the batch is still known once the scan is cancelled
+                pending = asyncio.ensure_future(self._run(next, batches, None))
+                batch = await asyncio.shield(pending)
+                if batch is None:
+                    return
+                yield batch
+        finally:
+            if pending is not None and not pending.done():
+                # a generator cannot be closed while a thread runs it
+                await asyncio.gather(pending, return_exceptions=True)
+            batches.close()
+
+    """========================================QUERY FUNCTIONS========================================="""
+
+    async def scan_ids(self, since=None, until=None, reverse=False, limit=None):
+        """
+        see Collection.scan_ids
+        """
+        return await self._run(self.sync.scan_ids, since, until, reverse, limit)
+
+    async def find(self, filter=None, projection=None, sort=None, limit=None):
+        """
+        see Collection.find
+        """
+        return await self._run(self.sync.find, filter, projection, sort, limit)
+
+    async def find_by(self, field, value):
+        """
+        see Collection.find_by
+        """
+        return await self._run(self.sync.find_by, field, value)
+
+    async def find_tags(self, all=None, any=None, none=None):
+        """
+        see Collection.find_tags
+        """
+        return await self._run(self.sync.find_tags, all, any, none)
+
+    async def range(self, field, lo=None, hi=None, reverse=False, limit=None):
+        """
+        see Collection.range
+        """
+        return await self._run(self.sync.range, field, lo, hi, reverse, limit)
+
+    async def explain(self, filter=None, sort=None, limit=None):
+        """
+        see Collection.explain
+        """
+        return await self._run(self.sync.explain, filter, sort, limit)
+
+    async def create_index(self, field, type=None, background=False, workers=None):
+        """
+        see Collection.create_index
+        """
+        return await self._run(self.sync.create_index, field, type, background, workers)
@@ -0,0 +1,134 @@
+"""
+async_database.py
+Created on 2026-10-18 8:15:00 PM
+By: Will Selke
+
+This file contains the asyncio version of the database class. An AsyncDatabase owns the bounded executors used by its
+AsyncCollections, one for the blocking file I/O and one for decoding the monodes (a ProcessPoolExecutor can be given
+for the decoding to run it outside of the GIL).
+"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from .database import Database
+from .async_collection import AsyncCollection
+
+IO_WORKERS = 16
+DECODE_WORKERS = 4
+MAX_IN_FLIGHT = 32
+
+
+class AsyncDatabase:
+    def __init__(self, database: Database, io_executor=None, decode_executor=None, max_in_flight=MAX_IN_FLIGHT):
+        """
+        U SHOULD NOT BE CALLING THIS FUNCTION, USE THE AsyncDatabase.get_database() FUNCTION or the
+        AsyncDatabase.create_database() FUNCTION
+
+        :param database: the Database
+        :param io_executor: executor for the file I/O (default a pool of IO_WORKERS threads)
+        :param decode_executor: executor for the decoding (default a pool of DECODE_WORKERS threads)
+        :param max_in_flight: max number of operations running at once on each collection
+        """
+        self.sync = database
+        self.name = database.name
+        self.max_in_flight = max_in_flight
+        self.__own_executors = []
+        if io_executor is None:
+            io_executor = ThreadPoolExecutor(IO_WORKERS, thread_name_prefix="MoMem-io")
+            self.__own_executors.append(io_executor)
+        if decode_executor is None:
+            decode_executor = ThreadPoolExecutor(DECODE_WORKERS, thread_name_prefix="MoMem-decode")
+            self.__own_executors.append(decode_executor)
+        self.io_executor = io_executor
+        self.decode_executor = decode_executor
+        self.__collections = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """
+        Shut down the executors created by the AsyncDatabase (the ones given to it are left running)
+        """
+        for executor in self.__own_executors:
+            executor.shutdown(wait=False)
+        self.__own_executors = []
+
+    @staticmethod
+    async def __run(function, *args):
+        """
+        run a blocking function of Database on the default executor of the loop
+        """
+        return await asyncio.get_running_loop().run_in_executor(None, functools.partial(function, *args))
+
+    @staticmethod
+    async def create_database(name, **options):
+        """
+        Create a database
+        :param name: name of the database
+        :param options: see AsyncDatabase.__init__
+        """
+        return AsyncDatabase(await AsyncDatabase.__run(Database.create_database, name), **options)
+
+    @staticmethod
+    async def ls_databases():
+        """
+        list all databases
+        """
+        return await AsyncDatabase.__run(Database.ls_databases)
+
+    @staticmethod
+    async def get_database(name, **options):
+        """
+        Get a database object
+        :param name: name of the database
+        :param options: see AsyncDatabase.__init__
+        :return database: object if it exists, None if it does not
+        """
+        database = await AsyncDatabase.__run(Database.get_database, name)
+        return None if database is None else AsyncDatabase(database, **options)
+
+    async def delete(self):
+        """
+        Delete the database
+        """
+        await self.__run(self.sync.delete)
+        self.close()
+
+    """========================================COLLECTIONS FUNCTIONS========================================="""
+    async def create_collection(self, name, engine=None, dedup=False, layout=None, ids=None):
+        """
+        Create a collection in the database
+        :param name: name of the collection
+        :param engine: how the monodes are stored (see Database.create_collection)
+        :param dedup: whether to deduplicate the data of the monodes (see Database.create_collection)
+        :param layout: layout of the files (see Database.create_collection)
+        :param ids: how the ids are generated (see Database.create_collection)
+        """
+        collection = await self.__run(self.sync.create_collection, name, engine, dedup, layout, ids)
+        self.__collections[name] = AsyncCollection(collection, self, self.max_in_flight)
+        return self.__collections[name]
+
+    async def get_collection(self, name):
+        """
+        Get a collection object, the same AsyncCollection (and its cap of operations) is returned for a name
+        :param name: name of the collection
+        :return collection: object if it exists, None if it does not
+        """
+        if name not in self.__collections:
+            collection = await self.__run(self.sync.get_collection, name)
+            if collection is None:
+                return None
+            self.__collections.setdefault(name, AsyncCollection(collection, self, self.max_in_flight))
+        return self.__collections[name]
+
+    async def ls_collections(self):
+        """
+        List all collections in the database
+        :return: list of collections
+        """
+        return await self.__run(self.sync.ls_collections)
@@ -0,0 +1,226 @@
+"""
+catalog.py
+Created on 2026-10-18 6:40:00 PM
+By: Will Selke
+
+This file contains the catalog of a collection, a metadata file of fixed-width records (id, name, type, size, modi and
+tag count) with one record per document. Listing the documents with their details is a single sequential read of the
+catalog instead of opening every document. A record is updated in place when its document is saved again and marked
+free (then reused) when its document is deleted.
+
+The ids longer than ID_BYTES are kept out of the records: their record holds a hash of the id and the id itself is
+appended to a second metadata file. The slots are allocated and freed while holding a file lock so two processes writing
+the same collection never take the same slot or free a slot the other one reused.
+"""
+import hashlib
+import struct
+import threading
+from datetime import datetime
+
+from MoMem.MoNode.monode import PADDING_LENGTH
+from MoMem.basic_file_op import base_write_meta, base_write_meta_at, base_read_meta, base_read_meta_from, \
+    base_read_meta_at, base_append_meta, base_lock_meta
+
+# name of the metadata file
+CATALOG = "catalog"
+
+# name of the metadata file of the ids too long for a record and of the file locked while allocating or freeing a slot
+LONG_IDS = "catalog.ids"
+CATALOG_LOCK = "catalog.lock"
+
+# max length in bytes of an id kept in its record, name and type are at most PADDING_LENGTH characters of up to 4 bytes
+# in utf-8
+ID_BYTES = 64
+
+# a record of a longer id holds this byte (never the first byte of an utf-8 string) followed by the sha1 of the id
+LONG_ID = b"\xff"
+
+# sha1 of the id, length of the id (followed by the id)
+LONG_ID_RECORD = struct.Struct("<20sI")
+
+# live flag, id, name, type, size, modi timestamp, tag count
+RECORD = struct.Struct(f"<B{ID_BYTES}s{4 * PADDING_LENGTH}s{4 * PADDING_LENGTH}sQdI")
+
+# the fields of a document needed by a record
+CATALOG_FIELDS = ["name", "type", "size", "modi", "tags"]
+
+# the slots read so far by (database, collection): [dict of id to slot, list of free slots, number of slots]
+_slots = {}
+# the long ids read so far by (database, collection): [dict of sha1 to id, number of bytes read]
+_long_ids = {}
+_slots_lock = threading.RLock()
+
+
+def _id_field(id):
+    """
+    the id as stored in a record
+    """
+    id = id.encode()
+    return id if len(id) <= ID_BYTES else LONG_ID + hashlib.sha1(id).digest()
+
+
+def pack(id, fields):
+    """
+    Make the record of a document
+    :param id: id of the document
+    :param fields: dict of MoNode field to value (at least CATALOG_FIELDS)
+    :return: the record
+    """
+    modi = fields["modi"].timestamp() if isinstance(fields["modi"], datetime) else float("nan")
+    return RECORD.pack(1, _id_field(id), fields["name"].encode(), fields["type"].encode(), fields["size"], modi,
+                       len(fields["tags"] or ()))
+
+
+def _unpack(record, long_ids):
+    """
+    read a record
+    :param long_ids: dict of sha1 to id of the ids too long for a record
+    :return: (live, id, dict of details)
+    """
+    live, id, name, type, size, modi, tags = RECORD.unpack(record)
+    # the sha1 may end with zeros
+    id = long_ids[id[1:21]] if id[:1] == LONG_ID else id.rstrip(b"\0").decode()
+    return live, id, {"id": id, "name": name.rstrip(b"\0").decode(), "type": type.rstrip(b"\0").decode(),
+                      "size": size, "modi": None if modi != modi else datetime.fromtimestamp(modi), "tag_count": tags}
+
+
+class Catalog:
+    def __init__(self, database, collection):
+        """
+        Create the catalog object of a collection
+        :param database: name of the database
+        :param collection: name of the collection
+        """
+        self.database = database
+        self.collection = collection
+
+    def exists(self):
+        """
+        :return: True if the catalog file exists
+        """
+        return base_read_meta_from(CATALOG, 0, self.database, self.collection) is not None
+
+    def __long_ids(self):
+        """
+        Get the ids too long for a record, only the ids appended since the last call are read
+        :return: [dict of sha1 to id, number of bytes read]
+        """
+        with _slots_lock:
+            long_ids = _long_ids.setdefault((self.database, self.collection), [{}, 0])
+            data = base_read_meta_from(LONG_IDS, long_ids[1], self.database, self.collection)
+            if data is None:
+                # the catalog was rebuilt
+                long_ids[:] = [{}, 0]
+                data = base_read_meta_from(LONG_IDS, 0, self.database, self.collection) or b""
+
+            offset = 0
+            while offset + LONG_ID_RECORD.size <= len(data):
+                digest, length = LONG_ID_RECORD.unpack_from(data, offset)
+                end = offset + LONG_ID_RECORD.size + length
+                if end > len(data):
+                    # partially written last id
+                    break
+                long_ids[0][digest] = data[offset + LONG_ID_RECORD.size:end].decode()
+                offset = end
+            long_ids[1] += offset
+            return long_ids
+
+    def __slots(self):
+        """
+        Get the slots, only the records appended since the last call are read
+        :return: [dict of id to slot, list of free slots, number of slots]
+        """
+        with _slots_lock:
+            long_ids = self.__long_ids()[0]
+            slots = _slots.setdefault((self.database, self.collection), [{}, [], 0])
+            data = base_read_meta_from(CATALOG, slots[2] * RECORD.size, self.database, self.collection)
+            if data is None:
+                # the catalog was rebuilt
+                slots[:] = [{}, [], 0]
+                data = base_read_meta_from(CATALOG, 0, self.database, self.collection) or b""
+
+            for n in range(len(data) // RECORD.size):
+                live, id, _ = _unpack(data[n * RECORD.size:(n + 1) * RECORD.size], long_ids)
+                if live:
+                    slots[0][id] = slots[2]
+                else:
+                    slots[1].append(slots[2])
+                slots[2] += 1
+            return slots
+
+    def add(self, id, record):
+        """
+        Add or update the record of a document
+        :param id: id of the document
+        :param record: the record (see pack)
+        """
+        # the slots appended or reused by another process are seen once the lock is held
+        with _slots_lock, base_lock_meta(CATALOG_LOCK, self.database, self.collection):
+            slots = self.__slots()
+            slot = slots[0].get(id)
+            while slot is None and slots[1]:
+                slot = slots[1].pop()
+                if base_read_meta_at(CATALOG, slot * RECORD.size, 1, self.database, self.collection) != b"\0":
+                    slot = None
+            if slot is None:
+                slot = slots[2]
+
+            field = _id_field(id)
+            if field[:1] == LONG_ID and field[1:] not in self.__long_ids()[0]:
+                # the id is written before its record
+                id_bytes = id.encode()
+                base_append_meta(LONG_IDS, LONG_ID_RECORD.pack(field[1:], len(id_bytes)) + id_bytes,
+                                 self.database, self.collection)
+                self.__long_ids()
+            base_write_meta_at(CATALOG, slot * RECORD.size, record, self.database, self.collection)
+            slots[0][id] = slot
+            slots[2] = max(slots[2], slot + 1)
+
+    def remove(self, id):
+        """
+        Free the record of a document
+        :param id: id of the document
+        """
+        # the slot may have been freed and reused by another process, it is checked once the lock is held
+        with _slots_lock, base_lock_meta(CATALOG_LOCK, self.database, self.collection):
+            slots = self.__slots()
+            slot = slots[0].pop(id, None)
+            if slot is None:
+                return
+            record = base_read_meta_at(CATALOG, slot * RECORD.size, RECORD.size, self.database, self.collection)
+            live, slot_id, _ = _unpack(record, self.__long_ids()[0])
+            if not live or slot_id != id:
+                return
+            base_write_meta_at(CATALOG, slot * RECORD.size, b"\0", self.database, self.collection)
+            slots[1].append(slot)
+
+    def list(self):
+        """
+        Read every record
+        :return: list of dict (id, name, type, size, modi, tag_count) in the order of the catalog
+        """
+        data = base_read_meta(CATALOG, self.database, self.collection) or b""
+        long_ids = self.__long_ids()[0]
+        output = []
+        for n in range(len(data) // RECORD.size):
+            live, _, details = _unpack(data[n * RECORD.size:(n + 1) * RECORD.size], long_ids)
+            if live:
+                output.append(details)
+        return output
+
+    def rebuild(self, documents):
+        """
+        Write the catalog from scratch
+        :param documents: iterable of (id, dict of MoNode field to value)
+        """
+        records = []
+        long_ids = []
+        for id, fields in documents:
+            records.append(pack(id, fields))
+            if len(id.encode()) > ID_BYTES:
+                long_ids.append(LONG_ID_RECORD.pack(_id_field(id)[1:], len(id.encode())) + id.encode())
+        with _slots_lock, base_lock_meta(CATALOG_LOCK, self.database, self.collection):
+            base_write_meta(LONG_IDS, b"".join(long_ids), self.database, self.collection)
+            base_write_meta(CATALOG, b"".join(records), self.database, self.collection)
+            _slots.pop((self.database, self.collection), None)
+            _long_ids.pop((self.database, self.collection), None)
@@ -6,12 +6,70 @@ By: Will Selke
 This file contains the collection class which is a python representation of a collection. It contains the functions to
 create, delete, and list documents.
 """
+import copy
+import io
 import os
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 
 from MoMem import file_to_monode
-from MoMem.config.config import ROOT_DIR
+from MoMem.config.config import CHUNK_SIZE, BULK_WORKERS, DEDUP_MIN_SIZE, COMPRESS_MIN_SIZE, ID_SCHEME, \
+    SCAN_BATCH_SIZE, SCAN_PREFETCH
 from MoMem.MoNode.monode import MoNode
-from MoMem.basic_file_op import base_write, base_del, base_read
+from MoMem.MoNode import monode_pickle, monode_id
+from MoMem.MoNode.large_object import LargeObject, LargeObjectReader, is_large_data, iter_chunks
+from MoMem.MoNode.blob_ref import BlobRef
+from MoMem.MoNode.compression import check_policy, compress_fields
+from MoMem.basic_file_op import base_write_chunk, base_read_chunk, base_del_chunks
+from MoMem.DB_COL.collection_meta import collection_lock, read_meta, write_meta
+from MoMem.DB_COL import catalog, collection_stats
+from MoMem.DB_COL.monode_cache import MoNodeCache, get_cache, set_cache
+from MoMem.index.index import normalize_field, read_registry, write_registry
+from MoMem.index.hash_index import HashIndex
+from MoMem.index.tag_index import TagIndex
+from MoMem.index.ordered_index import OrderedIndex
+from MoMem.index import query
+from MoMem.index import index_build
+from MoMem.storage.engine import get_engine, close_engine
+from MoMem.storage import wal
+from MoMem.storage.blob_store import BlobStore
+from MoMem.storage.backend import get_backend
+
+# name of the metadata file holding whether the collection deduplicates its data (see set_dedup)
+DEDUP = "dedup"
+
+# name of the metadata file holding the compression policy of the collection (see set_compression)
+COMPRESSION = "compression"
+
+# name of the metadata file holding how the ids of the collection are generated (see set_id_scheme)
+IDS = "ids"
+ID_SCHEMES = ("random", "time")
+
+# random bytes of the key of the chunks of a large object (see LargeObject.key)
+CHUNK_KEY_BYTES = 6
+
+# random bytes of the name of an index built again (see create_index)
+INDEX_NAME_BYTES = 4
+
+# result of one item of a bulk operation, error is None if it succeeded
+BulkResult = namedtuple("BulkResult", ["id", "value", "error"])
+
+# batch of a scan, token resumes the scan after the batch (see Collection.scan)
+ScanBatch = namedtuple("ScanBatch", ["results", "token"])
+
+# the index classes by type
+INDEX_TYPES = {
+    HashIndex.TYPE: HashIndex,
+    TagIndex.TYPE: TagIndex,
+    OrderedIndex.TYPE: OrderedIndex
+}
+
+# the index type used when create_index is not given one
+DEFAULT_INDEX_TYPES = {
+    "tags": TagIndex.TYPE,
+    "size": OrderedIndex.TYPE,
+    "modi": OrderedIndex.TYPE
+}
 
 
 class Collection:
@@ -23,94 +81,672 @@ class Collection:
         Create a collection object
         :param name: name of the collection
         :param database: name of the database
-        :param path: path to the collection
+        :param path: path to the collection (see storage.backend location)
         """
         self.name = name
         self.database = database
         self.path = path
 
-        # set up the metadata file
-        # create the data folder
-        data_p = os.path.join(self.path, "data")
-        if not os.path.exists(data_p):
-            os.mkdir(data_p)
+        # the storage engine chosen when the collection was created (see Database.create_collection)
+        self.__engine = get_engine(self.database, self.name)
+        self.__blobs = BlobStore(self.database)
+
+        self.__catalog = catalog.Catalog(self.database, self.name)
+        if not self.__catalog.exists():
+            self.rebuild_catalog()
+
+        self.__stats = collection_stats.CollectionStats(self.database, self.name)
+        if not self.__stats.exists():
+            self.rebuild_stats()
 
     def delete(self):
         """
         Delete the collection
         """
         # check if the collection is empty
-        if len(os.listdir(self.path + "/data")) > 0:
+        if self.__engine.count() > 0:
             raise OSError("The collection is not empty")
         else:
-            for root, dirs, files in os.walk(self.path, topdown=False):
-                for file in files:
-                    os.remove(os.path.join(root, file))
-                for dir in dirs:
-                    os.rmdir(os.path.join(root, dir))
-
-            # delete the collection folder
-            os.rmdir(self.path)
+            close_engine(self.database, self.name)
+            # delete the collection folder and everything in it
+            get_backend().rmtree(f"{self.database}/{self.name}")
 
             del self
 
     """========================================DOCUMENTS FUNCTIONS========================================="""
 
-    def ls_documents(self):
+    def ls_documents(self, details=False):
         """
         List all documents in the collection (OS FUNCTION)
-        :return: list of documents raw name
+        :param details: read the details of the documents from the catalog of the collection (no document is opened)
+        :return: list of documents raw name, or list of dict (id, name, type, size, modi, tag_count) if details
+        """
+        if details:
+            return self.__catalog.list()
+        return self.__engine.list()
+
+    def scan_ids(self, since=None, until=None, reverse=False, limit=None):
+        """
+        List the ids of the monodes created in a period, from the time ids alone (see set_id_scheme), no monode is
+        opened and the ids which are not time ids are skipped. The storage engines bisect their sorted time ids (see
+        engine.time_ids)
+        :param since: datetime or seconds since the epoch, the first creation time included (None for no bound)
+        :param until: datetime or seconds since the epoch, the creation time excluded (None for no bound)
+        :param reverse: newest first
+        :param limit: max number of ids
+        :return: list of ids sorted by creation time
+        """
+        # the ids sort by creation time, the bounds are compared to their prefix
+        lo = None if since is None else monode_id.time_bound(since)
+        hi = None if until is None else monode_id.time_bound(until)
+        ids = self.__engine.time_ids(lo, hi)
+        if reverse:
+            ids.reverse()
+        return ids if limit is None else ids[:limit]
+
+    def scan(self, batch_size=SCAN_BATCH_SIZE, projection=None, prefetch=SCAN_PREFETCH, token=None):
+        """
+        Iterate over the monodes of the collection by batches, the next batches are read and decoded by a pool of
+        threads while the caller works on the current one, at most prefetch batches are read ahead so the memory is
+        bounded. The monodes are read in the order of their ids, which are listed when the scan starts: the monodes
+        saved meanwhile are not read and the ones deleted meanwhile are skipped
+        :param batch_size: number of monodes of a batch
+        :param projection: only read these fields (see get_monode), None for the whole monodes
+        :param prefetch: number of batches read ahead (0 to read a batch only when it is asked for)
+        :param token: the token of a batch of a previous scan, the scan resumes after that batch
+        :return: generator of ScanBatch(results, token), results is a list of BulkResult(id, monode or dict of fields,
+        None), or BulkResult(id, None, error) if it failed
+        """
+        if batch_size < 1:
+            raise ValueError("The batch size must be at least 1")
+        if prefetch < 0:
+            raise ValueError("The prefetch must not be negative")
+        if not get_backend().exists(f"{self.database}/{self.name}"):
+            raise FileNotFoundError("The collection does not exist")
+
+        # the token is the last id of its batch
+        ids = sorted(id for id in self.__engine.list() if token is None or id > token)
+        batches = [ids[i:i + batch_size] for i in range(0, len(ids), batch_size)]
+
+        def read(batch):
+            results = self.__map(lambda id: self.__get_monode(id, projection, False), batch, 1)
+            # deleted since the ids were listed
+            return [result for result in results if not isinstance(result.error, FileNotFoundError)]
+
+        return self.__scan(batches, read, prefetch)
+
+    @staticmethod
+    def __scan(batches, read, prefetch):
+        """
+        Read the batches of a scan ahead of the caller (see scan)
+        :param batches: list of lists of ids
+        :param read: function (list of ids) -> list of BulkResult
+        :param prefetch: number of batches read ahead
+        :return: generator of ScanBatch
+        """
+        if prefetch == 0:
+            for batch in batches:
+                yield ScanBatch(read(batch), batch[-1])
+            return
+
+        pool = ThreadPoolExecutor(max_workers=prefetch)
+        pending = deque()
+        try:
+            for batch in batches:
+                pending.append((pool.submit(read, batch), batch[-1]))
+                if len(pending) > prefetch:
+                    future, token = pending.popleft()
+                    yield ScanBatch(future.result(), token)
+            while pending:
+                future, token = pending.popleft()
+                yield ScanBatch(future.result(), token)
+        finally:
+            # the caller stopped early, the batches not started yet are dropped
+            for future, _ in pending:
+                future.cancel()
+            pool.shutdown(wait=False)
+
+    def rebuild_catalog(self):
         """
-        return os.listdir(self.path + "/data")
+        Rebuild the catalog of the collection from the documents (to recover a lost or damaged catalog)
+        """
+        with collection_lock(self.database, self.name):
+            self.__catalog.rebuild((id, self.get_monode(id, fields=catalog.CATALOG_FIELDS))
+                                   for id in self.__engine.list())
 
-    def save_monode(self, monode: MoNode, id=None, overwrite=False, indexed=False):
+    def stats(self):
+        """
+        Report the statistics of the collection, kept up to date by every save and delete (no document is opened)
+        :return: dict with count, bytes (total size of the data), avg_size, types (dict of file type to number of
+        documents) and tags (dict of tag to number of documents)
+        """
+        return self.__stats.read()
+
+    def rebuild_stats(self):
+        """
+        Count the statistics of the collection again from the documents (done when the statistics file is missing or
+        damaged, or when a crash tore a monode, see replay)
+        """
+        with collection_lock(self.database, self.name):
+            self.__stats.rebuild(self.get_monode(id, fields=collection_stats.STATS_FIELDS)
+                                 for id in self.__engine.list())
+
+    @property
+    def dedup(self):
+        """
+        Whether the data of the monodes saved in the collection is deduplicated (see set_dedup)
+        """
+        return read_meta(DEDUP, self.database, self.name, False)
+
+    def set_dedup(self, enabled=True):
+        """
+        Store the data of the monodes saved from now on once in the blob store of the database, keyed by its hash, the
+        monodes of every deduplicated collection of the database holding the same data share it (the data smaller than
+        config.DEDUP_MIN_SIZE is kept in the monode)
+        :param enabled: whether to deduplicate
+        """
+        write_meta(DEDUP, enabled, self.database, self.name)
+
+    def dedup_stats(self):
+        """
+        Report the savings of the blob store of the database (see BlobStore.stats)
+        :return: dict with blobs, references, stored_bytes, logical_bytes, saved_bytes and ratio
+        """
+        return self.__blobs.stats()
+
+    def blob_refs(self):
+        """
+        Count the references of the monodes of the collection to the blob store (see BlobStore.rebuild)
+        :return: dict of hex digest to count
+        """
+        counts = {}
+        for id in self.__engine.list():
+            try:
+                blob = self.__blob_of(id)
+            except FileNotFoundError:
+                # deleted meanwhile
+                continue
+            if blob is not None:
+                counts[blob.hex] = counts.get(blob.hex, 0) + 1
+        return counts
+
+    @property
+    def compression(self):
+        """
+        The compression policy of the collection, None if the monodes are stored uncompressed (see set_compression)
+        """
+        return read_meta(COMPRESSION, self.database, self.name)
+
+    def set_compression(self, codec="zlib", fields=("data",), level=None, min_size=COMPRESS_MIN_SIZE):
+        """
+        Compress the fields of the monodes saved from now on (the monodes already saved are read as they are), the data
+        of the files already compressed (png, jpg, mp4, zip... see config.file_type.compressed_types) is never
+        compressed and a field is only stored compressed if it gets smaller
+        :param codec: "zlib", "lzma" or "bz2", None to stop compressing
+        :param fields: the fields to compress ("desc", "notes" and / or "data")
+        :param level: the compression level of the codec (None for its default)
+        :param min_size: the bytes and str fields smaller than this are not compressed
+        """
+        if codec is None:
+            write_meta(COMPRESSION, None, self.database, self.name)
+            return
+        check_policy(codec, fields, level)
+        write_meta(COMPRESSION, {"codec": codec, "fields": list(fields), "level": level, "min_size": min_size},
+                   self.database, self.name)
+
+    @property
+    def id_scheme(self):
+        """
+        How the ids of the monodes saved without an id are generated, "random" or "time" (see set_id_scheme)
+        """
+        return read_meta(IDS, self.database, self.name, ID_SCHEME)
+
+    def set_id_scheme(self, scheme):
+        """
+        Choose how the ids of the monodes saved without an id are generated from now on
+        :param scheme: "random" (random characters, checked against the stored monodes) or "time" (sorted by creation
+        time and never colliding so nothing is checked, see monode_id.py and scan_ids)
+        """
+        if scheme not in ID_SCHEMES:
+            raise ValueError(f"Unknown id scheme {scheme}, expected one of {ID_SCHEMES}")
+        write_meta(IDS, scheme, self.database, self.name)
+
+    def migrate_layout(self, layout="sharded", batch_size=None):
+        """
+        Move the files of the collection to another layout (see Database.create_collection) while it stays usable, the
+        saves and deletes only wait while a batch of files is moved (only the "files" storage engine has layouts)
+        :param layout: "sharded" or "flat"
+        :param batch_size: number of files moved by batch (default file_engine.MIGRATE_BATCH)
+        :return: the number of moved files
+        """
+        if not hasattr(self.__engine, "migrate"):
+            raise ValueError(f"The {self.__engine.TYPE} storage engine has no layout")
+        if batch_size is None:
+            return self.__engine.migrate(layout)
+        return self.__engine.migrate(layout, batch_size)
+
+    def compact(self):
+        """
+        Give back the disk space of the overwritten and deleted monodes (the "segments" storage engine also compacts on
+        its own in the background, the "files" engine only drops the deleted ids from its journal of the time ids)
+        """
+        self.__engine.compact()
+
+    def convert_format(self, version=monode_pickle.VERSION):
+        """
+        Rewrite the monodes of the collection stored in another format (see monode_pickle.VERSION), including the ones
+        pickled by python pickle. Run it OFFLINE, while no other process uses the collection: the rewrites are not in
+        the write-ahead log, the storage engine is flushed to the disk at the end. The compressed fields are compressed
+        again with the compression policy of the collection.
+        :param version: the format to convert to (1 or 2)
+        :return: the number of converted monodes
+        """
+        compression = self.compression
+        converted = 0
+        with collection_lock(self.database, self.name):
+            for id in self.__engine.list():
+                raw = self.__engine.read(id, check=False)
+                if monode_pickle.format_version(raw) == version:
+                    continue
+                monode = MoNode.unpickle(raw)
+                stored = monode if compression is None else compress_fields(monode, compression)
+                self.__engine.write(id, monode_pickle.dump_chunks(stored, version), overwrite=True, check=False)
+                self.__invalidate(id)
+                converted += 1
+            self.__engine.sync()
+        return converted
+
+    def save_monode(self, monode: MoNode, id=None, overwrite=False, indexed=True):
         """
         Add a monode to the collection
+        If the monode data is a file-like object or an iterator of bytes it is stored as a large object, in chunks of
+        CHUNK_SIZE bytes next to the monode, and is read back with open_data()
 
         :param monode: monode to be added
         :param id: id of the monode when saved to file (if None, a random id will be generated)
         :param overwrite: whether to overwrite the monode if it already exists\
-        :param indexed: whether to index the monode to the collection
+        :param indexed: whether to update the indexes of the collection (only skip it if the indexes are rebuilt after)
+        :return: the id of the monode
+        """
+        result = self.save_many([monode], [id], overwrite, indexed, workers=1)[0]
+        if result.error is not None:
+            raise result.error
+        return result.id
+
+    def save_many(self, monodes, ids=None, overwrite=False, indexed=True, workers=BULK_WORKERS):
         """
+        Add many monodes to the collection, the collection is checked once, the files are written by a pool of workers
+        and the catalog and the indexes are updated once for the whole batch
+
+        :param monodes: list of monodes
+        :param ids: list of ids (None for a random id), the same length as monodes (if None, random ids are generated)
+        :param overwrite: whether to overwrite the monodes which already exist
+        :param indexed: whether to update the indexes of the collection
+        :param workers: number of threads writing the files
+        :return: list of BulkResult(id, id, None), or BulkResult(id, None, error) for the monodes which failed
+        """
+        monodes = list(monodes)
+        ids = [None] * len(monodes) if ids is None else list(ids)
+        if len(ids) != len(monodes):
+            raise ValueError(f"{len(ids)} ids for {len(monodes)} monodes")
+        if not get_backend().exists(f"{self.database}/{self.name}"):
+            raise FileNotFoundError("The collection does not exist")
+
+        indexes = self.__indexes() if indexed else []
+        index_fields = self.__index_fields(indexes)
+        dedup = self.dedup
+        compression = self.compression
+        time_ids = self.id_scheme == "time"
+
+        with collection_lock(self.database, self.name):
+            results = self.__map(lambda item: self.__write_monode(item[0], item[1], overwrite, index_fields, dedup,
+                                                                  compression, time_ids),
+                                 list(zip(ids, monodes)), workers)
+
+            done = [result.value for result in results if result.error is None]
+            for id, fields, old, record in done:
+                self.__catalog.add(id, record)
+                self.__invalidate(id)
+            self.__stats.update([fields for _, fields, _, _ in done], [old for _, _, old, _ in done if old is not None])
+            for index in indexes:
+                index.remove_many([(id, old) for id, _, old, _ in done if old is not None])
+                index.add_many([(id, fields) for id, fields, _, _ in done])
+            index_build.journal(self.database, self.name, [id for id, _, _, _ in done])
+
+        return [BulkResult(r.value[0], r.value[0], None) if r.error is None else r for r in results]
+
+    def __write_monode(self, id, monode: MoNode, overwrite, index_fields, dedup=False, compression=None,
+                       time_ids=False):
+        """
+        Write the files of a monode (see save_many)
+        :return: (id, dict of the catalog and index fields, dict of the old index and statistics fields or None, catalog
+        record)
+        """
+        # the time ids are unique, nothing to look up
+        if id is None and time_ids:
+            id = MoNode.generate_time_id()
+
         # in the case of no id provided, keep generating ids until a unique one is found
-        if id is None:
+        elif id is None:
             id = MoNode.generate_id()
-            while os.path.exists(os.path.join(self.path + "/data", id)):
+            while self.__engine.exists(id):
                 id = MoNode.generate_id()
 
-        # save the MoNode
-        base_write(id, monode.pickle(), self.database, self.name, overwrite=overwrite)
+        elif not overwrite and self.__engine.exists(id):
+            raise FileExistsError(f"File {id} already exists")
+
+        # the old values have to be taken out of the indexes and the statistics
+        old = None
+        if overwrite and self.__engine.exists(id):
+            old = self.__read_old(id, index_fields)
+
+        # the blob of the monode being overwritten loses a reference once the new monode is written
+        old_blob = self.__blob_of(id) if overwrite and self.__engine.exists(id) else None
+
+        # the chunks get a new key, the chunks of the monode being overwritten are only dropped once it is written
+        data = monode.data
+        if is_large_data(monode.data):
+            monode = self.__save_chunks(id, monode)
+        elif dedup and not isinstance(monode.data, (LargeObject, BlobRef)) and len(monode.data) >= DEDUP_MIN_SIZE:
+            monode = copy.copy(monode)
+            monode.data = self.__blobs.put(monode.data)
+
+        # save the MoNode, the chunks are streamed to the file so the data is never copied (unless it is compressed)
+        stored = monode if compression is None else compress_fields(monode, compression)
+        chunks = list(monode_pickle.dump_chunks(stored))
+        try:
+            self.__logged(wal.PUT, id, chunks,
+                          lambda: self.__engine.write(id, chunks, overwrite=overwrite, check=False))
+        except Exception:
+            if isinstance(monode.data, BlobRef):
+                self.__blobs.release(monode.data)
+            elif isinstance(monode.data, LargeObject) and monode.data is not data:
+                base_del_chunks(monode.data.chunk_name(id), self.database, self.name)
+            raise
+        if overwrite:
+            self.__drop_chunks(id, monode.data)
+        if old_blob is not None:
+            self.__blobs.release(old_blob)
+
+        fields = {f: getattr(monode, f) for f in set(index_fields) | set(catalog.CATALOG_FIELDS)}
+        return id, fields, old, catalog.pack(id, fields)
+
+    def __logged(self, op, id, chunks, write):
+        """
+        Apply a write to the storage engine once it is in the write-ahead log of the database (see wal.py)
+        :param op: wal.PUT or wal.DELETE
+        :param id: id of the monode
+        :param chunks: the pickled monode (for PUT)
+        :param write: function applying the write
+        """
+        log = wal.get_wal(self.database)
+        if log.mode == "none":
+            return write()
+        if not log.recovered:
+            raise RuntimeError(f"The write-ahead log of {self.database} was not replayed, open the database with "
+                               f"Database.get_database")
+
+        end = log.append(op, self.name, id, chunks)
+        try:
+            # the writers waiting at the same time share one fsync
+            if log.mode == "strict":
+                log.commit(end)
+            return write()
+        finally:
+            log.done()
+
+    def replay(self, records):
+        """
+        Apply the writes of the collection left in the write-ahead log by a crash (Should only be called by the database
+        class), the indexes and the statistics are rebuilt if a monode torn by the crash hides its old values, otherwise
+        the statistics count the replayed writes like save_many and delete_many (a crash between a write and its count
+        leaves that write uncounted, see rebuild_stats)
+        :param records: list of (op, id, pickled monode) in the order of the log
+        """
+        indexes = self.__indexes()
+        index_fields = self.__index_fields(indexes)
+        torn = False
+        added = []
+        removed = []
+
+        with collection_lock(self.database, self.name):
+            for op, id, payload in records:
+                old = None
+                if self.__engine.exists(id):
+                    try:
+                        old = self.__read_old(id, index_fields)
+                    except Exception:
+                        torn = True
+
+                fields = None
+                if op == wal.PUT:
+                    self.__engine.write(id, payload, overwrite=True, check=False)
+                    monode = MoNode.unpickle(payload)
+                    # the chunks of the monode it overwrote may be left by the crash
+                    self.__drop_chunks(id, monode.data)
+                    fields = {f: getattr(monode, f) for f in set(index_fields) | set(catalog.CATALOG_FIELDS)}
+                    self.__catalog.add(id, catalog.pack(id, fields))
+                else:
+                    if self.__engine.exists(id):
+                        self.__engine.delete(id)
+                    base_del_chunks(id, self.database, self.name)
+                    self.__catalog.remove(id)
+                self.__invalidate(id)
+
+                for index in indexes:
+                    if old is not None:
+                        index.remove_many([(id, old)])
+                    if fields is not None:
+                        index.add_many([(id, fields)])
+                if old is not None:
+                    removed.append(old)
+                if fields is not None:
+                    added.append(fields)
+            if not torn:
+                self.__stats.update(added, removed)
+
+        if torn:
+            for field, settings in read_registry(self.database, self.name).items():
+                self.create_index(field, settings["type"])
+            self.rebuild_stats()
+
+    @staticmethod
+    def __map(function, items, workers):
+        """
+        Run function on every item with a pool of threads, an error only fails its own item
+        :param function: function (item) -> value
+        :param items: list of items, the first element of an item (or the item itself) is its id
+        :param workers: number of threads
+        :return: list of BulkResult(id, value, error) in the order of the items
+        """
+        def run(item):
+            try:
+                return BulkResult(item[0] if isinstance(item, tuple) else item, function(item), None)
+            except Exception as e:
+                return BulkResult(item[0] if isinstance(item, tuple) else item, None, e)
+
+        if workers <= 1 or len(items) <= 1:
+            return [run(item) for item in items]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(run, items))
+
+    def __save_chunks(self, id, monode: MoNode):
+        """
+        Store the data of a monode as a large object
+        :param id: id of the monode
+        :param monode: the monode with a file-like / iterator data
+        :return: a copy of the monode with the LargeObject reference as data
+        """
+        large_object = LargeObject(CHUNK_SIZE, 0, 0, os.urandom(CHUNK_KEY_BYTES).hex())
+        for chunk in iter_chunks(monode.data, CHUNK_SIZE):
+            base_write_chunk(large_object.chunk_name(id), large_object.chunks, chunk, self.database, self.name)
+            large_object.size += len(chunk)
+            large_object.chunks += 1
+
+        monode = copy.copy(monode)
+        monode.data = large_object
+        monode.size = large_object.size
+        return monode
+
+    def __drop_chunks(self, id, data):
+        """
+        Delete the chunks of a monode which its data does not reference (the chunks of the monode it overwrote)
+        :param id: id of the monode
+        :param data: the data of the monode written
+        """
+        if not isinstance(data, LargeObject):
+            base_del_chunks(id, self.database, self.name)
+        # the chunks without a key are the folder itself
+        elif data.key is not None:
+            base_del_chunks(id, self.database, self.name, keep=data.key)
 
     def save_file_as_monode(self, file_name, file_data, id=None, desc="", notes={}, tags=[], modi=None, overwrite=False,
-                            indexed=False):
+                            indexed=True):
         """
         Save a file as a monode
         :param indexed:
         :param overwrite:
         :param file_name: name of the file
-        :param file_data: data of the file
+        :param file_data: data of the file (bytes, or a file-like object / iterator of bytes to store it as a large object)
         :param id: id of the monode when saved to file (if None, a random id will be generated)
         :param desc: description of the file
         :param notes: other details as dictionary
         :param tags: tags of the file
         :param modi: date the file was created or last modified
         :param overwrite: whether to overwrite the monode if it already exists
-        :param indexed: whether to index the monode
+        :param indexed: whether to update the indexes of the collection
+        :return: the id of the monode
         """
         # create a monode
         monode = file_to_monode(file_name, file_data, desc, notes, tags)
 
         # save the monode
-        self.save_monode(monode, id, overwrite, indexed)
+        return self.save_monode(monode, id, overwrite, indexed)
 
-    def get_monode(self, id):
+    def get_monode(self, id, fields=None):
         """
-        Get a monode from the collection
+        Get a monode from the collection, through the cache of the collection if it has one (see enable_cache)
         :param id: id of the monode
+        :param fields: only read these fields (see monode_pickle.MONODE_FIELDS), the other fields are never read from
+        disk, "notes.<key>" only decodes one key of the notes (the output then has notes with only the keys found)
+        :return: the monode, or a dict of field name to value if fields is given
+        """
+        return self.__get_monode(id, fields, True)
+
+    def get_many(self, ids, fields=None, workers=BULK_WORKERS):
+        """
+        Get many monodes from the collection, the collection is checked once and the files are read by a pool of workers
+        :param ids: list of ids
+        :param fields: only read these fields (see get_monode)
+        :param workers: number of threads reading the files
+        :return: list of BulkResult(id, monode or dict of fields, None), or BulkResult(id, None, error) if it failed
+        """
+        if not get_backend().exists(f"{self.database}/{self.name}"):
+            raise FileNotFoundError("The collection does not exist")
+        return self.__map(lambda id: self.__get_monode(id, fields, False), list(ids), workers)
+
+    def __get_monode(self, id, fields, check):
+        """
+        Get a monode (see get_monode)
+        :param check: check that the database and the collection exist
+        """
+        cache = get_cache(self.database, self.name)
+        if cache is None:
+            return self.__read_monode(id, fields, check)
+
+        key = (self.database, self.name, id)
+        if fields is None or "data" in fields:
+            monode = cache.get(key)
+            if monode is None:
+                version = cache.version
+                monode = self.__read_monode(id, None, check)
+                cache.put(key, monode, version)
+
+            # the cached monode must not be changed by the caller
+            monode = copy.copy(monode)
+            monode.notes = copy.deepcopy(monode.notes)
+            monode.tags = copy.deepcopy(monode.tags)
+            if fields is None:
+                return monode
+            return query.project({f: getattr(monode, f) for f in monode_pickle.MONODE_FIELDS}, fields)
+
+        meta = cache.get(key, meta=True)
+        if meta is None:
+            version = cache.version
+            meta = self.__read_monode(id, [f for f in monode_pickle.MONODE_FIELDS if f != "data"], check)
+            cache.put(key, meta, version, meta=True)
+        return copy.deepcopy(query.project(meta, fields))
+
+    def read_raw(self, id):
+        """
+        Read the pickled monode without decoding it (see MoNode.unpickle)
+        :param id: id of the monode
+        :return: the pickled monode
+        """
+        return self.__engine.read(id)
+
+    def resolve_monode(self, monode):
+        """
+        Replace the reference to deduplicated data of a monode decoded from read_raw by the data
+        :param monode: the monode (see MoNode.unpickle)
         :return: the monode
         """
-        monode = base_read(id, self.database, self.name)
-        return MoNode.unpickle(monode)
+        if isinstance(monode.data, BlobRef):
+            monode.data = self.__blobs.get(monode.data)
+        return monode
+
+    def __read_monode(self, id, fields=None, check=True):
+        """
+        Read a monode from disk (see get_monode)
+        """
+        if fields is None:
+            return self.resolve_monode(MoNode.unpickle(self.__engine.read(id, check=check)))
+
+        with self.__engine.open(id, check=check) as reader:
+            output = monode_pickle.load_fields(reader.read_at, fields)
+        if isinstance(output.get("data"), BlobRef):
+            output["data"] = self.__blobs.get(output["data"])
+        return output
+
+    def __read_old(self, id, index_fields):
+        """
+        Read the fields of a stored monode which are taken out of the indexes and the statistics when it is overwritten
+        or deleted
+        :return: dict of MoNode field to value
+        """
+        fields = sorted(set(index_fields) | set(collection_stats.STATS_FIELDS))
+        try:
+            return self.__read_monode(id, fields, check=False)
+        except ValueError:
+            # stored with the old pickle format, which cannot be read field by field
+            monode = self.__read_monode(id, None, check=False)
+            return {f: getattr(monode, f) for f in fields}
+
+    def __blob_of(self, id):
+        """
+        The blob referenced by a stored monode
+        :return: the BlobRef, None if the data of the monode is not deduplicated
+        """
+        try:
+            with self.__engine.open(id, check=False) as reader:
+                if monode_pickle.load_type(reader.read_at, "data") is not BlobRef:
+                    return None
+                return monode_pickle.load_fields(reader.read_at, ["data"])["data"]
+        except ValueError:
+            # stored with the old pickle format
+            return None
+
+    def open_data(self, id):
+        """
+        Open the data of a monode as a seekable read only file-like object, large objects are streamed chunk by chunk
+        :param id: id of the monode
+        :return: file-like object
+        """
+        data = self.get_monode(id, fields=["data"])["data"]
+        if isinstance(data, LargeObject):
+            return LargeObjectReader(data, lambda index: base_read_chunk(data.chunk_name(id), index, self.database,
+                                                                         self.name))
+        return io.BytesIO(data)
 
     def del_monode(self, id):
         """
@@ -119,18 +755,237 @@ class Collection:
         :param name: name of the file
         :param collection: collection to delete from
         """
-        base_del(id, self.database, self.name)
+        result = self.delete_many([id], workers=1)[0]
+        if result.error is not None:
+            raise result.error
+
+    def delete_many(self, ids, workers=BULK_WORKERS):
+        """
+        Delete many monodes from the collection, the files are deleted by a pool of workers and the catalog and the
+        indexes are updated once for the whole batch
+        :param ids: list of ids
+        :param workers: number of threads deleting the files
+        :return: list of BulkResult(id, None, None), or BulkResult(id, None, error) for the monodes which failed
+        """
+        indexes = self.__indexes()
+        index_fields = self.__index_fields(indexes)
+
+        def delete(id):
+            # the old values have to be taken out of the indexes and the statistics
+            old = self.__read_old(id, index_fields)
+            blob = self.__blob_of(id)
+            self.__logged(wal.DELETE, id, [], lambda: self.__engine.delete(id))
+            base_del_chunks(id, self.database, self.name)
+            if blob is not None:
+                self.__blobs.release(blob)
+            return old
+
+        with collection_lock(self.database, self.name):
+            results = self.__map(delete, list(ids), workers)
+
+            done = [(result.id, result.value) for result in results if result.error is None]
+            for id, _ in done:
+                self.__catalog.remove(id)
+                self.__invalidate(id)
+            self.__stats.update(removed=[old for _, old in done])
+            for index in indexes:
+                index.remove_many(done)
+            index_build.journal(self.database, self.name, [id for id, _ in done])
+
+        return [BulkResult(r.id, None, r.error) for r in results]
+
+    """========================================CACHE FUNCTIONS========================================="""
+    def enable_cache(self, max_bytes, meta_max_bytes=None):
+        """
+        Give the collection its own cache of decoded monodes (for every Collection object of this collection in the
+        process), see monode_cache.set_cache for a process wide cache
+        :param max_bytes: max total size of the cached full monodes
+        :param meta_max_bytes: max total size of the cached metadata-only entries (default 1/8 of max_bytes)
+        """
+        set_cache(MoNodeCache(max_bytes, meta_max_bytes), self.database, self.name)
+
+    def disable_cache(self):
+        """
+        Remove the cache of the collection
+        """
+        set_cache(None, self.database, self.name)
+
+    def cache_stats(self):
+        """
+        Get the counters of the cache used by the collection
+        :return: dict with the entries, bytes, hits, misses and evictions of the full and meta pools, None if no cache
+        """
+        cache = get_cache(self.database, self.name)
+        return None if cache is None else cache.stats()
+
+    def __invalidate(self, id):
+        """
+        Drop a document from the cache
+        """
+        cache = get_cache(self.database, self.name)
+        if cache is not None:
+            cache.invalidate((self.database, self.name, id))
 
     """========================================INDEXING FUNCTIONS========================================="""
-    def create_index(self, field, type=None):
+    def create_index(self, field, type=None, background=False, workers=None):
+        """
+        create an index for a collection using field as the key, the index is built over the current documents and is
+        then kept up to date by save_monode / del_monode (building an index again rebuilds it, the queries use the old
+        index until the new one is built)
+        the documents are read by a pool of worker processes while the collection stays usable, the index is only
+        registered (and used by the queries) once the build is done
+        :param field: the field to index (a key of the notes, "color" or "notes.color", or name, type, size, modi, desc,
+        tags)
+        :param type: type of index (see INDEX_TYPES, default "inverted" for tags, "ordered" for size and modi and "hash"
+        for the rest)
+        :param background: whether to return at once with the IndexBuildJob (progress, eta, cancel, wait) instead of
+        waiting for the build
+        :param workers: number of worker processes (default the number of cpus for a large collection, see
+        index_build.POOL_MIN_DOCUMENTS, 0 to read on the build thread)
+        :return: the IndexBuildJob
+        """
+        field = normalize_field(field)
+        type = type or DEFAULT_INDEX_TYPES.get(field, HashIndex.TYPE)
+        if type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type {type}")
+        # an index built again is written under a new name, the registry is swapped to it once it is built
+        name = field
+        if field in read_registry(self.database, self.name):
+            name = f"{field}~{os.urandom(INDEX_NAME_BYTES).hex()}"
+        index = INDEX_TYPES[type](self.database, self.name, field, name=name)
+
+        job = index_build.IndexBuildJob(self.database, self.name, index, workers, self.__open_index).start()
+        if not background:
+            job.wait()
+            if job.error is not None:
+                raise job.error
+        return job
+
+    def index_jobs(self):
         """
-        create an index for a collection using field as the key
-        :param collection: the collection to index
-        :param field: the field to index
-        :param type: type of index
+        Get the index builds running on the collection
+        :return: list of IndexBuildJob
         """
-        # get all current documents
-        documents = self.ls_documents()
+        return index_build.running_jobs(self.database, self.name)
 
-        # do this on a different thread as it may take a while
-        # TODO IMPLEMENT THIS ON A SEPERATE THREAD
+    def drop_index(self, field):
+        """
+        delete the index of a field
+        :param field: the indexed field
+        """
+        field = normalize_field(field)
+        with collection_lock(self.database, self.name):
+            registry = read_registry(self.database, self.name)
+            if field not in registry:
+                raise ValueError(f"There is no index on {field}")
+
+            self.__open_index(field, registry.pop(field)).drop()
+            write_registry(registry, self.database, self.name)
+
+    def ls_indexes(self):
+        """
+        List the indexes of the collection
+        :return: dict of indexed field to the index settings
+        """
+        return read_registry(self.database, self.name)
+
+    def find_by(self, field, value):
+        """
+        Find the documents where field is equal to value using the index of the field
+        :param field: the indexed field
+        :param value: the value to look for
+        :return: sorted list of ids
+        """
+        field = normalize_field(field)
+        registry = read_registry(self.database, self.name)
+        if field not in registry or registry[field]["type"] != HashIndex.TYPE:
+            raise ValueError(f"There is no hash index on {field}")
+
+        return self.__open_index(field, registry[field]).find(value)
+
+    def find_tags(self, all=None, any=None, none=None):
+        """
+        Find the documents by tags using the inverted tag index (see create_index("tags"))
+        e.g. find_tags(all=["toffu", "picture"], none=["draft"])
+
+        :param all: the documents must have every one of these tags
+        :param any: the documents must have at least one of these tags
+        :param none: the documents must not have any of these tags
+        :return: sorted list of ids
+        """
+        registry = read_registry(self.database, self.name)
+        if registry.get("tags", {}).get("type") != TagIndex.TYPE:
+            raise ValueError("There is no inverted index on tags")
+
+        with collection_lock(self.database, self.name):
+            return self.__open_index("tags", registry["tags"]).find(all, any, none, self.ls_documents)
+
+    def range(self, field, lo=None, hi=None, reverse=False, limit=None):
+        """
+        Find the documents where lo <= field <= hi using the ordered index of the field (see create_index("modi"))
+        e.g. range("modi", datetime.now() - timedelta(days=1)) or range("size", reverse=True, limit=100)
+
+        :param field: the indexed field
+        :param lo: lowest value (None for no bound)
+        :param hi: highest value (None for no bound)
+        :param reverse: from the highest value to the lowest
+        :param limit: max number of ids
+        :return: list of ids in the order of the field
+        """
+        field = normalize_field(field)
+        registry = read_registry(self.database, self.name)
+        if registry.get(field, {}).get("type") != OrderedIndex.TYPE:
+            raise ValueError(f"There is no ordered index on {field}")
+
+        with collection_lock(self.database, self.name):
+            return self.__open_index(field, registry[field]).range(lo, hi, reverse, limit)
+
+    """========================================QUERY FUNCTIONS========================================="""
+    def find(self, filter=None, projection=None, sort=None, limit=None):
+        """
+        Find the documents matching a filter, the indexes of the collection are used when they can be (see explain)
+        e.g. find({"tags": "toffu", "size": {"$gte": 1000}}, projection=["name"], sort=("modi", -1), limit=10)
+
+        :param filter: Mongo like filter over name, type, size, modi, desc, tags and notes.<key> (see index.query)
+        :param projection: the MoNode fields to return (None for every field, including data)
+        :param sort: field, (field, 1 / -1) or list of them
+        :param limit: max number of documents
+        :return: list of dict with the id and the projected fields
+        """
+        return query.execute(self, filter or {}, projection, sort, limit)
+
+    def explain(self, filter=None, sort=None, limit=None):
+        """
+        Show how find would run a query without running it
+        :param filter: the filter
+        :param sort: the sort
+        :param limit: max number of documents
+        :return: dict describing the plan (plan: hash / inverted / ordered / scan)
+        """
+        return query.plan(filter or {}, self.ls_indexes(), sort, limit, lambda c: query.estimate(self, c))
+
+    def __open_index(self, field, settings):
+        """
+        Create the index object of a registry entry
+        :param field: the indexed field
+        :param settings: the settings stored in the registry
+        :return: the index object
+        """
+        settings = dict(settings)
+        return INDEX_TYPES[settings.pop("type")](self.database, self.name, field, **settings)
+
+    def __indexes(self):
+        """
+        Open every index of the collection
+        :return: list of index objects
+        """
+        return [self.__open_index(field, settings) for field, settings in read_registry(self.database, self.name).items()]
+
+    @staticmethod
+    def __index_fields(indexes):
+        """
+        The MoNode fields needed to update the indexes
+        :param indexes: list of index objects
+        :return: list of MoNode fields
+        """
+        return sorted({f for index in indexes for f in index.fields})
@@ -0,0 +1,52 @@
+"""
+collection_meta.py
+Created on 2026-10-18 3:40:00 PM
+By: Will Selke
+
+This file contains the helpers to store python objects in the metadata files of a collection (indexes, catalog...) and
+the lock which serializes the updates of those files inside the process.
+"""
+import pickle
+import threading
+
+from MoMem.basic_file_op import base_read_meta, base_write_meta
+
+__locks = {}
+__locks_lock = threading.Lock()
+
+
+def read_meta(name, database, collection, default=None):
+    """
+    Read a python object from a metadata file
+    :param name: name of the metadata file
+    :param database: name of the database
+    :param collection: name of the collection
+    :param default: returned if the metadata file does not exist
+    :return: the object
+    """
+    data = base_read_meta(name, database, collection)
+    if data is None:
+        return default
+    return pickle.loads(data)
+
+
+def write_meta(name, obj, database, collection):
+    """
+    Write a python object to a metadata file
+    :param name: name of the metadata file
+    :param obj: the object
+    :param database: name of the database
+    :param collection: name of the collection
+    """
+    base_write_meta(name, pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL), database, collection)
+
+
+def collection_lock(database, collection):
+    """
+    Get the lock of a collection, hold it while reading and writing back a metadata file
+    :param database: name of the database
+    :param collection: name of the collection
+    :return: threading.RLock (the same one for every Collection object of the collection)
+    """
+    with __locks_lock:
+        return __locks.setdefault((database, collection), threading.RLock())
@@ -0,0 +1,119 @@
+"""
+collection_stats.py
+Created on 2026-10-19 3:10:00 AM
+By: Will Selke
+
+This file contains the statistics of a collection, counters kept up to date by every save and delete of the collection
+(the number of documents, the total size of their data, the number of documents of every file type and of every tag)
+and stored in a metadata file of the collection. Reading them never opens a document.
+
+A collection may be written by several processes, so the counters are read from the file every time (a small file) and
+an update reads and writes it back holding the lock of a second metadata file.
+"""
+import pickle
+
+from MoMem.DB_COL.collection_meta import read_meta, write_meta
+from MoMem.basic_file_op import base_lock_meta
+
+# name of the metadata file and of the file locked while updating it
+STATS = "stats"
+STATS_LOCK = "stats.lock"
+
+# the fields of a document counted by the statistics
+STATS_FIELDS = ["type", "size", "tags"]
+
+
+def _empty():
+    """
+    the counters of an empty collection
+    """
+    return {"count": 0, "bytes": 0, "types": {}, "tags": {}}
+
+
+def _count(counters, fields, sign):
+    """
+    add (sign 1) or take out (sign -1) a document from the counters
+    :param fields: dict of MoNode field to value (at least STATS_FIELDS)
+    """
+    counters["count"] += sign
+    counters["bytes"] += sign * fields["size"]
+    keys = [("types", fields["type"])] + [("tags", tag) for tag in set(fields["tags"] or ())]
+    for counter, key in keys:
+        # a count may go below zero for a while (the removals of a batch are counted before its additions)
+        value = counters[counter].get(key, 0) + sign
+        if value:
+            counters[counter][key] = value
+        else:
+            counters[counter].pop(key, None)
+
+
+def summary(counters):
+    """
+    Make the report of counters
+    :param counters: the counters (see CollectionStats)
+    :return: dict with count, bytes, avg_size, types (dict of file type to count) and tags (dict of tag to count)
+    """
+    return {"count": counters["count"], "bytes": counters["bytes"],
+            "avg_size": counters["bytes"] / counters["count"] if counters["count"] else 0.0,
+            "types": dict(counters["types"]), "tags": dict(counters["tags"])}
+
+
+class CollectionStats:
+    def __init__(self, database, collection):
+        """
+        Create the statistics object of a collection
+        :param database: name of the database
+        :param collection: name of the collection
+        """
+        self.database = database
+        self.collection = collection
+
+    def exists(self):
+        """
+        :return: True if the statistics file exists and can be read
+        """
+        return self.__counters() is not None
+
+    def __counters(self):
+        """
+        Read the counters from the statistics file
+        :return: the counters, None if there is no statistics file or it is damaged
+        """
+        try:
+            return read_meta(STATS, self.database, self.collection)
+        except (pickle.UnpicklingError, EOFError, ValueError):
+            return None
+
+    def update(self, added=(), removed=()):
+        """
+        Count saved and deleted documents (an overwritten document is removed with its old fields and added again)
+        :param added: list of dict of MoNode field to value (at least STATS_FIELDS) of the saved documents
+        :param removed: list of dict of MoNode field to value (at least STATS_FIELDS) of the deleted documents
+        """
+        if not added and not removed:
+            return
+        with base_lock_meta(STATS_LOCK, self.database, self.collection):
+            counters = self.__counters() or _empty()
+            for fields in removed:
+                _count(counters, fields, -1)
+            for fields in added:
+                _count(counters, fields, 1)
+            write_meta(STATS, counters, self.database, self.collection)
+
+    def read(self):
+        """
+        Report the counters
+        :return: see summary
+        """
+        return summary(self.__counters() or _empty())
+
+    def rebuild(self, documents):
+        """
+        Count the documents from scratch
+        :param documents: iterable of dict of MoNode field to value (at least STATS_FIELDS)
+        """
+        counters = _empty()
+        for fields in documents:
+            _count(counters, fields, 1)
+        with base_lock_meta(STATS_LOCK, self.database, self.collection):
+            write_meta(STATS, counters, self.database, self.collection)
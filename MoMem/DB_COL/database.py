@@ -6,10 +6,13 @@ By: Will Selke
 This file contains the database class which is a python representation of a database. It contains the functions to
 create, delete, and list collections.
 """
-import os
 from .collection import Collection
-import MoMem.config.config as cfg
 import MoMem.basic_file_op as bfo
+from MoMem.storage.engine import ENGINE_TYPES, set_engine
+from MoMem.storage.file_engine import FileEngine, LAYOUT_FOLDERS, set_layout
+from MoMem.storage import wal
+from MoMem.storage.blob_store import BlobStore
+from MoMem.storage.backend import get_backend
 
 
 class Database:
@@ -20,7 +23,7 @@ class Database:
 
         Create a database object
         :param name: name of the database
-        :param path: path to the database
+        :param path: path to the database (see storage.backend location)
         """
         self.name = name
         self.path = path
@@ -32,62 +35,146 @@ class Database:
 
         :param name: name of the database
         """
-        DISK = cfg.ROOT_DIR
-        path = os.path.join(DISK, name)
-        if os.path.exists(path):
-            raise FileExistsError(f"Database {path} already exists")
+        backend = get_backend()
+        if backend.exists(name):
+            raise FileExistsError(f"Database {name} already exists")
         else:
-            os.mkdir(path)
+            backend.mkdir(name)
 
-        return Database(name, path)
+        return Database(name, backend.location(name))
 
     @staticmethod
     def ls_databases():
         """
         list all databases
         """
-        DISK = cfg.ROOT_DIR
-        return os.listdir(DISK)
+        return get_backend().listdir("")
 
     @staticmethod
     def get_database(name):
         """
         Get a database object
+        Opening a database replays its write-ahead log if the last run crashed
         :param name: name of the database
         :return database: object if it exists, None if it does not
         """
-        DISK = cfg.ROOT_DIR
-        path = os.path.join(DISK, name)
-        if not os.path.exists(path):
+        backend = get_backend()
+        if not backend.exists(name):
             return None
         else:
-            return Database(name, path)
+            database = Database(name, backend.location(name))
+            database.recover()
+            return database
+
+    def recover(self):
+        """
+        Replay the writes left in the write-ahead log by a crash, then empty the log (done by get_database)
+        """
+        log = wal.get_wal(self.name)
+        if log.recovered:
+            return
+
+        # the records of each collection, in the order of the log
+        collections = {}
+        for op, collection, id, payload in log.records():
+            collections.setdefault(collection, []).append((op, id, payload))
+        for name, records in collections.items():
+            collection = self.get_collection(name)
+            if collection is not None:
+                collection.replay(records)
+        # the reference counts of the blobs are not logged, the crash may have left them wrong
+        if bfo.base_ls_blobs(self.name):
+            BlobStore(self.name).rebuild(self.__blob_refs)
+        log.checkpoint(collections)
+
+    def __blob_refs(self):
+        """
+        count the references of the monodes of every collection to the blob store
+        :return: dict of hex digest to count
+        """
+        counts = {}
+        for name in self.ls_collections():
+            for digest, count in self.get_collection(name).blob_refs().items():
+                counts[digest] = counts.get(digest, 0) + count
+        return counts
+
+    def close(self):
+        """
+        Close the database in this process: the storage engines are flushed, the write-ahead log is emptied and marked
+        clean so the next open has nothing to replay, and its lock is released (done for every database at the exit of
+        the process, the database can still be used after, its log is opened again)
+        """
+        wal.close_wal(self.name)
+
+    @property
+    def durability(self):
+        """
+        The durability mode of the writes of the database in this process (see wal.DURABILITY_MODES)
+        """
+        return wal.get_wal(self.name).mode
+
+    def set_durability(self, mode):
+        """
+        Choose how the writes of the database are made durable in this process
+        :param mode: "none" (no write-ahead log), "batched" (the log is flushed to the disk every config.WAL_INTERVAL
+        seconds) or "strict" (a write returns once it is on the disk, concurrent writes share one fsync)
+        """
+        wal.check_mode(mode)
+        wal.get_wal(self.name).mode = mode
 
     def delete(self):
         """
         Delete the database
         """
-        DISK = cfg.ROOT_DIR
-        path = os.path.join(DISK, self.name)
-        if not os.path.exists(path):
-            raise FileNotFoundError(f"Database {path} does not exist")
+        backend = get_backend()
+        if not backend.exists(self.name):
+            raise FileNotFoundError(f"Database {self.path} does not exist")
         else:
-            os.rmdir(path)
+            if self.ls_collections():
+                raise OSError("The database is not empty")
+            wal.close_wal(self.name)
+            bfo.base_del_wal(self.name)
+            bfo.base_del_blobs(self.name)
+            backend.rmdir(self.name)
 
     """========================================COLLECTIONS FUNCTIONS========================================="""
-    def create_collection(self, name):
+    def create_collection(self, name, engine=None, dedup=False, layout=None, ids=None):
         """
         Create a collection in the database
         :param name: name of the collection
-        """
+        :param engine: how the monodes are stored (see storage.engine.ENGINE_TYPES), "files" for a file per monode
+        (default) or "segments" to append them to large log files
+        :param dedup: whether to store the data of the monodes once in the blob store of the database (see
+        Collection.set_dedup)
+        :param layout: layout of the files of the "files" engine, "flat" (default) or "sharded" for two levels of folders
+        (for collections of millions of monodes, see Collection.migrate_layout)
+        :param ids: how the ids are generated, "random" or "time" to sort them by creation time (default
+        config.ID_SCHEME, see Collection.set_id_scheme)
+        """
+        if engine is not None and engine not in ENGINE_TYPES:
+            raise ValueError(f"Unknown storage engine {engine}")
+        if layout is not None and layout not in LAYOUT_FOLDERS:
+            raise ValueError(f"Unknown layout {layout}")
+        if layout is not None and (engine or FileEngine.TYPE) != FileEngine.TYPE:
+            raise ValueError(f"The {engine} storage engine has no layout")
+
         # check if the collection already exists
-        path = os.path.join(self.path, name)
-        if not os.path.exists(path):
-            os.mkdir(path)
+        path = f"{self.name}/{name}"
+        backend = get_backend()
+        if not backend.exists(path):
+            backend.mkdir(path)
         else:
             raise FileExistsError(f"Collection {name} already exists")
+        set_engine(self.name, name, engine)
+        if layout is not None:
+            set_layout(self.name, name, layout)
 
-        return Collection(name, self.name, path)
+        collection = Collection(name, self.name, backend.location(path))
+        if dedup:
+            collection.set_dedup()
+        if ids is not None:
+            collection.set_id_scheme(ids)
+        return collection
 
     def get_collection(self, name):
         """
@@ -96,17 +183,57 @@ class Database:
         :return collection: object if it exists, None if it does not
         """
         # check if the collection exists
-        path = os.path.join(self.path, name)
-        if not os.path.exists(path):
+        path = f"{self.name}/{name}"
+        backend = get_backend()
+        if not backend.exists(path):
             return None
         else:
-            return Collection(name, self.name, path)
+            return Collection(name, self.name, backend.location(path))
 
     def ls_collections(self):
         """
         List all collections in the database
         :return: list of collections
         """
-        return os.listdir(self.path)
+        # the write-ahead log and the blob store are next to the collections
+        return [name for name in get_backend().listdir(self.name) if not name.startswith(".")]
+
+    def convert_format(self, version=None):
+        """
+        Rewrite the monodes of every collection of the database in a format (OFFLINE, see Collection.convert_format)
+        :param version: the format to convert to (default monode_pickle.VERSION)
+        :return: dict of collection name to the number of converted monodes
+        """
+        output = {}
+        for name in self.ls_collections():
+            collection = self.get_collection(name)
+            output[name] = collection.convert_format() if version is None else collection.convert_format(version)
+        return output
+
+    def dedup_stats(self):
+        """
+        Report the savings of the blob store of the database (see Collection.set_dedup)
+        :return: dict with the number of blobs and references, stored_bytes, logical_bytes (without deduplication),
+        saved_bytes and ratio (logical / stored)
+        """
+        return BlobStore(self.name).stats()
+
+    def stats(self):
+        """
+        Report the statistics of the database, the sum of the statistics of its collections (see Collection.stats)
+        :return: dict with count, bytes, avg_size, types and tags of the whole database, and collections (dict of
+        collection name to its statistics)
+        """
+        output = {"count": 0, "bytes": 0, "types": {}, "tags": {}, "collections": {}}
+        for name in self.ls_collections():
+            stats = self.get_collection(name).stats()
+            output["collections"][name] = stats
+            output["count"] += stats["count"]
+            output["bytes"] += stats["bytes"]
+            for counter in ("types", "tags"):
+                for key, count in stats[counter].items():
+                    output[counter][key] = output[counter].get(key, 0) + count
+        output["avg_size"] = output["bytes"] / output["count"] if output["count"] else 0.0
+        return output
 
 
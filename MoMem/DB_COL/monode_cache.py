@@ -0,0 +1,175 @@
+"""
+monode_cache.py
+Created on 2026-10-18 7:20:00 PM
+By: Will Selke
+
+This file contains the cache of decoded MoNodes used by Collection.get_monode. A MoNodeCache holds two LRU pools
+bounded by their total size in bytes, one for full MoNodes and one for metadata-only entries (every field but data), so
+metadata reads of big nodes never push the hot payloads out. A cache can be set for one collection or for the whole
+process (see set_cache), entries are keyed by (database, collection, id) and dropped when the document is saved or
+deleted through a Collection of this process.
+"""
+import sys
+import threading
+from collections import OrderedDict
+
+# rough size in bytes of a cache entry besides its values
+ENTRY_OVERHEAD = 200
+
+# the caches by (database, collection), None for the process wide cache
+_caches = {}
+
+
+def size_of(value):
+    """
+    Estimate the size in bytes of a decoded value
+    :param value: MoNode, dict, list, str, bytes...
+    :return: size in bytes
+    """
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    if isinstance(value, memoryview):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(size_of(k) + size_of(v) for k, v in value.items()) + 64
+    if isinstance(value, (list, tuple)):
+        return sum(size_of(v) for v in value) + 64
+    if hasattr(value, "__dict__") and not isinstance(value, type):
+        return size_of(value.__dict__)
+    return sys.getsizeof(value)
+
+
+class _Pool:
+    """
+    LRU pool bounded by the total size of its entries
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, value, size):
+        self.pop(key)
+        if size > self.max_bytes:
+            return
+        self.entries[key] = (value, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            _, (_, old) = self.entries.popitem(last=False)
+            self.bytes -= old
+            self.evictions += 1
+
+    def pop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[1]
+
+    def stats(self):
+        return {"entries": len(self.entries), "bytes": self.bytes, "max_bytes": self.max_bytes, "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions}
+
+
+class MoNodeCache:
+    """
+    # full : pool of full MoNodes
+    # meta : pool of metadata-only entries (dict of every field but data)
+    """
+
+    def __init__(self, max_bytes, meta_max_bytes=None):
+        """
+        Create a cache
+        :param max_bytes: max total size of the full MoNodes
+        :param meta_max_bytes: max total size of the metadata-only entries (default 1/8 of max_bytes)
+        """
+        self.full = _Pool(max_bytes)
+        self.meta = _Pool(max_bytes // 8 if meta_max_bytes is None else meta_max_bytes)
+        # bumped by every invalidation, an entry read from disk is only cached if nothing was invalidated meanwhile
+        self.version = 0
+        self.__lock = threading.Lock()
+
+    def get(self, key, meta=False):
+        """
+        Get an entry
+        :param key: (database, collection, id)
+        :param meta: get from the metadata-only pool
+        :return: the entry, None if it is not cached
+        """
+        with self.__lock:
+            return (self.meta if meta else self.full).get(key)
+
+    def put(self, key, value, version, meta=False):
+        """
+        Cache an entry
+        :param key: (database, collection, id)
+        :param value: MoNode or dict of metadata
+        :param version: the cache version when the entry started to be read from disk
+        :param meta: put in the metadata-only pool
+        """
+        size = size_of(value) + ENTRY_OVERHEAD
+        with self.__lock:
+            if version == self.version:
+                (self.meta if meta else self.full).put(key, value, size)
+
+    def invalidate(self, key):
+        """
+        Drop the entries of a document
+        :param key: (database, collection, id)
+        """
+        with self.__lock:
+            self.version += 1
+            self.full.pop(key)
+            self.meta.pop(key)
+
+    def clear(self):
+        """
+        Drop every entry
+        """
+        with self.__lock:
+            self.version += 1
+            for pool in (self.full, self.meta):
+                pool.entries.clear()
+                pool.bytes = 0
+
+    def stats(self):
+        """
+        :return: dict with the entries, bytes, hits, misses and evictions of both pools
+        """
+        with self.__lock:
+            return {"full": self.full.stats(), "meta": self.meta.stats()}
+
+
+def set_cache(cache, database=None, collection=None):
+    """
+    Set the cache of a collection, or the process wide cache used by the collections without their own
+    :param cache: MoNodeCache, None to remove it
+    :param database: name of the database (None for the process wide cache)
+    :param collection: name of the collection (None for the process wide cache)
+    """
+    key = None if database is None else (database, collection)
+    if cache is None:
+        _caches.pop(key, None)
+    else:
+        _caches[key] = cache
+
+
+def get_cache(database, collection):
+    """
+    Get the cache used by a collection
+    :param database: name of the database
+    :param collection: name of the collection
+    :return: MoNodeCache, None if there is no cache
+    """
+    return _caches.get((database, collection), _caches.get(None))
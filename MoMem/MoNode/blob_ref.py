@@ -0,0 +1,41 @@
+"""
+blob_ref.py
+Created on 2026-10-18 11:20:00 PM
+By: Will Selke
+
+This file contains the reference to a deduplicated blob. When deduplication is enabled on a collection the data of a
+MoNode is stored once in the blob store of the database (see storage.blob_store), keyed by its hash, and the .mn file
+only holds a BlobRef in place of the data.
+"""
+
+
+class BlobRef:
+    """
+    Reference to data stored in the blob store of the database in place of the MoNode data
+
+    # digest : The sha256 digest of the data (32 bytes)
+    # size : The size in bytes of the data
+    """
+
+    def __init__(self, digest, size):
+        self.digest = digest
+        self.size = size
+
+    @property
+    def hex(self):
+        """
+        The digest as a hex string (the name of the blob)
+        """
+        return self.digest.hex()
+
+    def __len__(self):
+        return self.size
+
+    def __eq__(self, other):
+        return isinstance(other, BlobRef) and (self.digest, self.size) == (other.digest, other.size)
+
+    def __hash__(self):
+        return hash(self.digest)
+
+    def __repr__(self):
+        return f"BlobRef(digest={self.hex}, size={self.size})"
@@ -0,0 +1,101 @@
+"""
+compression.py
+Created on 2026-10-18 11:50:00 PM
+By: Will Selke
+
+This file contains the transparent compression of the MoNode fields. A collection can have a compression policy (see
+Collection.set_compression), the fields it names are then wrapped in Compressed before the MoNode is pickled, the
+pickled field holds the codec in its header and is decompressed by monode_pickle.load without the caller knowing.
+The data of the files already compressed (see config.file_type.compressed_types) is left as is.
+"""
+import bz2
+import copy
+import lzma
+import zlib
+
+from MoMem.config.file_type import compressed_types
+from MoMem.MoNode.large_object import LargeObject
+from MoMem.MoNode.blob_ref import BlobRef
+
+# codec name -> (id stored in the header, compress(data, level), decompress(data))
+CODECS = {
+    "zlib": (1, lambda data, level: zlib.compress(data, 6 if level is None else level), zlib.decompress),
+    "lzma": (2, lambda data, level: lzma.compress(data, preset=level), lzma.decompress),
+    "bz2": (3, lambda data, level: bz2.compress(data, 9 if level is None else level), bz2.decompress)
+}
+
+# codec id -> decompress(data)
+DECOMPRESS = {codec_id: decompress for codec_id, _, decompress in CODECS.values()}
+
+# the fields a policy can compress
+COMPRESSIBLE_FIELDS = ("desc", "notes", "data")
+
+
+class Compressed:
+    """
+    Field value to compress when the MoNode is pickled (monode_pickle.load gives back the value itself)
+
+    # value : The value of the field
+    # codec : The name of the codec (see CODECS)
+    # level : The compression level (None for the default of the codec)
+    # encoded : The pickled compressed field by format version, b"" if compressing does not make it smaller (set by
+    monode_pickle)
+    """
+
+    def __init__(self, value, codec, level=None):
+        if codec not in CODECS:
+            raise ValueError(f"Unknown codec {codec}, expected one of {list(CODECS)}")
+        self.value = value
+        self.codec = codec
+        self.level = level
+        self.encoded = {}
+
+    def compress(self, data):
+        """
+        Compress the pickled value
+        :param data: the pickled value
+        :return: (codec id, compressed data)
+        """
+        codec_id, compress, _ = CODECS[self.codec]
+        return codec_id, compress(data, self.level)
+
+
+def check_policy(codec, fields, level):
+    """
+    Check a compression policy
+    :param codec: name of the codec
+    :param fields: the fields to compress
+    :param level: the compression level
+    """
+    if codec not in CODECS:
+        raise ValueError(f"Unknown codec {codec}, expected one of {list(CODECS)}")
+    unknown = [f for f in fields if f not in COMPRESSIBLE_FIELDS]
+    if unknown:
+        raise ValueError(f"Cannot compress the fields {unknown}, only {COMPRESSIBLE_FIELDS}")
+    if level is not None and not isinstance(level, int):
+        raise ValueError("level must be an int")
+
+
+def compress_fields(monode, policy):
+    """
+    Wrap the fields of a MoNode named by a compression policy in Compressed
+    :param monode: the MoNode
+    :param policy: dict with codec, level, fields and min_size (see Collection.set_compression)
+    :return: a copy of the MoNode with the wrapped fields, or the MoNode itself if nothing is compressed
+    """
+    extension = monode.name.rsplit(".", 1)[-1].lower() if "." in monode.name else ""
+    output = None
+    for field in policy["fields"]:
+        value = getattr(monode, field)
+        if field == "data" and extension in compressed_types:
+            continue
+        # references and values already wrapped are left alone
+        if isinstance(value, (LargeObject, BlobRef, Compressed)) or not value:
+            continue
+        if isinstance(value, (bytes, bytearray, memoryview, str)) and len(value) < policy["min_size"]:
+            continue
+
+        if output is None:
+            output = copy.copy(monode)
+        setattr(output, field, Compressed(value, policy["codec"], policy["level"]))
+    return monode if output is None else output
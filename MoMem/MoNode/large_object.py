@@ -0,0 +1,155 @@
+"""
+large_object.py
+Created on 2026-10-18 3:12:00 PM
+By: Will Selke
+
+This file contains the large object (chunked data) helpers for MoMem. A MoNode whose data is a file-like object or an
+iterator of bytes is stored in fixed-size chunks next to its .mn file, the .mn file then only holds a LargeObject
+reference in place of the data. The data is read back through a LargeObjectReader which only keeps one chunk in memory.
+"""
+import io
+
+
+class LargeObject:
+    """
+    Reference to chunked data stored in place of the MoNode data
+
+    # chunk_size : The size in bytes of every chunk (except the last one)
+    # chunks : The number of chunks
+    # size : The total size in bytes of the data
+    # key : The folder of the chunks, every write of a monode gets a new one so the chunks of the monode it overwrites
+    are only deleted once it is written (None for the chunks stored before the keys, straight in the folder of the id)
+    """
+
+    def __init__(self, chunk_size, chunks, size, key=None):
+        self.chunk_size = chunk_size
+        self.chunks = chunks
+        self.size = size
+        self.key = key
+
+    def __len__(self):
+        return self.size
+
+    def __eq__(self, other):
+        return isinstance(other, LargeObject) and (self.chunk_size, self.chunks, self.size, self.key) == \
+            (other.chunk_size, other.chunks, other.size, other.key)
+
+    def __repr__(self):
+        return f"LargeObject(chunk_size={self.chunk_size}, chunks={self.chunks}, size={self.size}, key={self.key})"
+
+    def chunk_name(self, id):
+        """
+        The name the chunks are stored under (see base_write_chunk)
+        :param id: id of the monode
+        :return: the name
+        """
+        return id if self.key is None else f"{id}/{self.key}"
+
+
+def is_large_data(data):
+    """
+    Check if the data has to be stored as a large object (anything that is not already bytes in memory)
+    :param data: the MoNode data
+    :return: True if the data is a file-like object or an iterator
+    """
+    return not isinstance(data, (bytes, bytearray, memoryview, LargeObject))
+
+
+def iter_chunks(data, chunk_size):
+    """
+    Cut a file-like object or an iterator of bytes into chunks of exactly chunk_size bytes (the last one may be shorter)
+    :param data: file-like object (with read) or iterator of bytes
+    :param chunk_size: size of the chunks
+    :return: generator of bytes
+    """
+    if hasattr(data, "read"):
+        source = iter(lambda: data.read(chunk_size), b"")
+    else:
+        source = iter(data)
+
+    buffer = bytearray()
+    for piece in source:
+        buffer += piece
+        while len(buffer) >= chunk_size:
+            yield bytes(buffer[:chunk_size])
+            del buffer[:chunk_size]
+
+    if buffer:
+        yield bytes(buffer)
+
+
+class LargeObjectReader(io.RawIOBase):
+    """
+    Seekable read only file-like object over chunked data, only the chunk being read is kept in memory
+    """
+
+    def __init__(self, large_object: LargeObject, read_chunk):
+        """
+        Create the reader (USE Collection.open_data() INSTEAD)
+
+        :param large_object: the LargeObject reference
+        :param read_chunk: function (index) -> bytes reading a stored chunk
+        """
+        super().__init__()
+        self.large_object = large_object
+        self._read_chunk = read_chunk
+        self._pos = 0
+        self._chunk_index = None
+        self._chunk = b""
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        """
+        Move the read position
+        :param offset: the offset
+        :param whence: io.SEEK_SET, io.SEEK_CUR or io.SEEK_END
+        :return: the new position
+        """
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self.large_object.size + offset
+        else:
+            raise ValueError(f"Invalid whence {whence}")
+
+        if pos < 0:
+            raise ValueError(f"Negative seek position {pos}")
+        self._pos = pos
+        return pos
+
+    def readinto(self, b):
+        """
+        Read into a buffer, the buffer is filled unless the end of the data is reached
+        :param b: writable buffer
+        :return: the number of bytes read
+        """
+        view = memoryview(b).cast("B")
+        n = 0
+        while n < len(view) and self._pos < self.large_object.size:
+            index, start = divmod(self._pos, self.large_object.chunk_size)
+            if index != self._chunk_index:
+                self._chunk = self._read_chunk(index)
+                self._chunk_index = index
+
+            length = min(len(view) - n, len(self._chunk) - start)
+            if length <= 0:
+                raise IOError(f"Chunk {index} is truncated")
+            view[n:n + length] = self._chunk[start:start + length]
+            n += length
+            self._pos += length
+
+        return n
+
+    def close(self):
+        self._chunk = b""
+        super().close()
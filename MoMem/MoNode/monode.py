@@ -13,6 +13,7 @@ import pickle
 import random
 
 from MoMem.config.config import FILE_ID_LENGTH, MONODE_EXTENSION
+from MoMem.MoNode import monode_id
 
 
 PADDING_LENGTH = 40
@@ -24,7 +25,7 @@ class MoNode:
     # name : The file name
     # type : The file type (img, txt, video, etc.)
 
-    # data : The file data
+    # data : The file data (bytes, or a file-like / iterator of bytes to be stored as a large object)
     # size : The file size in bytes
 
     # desc : A description of the file
@@ -57,7 +58,8 @@ class MoNode:
         self.type = f_type
 
         if size is None:
-            self.size = len(data)
+            # a file-like or iterator data (large object) gets its size once it is stored
+            self.size = len(data) if hasattr(data, "__len__") else 0
         else:
             self.size = size
         if len(str(self.size)) > PADDING_LENGTH_SIZE:
@@ -100,24 +102,31 @@ class MoNode:
 
         :return: the MoNode as a pickle
         """
-        # TODO IMPLEMENT ME
+        from MoMem.MoNode import monode_pickle
 
-        return pickle.dumps(self)
+        return monode_pickle.dump(self)
 
     @staticmethod
-    def unpickle(data):
+    def unpickle(data, copy=True):
         """
         unpickle the MoNode
 
         :param data: the pickle data
+        :param copy: whether to copy the data out of the pickle buffer (see monode_pickle.load)
         :return: the MoNode
         """
-        # remove the padding
+        from MoMem.MoNode import monode_pickle
+
+        if monode_pickle.format_version(data) is not None:
+            return monode_pickle.load(data, copy)
+
+        # MoNode saved before monode_pickle was used (python pickle)
         data = pickle.loads(data)
         data.name = data.name.strip()
         data.type = data.type.strip()
         data.size = int(data.size)
-        data.modi = datetime.strptime(data.modi.strip(), "%Y-%m-%d %H:%M:%S.%f")
+        if isinstance(data.modi, str):
+            data.modi = datetime.strptime(data.modi.strip(), "%Y-%m-%d %H:%M:%S.%f")
         return data
 
     @staticmethod
@@ -127,3 +136,11 @@ class MoNode:
         :return: the random string
         """
         return ''.join(random.choice(string.ascii_letters + string.digits) for _ in range(FILE_ID_LENGTH)) + MONODE_EXTENSION
+
+    @staticmethod
+    def generate_time_id():
+        """
+        Generate an id sorted by creation time which never collides (see monode_id.py)
+        :return: the id
+        """
+        return monode_id.generate_time_id()
@@ -9,7 +9,6 @@ This file contains the basic MoNode class operations, such as save and load.
 from .monode import MoNode
 from MoMem.config.file_type import file_type
 from MoMem.config.config import MONODE_EXTENSION
-from MoMem.basic_file_op import base_write, base_read
 
 def file_to_monode(file_name, file_data, desc="", note=None, tags=[], modi=None):
     """
@@ -46,22 +45,11 @@ def save_as_monode(file_name: str, file_data, database: str, collection: str, de
     :param desc: description of the file (optional)
     :param note: additional details as dictionary (optional)
     :param tags: tags for the file (optional)
+    :return: the id of the MoNode
     """
-    # create the MoNode
-    monode = file_to_monode(file_name, file_data, desc, note, tags).pickle()
-    counter = 0
-    while True:
-        try:
-            ids = MoNode.generate_id()
-            # save the MoNode
-            base_write(ids, monode, database, collection)
-            break
-        except FileExistsError:
-            print("FIXING")
-            counter = counter + 1
-            if counter > 10:
-                raise FileExistsError("Could not save file after 10 tries (may be a bug)")
-            continue
+    # the collection picks the id (see Collection.id_scheme) and keeps its catalog, indexes and statistics up to date
+    monode = file_to_monode(file_name, file_data, desc, note, tags)
+    return __get_collection(database, collection).save_monode(monode)
 
 
 def read_monode(file_id: str, database: str, collection: str):
@@ -73,7 +61,17 @@ def read_monode(file_id: str, database: str, collection: str):
     :param collection: name of the collection
     :return: the MoNode
     """
-    # read the MoNode
-    monode = MoNode.unpickle(base_read(file_id + MONODE_EXTENSION, database, collection))
+    return __get_collection(database, collection).get_monode(file_id + MONODE_EXTENSION)
 
-    return monode
+
+def __get_collection(database: str, collection: str):
+    """
+    get a collection, which must exist
+    """
+    # the collection imports this module
+    from MoMem.DB_COL.database import Database
+    found = Database.get_database(database)
+    found = found.get_collection(collection) if found is not None else None
+    if found is None:
+        raise FileNotFoundError(f"The collection {database}/{collection} does not exist")
+    return found
@@ -0,0 +1,100 @@
+"""
+monode_id.py
+Created on 2026-10-19 1:20:00 AM
+By: Will Selke
+
+This file contains the time-sortable ids of the MoNodes, the alternative to the random ids of MoNode.generate_id (see
+Collection.set_id_scheme). A time id is made of 18 characters of an alphabet sorted like ASCII:
+    10 characters : the creation time in milliseconds since the epoch
+    4 characters : a counter of the ids generated by the process in the same millisecond
+    4 characters : random node bits drawn once per process
+so the ids sort by creation time and two ids can only be equal if two processes draw the same node bits and generate an
+id in the same millisecond with the same counter, the ids do not need to be checked against the stored MoNodes.
+"""
+import os
+import random
+import threading
+import time
+from datetime import datetime
+
+from MoMem.config.config import MONODE_EXTENSION
+
+# the digits of the ids (crockford base32), sorted like ASCII so the ids sort as strings
+ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+
+TIME_CHARS = 10
+COUNTER_CHARS = 4
+NODE_CHARS = 4
+ID_CHARS = TIME_CHARS + COUNTER_CHARS + NODE_CHARS
+
+_lock = threading.Lock()
+# (pid, node bits, last millisecond, counter), the node bits are drawn again in a forked process
+_state = [None, 0, 0, 0]
+
+
+def __encode(value, length):
+    """
+    value in base32 on length characters
+    """
+    chars = []
+    for _ in range(length):
+        value, digit = divmod(value, len(ALPHABET))
+        chars.append(ALPHABET[digit])
+    return "".join(reversed(chars))
+
+
+def generate_time_id():
+    """
+    Generate a time-sortable id
+    :return: the id (with the MoNode extension)
+    """
+    with _lock:
+        pid, node, last, counter = _state
+        if pid != os.getpid():
+            pid, node = os.getpid(), random.SystemRandom().getrandbits(5 * NODE_CHARS)
+        # the time of the ids never goes back, even if the clock does
+        now = max(time.time_ns() // 1_000_000, last)
+        if now == last:
+            counter += 1
+            # out of counters for this millisecond, borrow the next one
+            if counter >= len(ALPHABET) ** COUNTER_CHARS:
+                now, counter = now + 1, 0
+        else:
+            counter = 0
+        _state[:] = [pid, node, now, counter]
+    return __encode(now, TIME_CHARS) + __encode(counter, COUNTER_CHARS) + __encode(node, NODE_CHARS) + \
+        MONODE_EXTENSION
+
+
+def is_time_id(id):
+    """
+    :return: whether an id is a time id
+    """
+    name = id[:-len(MONODE_EXTENSION)] if id.endswith(MONODE_EXTENSION) else None
+    return name is not None and len(name) == ID_CHARS and all(char in ALPHABET for char in name)
+
+
+def id_time(id):
+    """
+    Get the creation time of a time id
+    :param id: the id
+    :return: datetime (local time), None if the id is not a time id
+    """
+    if not is_time_id(id):
+        return None
+    milliseconds = 0
+    for char in id[:TIME_CHARS]:
+        milliseconds = milliseconds * len(ALPHABET) + ALPHABET.index(char)
+    return datetime.fromtimestamp(milliseconds / 1000)
+
+
+def time_bound(moment):
+    """
+    Get the prefix the time ids created at a moment start with, the ids created before it sort below it
+    :param moment: datetime (naive datetimes are local time) or seconds since the epoch
+    :return: the prefix
+    """
+    if isinstance(moment, datetime):
+        moment = moment.timestamp()
+    # through the microseconds so the float does not round 1.001 s down to 1000 ms
+    return __encode(max(0, round(moment * 1_000_000) // 1000), TIME_CHARS)
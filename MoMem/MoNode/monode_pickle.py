@@ -5,16 +5,43 @@ By: Will Selke
 
 This file contains the serializer functions for MoMem. These functions serves as an way to pickle and unpickle data
 between the MoNode and the file system.
+
+The MoNodes are written in the format VERSION, the version 2 with varint headers (see monode_pickle_v2.py), the loading
+functions read both versions: version 1 starts with b"mn", version 2 with its version byte.
 """
+import os
 import struct
 from datetime import datetime
 from typing import Tuple, List, Any
 
 from MoMem import MoNode
+from MoMem.MoNode.large_object import LargeObject
+from MoMem.MoNode.blob_ref import BlobRef
+from MoMem.MoNode.compression import Compressed, DECOMPRESS
+from MoMem.MoNode import monode_pickle_v2
+
+# the format written by dump (1 or 2)
+VERSION = monode_pickle_v2.VERSION
 
 # Define the max size in byte for the size header of each data type
 MAX_DATE_BYTE = 8
 MAX_SIZE_DATA_BYTE = 8
+FLOAT_BYTE = 4
+DIGEST_BYTE = 32
+
+# max number of chunks handed to a single os.writev call
+IOV_MAX = 1024
+
+# order of the MoNode fields in the pickled list (and in the offset key)
+MONODE_FIELDS = ("name", "type", "size", "modi", "desc", "notes", "tags", "data")
+
+# size of the MoNode header before the offset key
+# 2 + 8 for the b"mn" header, 2 + 8 for the list header and 8 for the n-elements in the list
+HEADER_SIZE = 28
+
+# number of bytes read to get the offset key of a MoNode of any version
+HEAD_READ = max(HEADER_SIZE + len(MONODE_FIELDS) * MAX_SIZE_DATA_BYTE,
+                monode_pickle_v2.max_head_size(len(MONODE_FIELDS)))
 
 # KEY the preceding 2 bytes of the data to determine the type
 KEY_CODE = {
@@ -25,17 +52,62 @@ KEY_CODE = {
     b"in": int,
     b"fl": float,
     b"dt": datetime,
-    b"by": bytes
+    b"by": bytes,
+    b"lo": LargeObject,
+    # a LargeObject with the key of its chunks
+    b"lk": LargeObject,
+    b"bl": BlobRef,
+    b"cz": Compressed
 }
 
 
-def dump(MoNode):
+def dump(MoNode, version=VERSION):
     """
     Pickle the MoNode and return the byte
 
     :param MoNode: MoNode to pickle
+    :param version: the format (1 or 2)
     :return: pickled data
     """
+    return b"".join(dump_chunks(MoNode, version))
+
+
+def dump_into(MoNode, out, version=VERSION):
+    """
+    Pickle the MoNode straight into out without building the pickled byte string first
+
+    :param MoNode: MoNode to pickle
+    :param out: a file object (anything with writelines), a bytearray or a file descriptor
+    :param version: the format (1 or 2)
+    :return: number of bytes written
+    """
+    chunks = dump_chunks(MoNode, version)
+
+    if isinstance(out, bytearray):
+        for chunk in chunks:
+            out += chunk
+    elif isinstance(out, int):
+        __write_fd(out, chunks)
+    else:
+        out.writelines(chunks)
+
+    return sum(len(chunk) for chunk in chunks)
+
+
+def dump_chunks(MoNode, version=VERSION) -> List[Any]:
+    """
+    Pickle the MoNode as a list of byte chunks which joined together are the pickled data. The sizes and offsets are
+    computed first so every chunk is final, the payloads (bytes fields) are not copied.
+
+    :param MoNode: MoNode to pickle
+    :param version: the format (1 or 2)
+    :return: list of bytes-like chunks
+    """
+    if version == monode_pickle_v2.VERSION:
+        return monode_pickle_v2.dump_chunks(MoNode)
+    if version != 1:
+        raise ValueError(f"Unknown MoNode format version {version}")
+
     # create a list from the MoNode
     # In this format
     # [ name, type, size, modified_date, description, notes, tags, data ]
@@ -45,129 +117,270 @@ def dump(MoNode):
     # 2 are the b"mn"
     # and the other 8 are the length of the data
     current_byte = 10
-    temp, current_byte = __dump_list(data, current_byte=current_byte)
-    output = b"mn" + current_byte.to_bytes(MAX_SIZE_DATA_BYTE, "big") + temp
+    output = [b"mn" + (current_byte + __size_list(data)).to_bytes(MAX_SIZE_DATA_BYTE, "big")]
+    __dump_list(data, current_byte, output)
 
     return output
 
 
-def __dump_list(data: list, current_byte=0):
+def __write_fd(fd, chunks):
+    """
+    Write the chunks to a file descriptor using os.writev when available
+    :param fd: file descriptor
+    :param chunks: list of bytes-like chunks
+    """
+    chunks = [memoryview(c).cast("B") for c in chunks if len(c)]
+    i = 0
+    while i < len(chunks):
+        if hasattr(os, "writev"):
+            written = os.writev(fd, chunks[i:i + IOV_MAX])
+        else:
+            written = os.write(fd, chunks[i])
+
+        # drop what was written (writes may be partial)
+        while written:
+            if written >= len(chunks[i]):
+                written -= len(chunks[i])
+                i += 1
+            else:
+                chunks[i] = chunks[i][written:]
+                written = 0
+
+
+def __size_list(data: list) -> int:
+    """
+    size in bytes of the pickled list
+    """
+    # (2 + 8) header + 8 (the n elements in the list) + 8 per key
+    return 18 + len(data) * MAX_SIZE_DATA_BYTE + sum(SIZE_FUNCTIONS[type(i)](i) for i in data)
+
+
+def __size_dict(data: dict) -> int:
+    """
+    size in bytes of the pickled dict
+    """
+    return 2 + 18 + len(data) * 2 * MAX_SIZE_DATA_BYTE + \
+        sum(SIZE_FUNCTIONS[type(k)](k) + SIZE_FUNCTIONS[type(v)](v) for k, v in data.items())
+
+
+def __size_str(data: str) -> int:
+    """
+    size in bytes of the pickled string
+    """
+    return 2 + MAX_SIZE_DATA_BYTE + len(data.encode())
+
+
+def __size_bytes(data) -> int:
+    """
+    size in bytes of the pickled bytes
+    """
+    return 2 + MAX_SIZE_DATA_BYTE + memoryview(data).nbytes
+
+
+SIZE_FUNCTIONS = {
+    list: __size_list,
+    dict: __size_dict,
+    str: __size_str,
+    int: lambda data: 2 + MAX_SIZE_DATA_BYTE,
+    float: lambda data: 2 + FLOAT_BYTE,
+    datetime: lambda data: 2 + MAX_DATE_BYTE,
+    bytes: __size_bytes,
+    bytearray: __size_bytes,
+    memoryview: __size_bytes,
+    LargeObject: lambda data: 2 + 3 * MAX_SIZE_DATA_BYTE +
+    (0 if data.key is None else MAX_SIZE_DATA_BYTE + len(data.key.encode("utf-8"))),
+    BlobRef: lambda data: 2 + DIGEST_BYTE + MAX_SIZE_DATA_BYTE,
+    Compressed: lambda data: __size_compressed(data)
+}
+
+
+def __dump_list(data: list, current_byte: int, output: list) -> int:
     """
     pickle the list object
     :param data: the list
-    :return: byte
+    :param current_byte: where the list starts
+    :param output: the list of chunks to append to
+    :return: where the list ends
     """
     # get the heading size of the list (2 + 8) + 8 (the n elements in the list)
     # and the size of key len(data) * 8
-    current_byte += 10
-    prev_byte = current_byte
-    current_byte += 8 # the n-elements in the list is 8 bytes long
-    current_byte += len(data) * 8 # the key is 8 bytes long for each element
-    output = b""
+    start = current_byte + 18 + len(data) * MAX_SIZE_DATA_BYTE
+
+    # the key is the position of each element, which is known from the sizes
     key = []
+    end = start
     for i in data:
-        # convert the length to bytes
-        key.append(current_byte)
-        temp, current_byte = DUMP_FUNCTIONS[type(i)](i, current_byte)
-        output += temp
+        key.append(end.to_bytes(MAX_SIZE_DATA_BYTE, "big"))
+        end += SIZE_FUNCTIONS[type(i)](i)
+
+    # compile the header
+    output.append(b"li" + (end - current_byte - 10).to_bytes(MAX_SIZE_DATA_BYTE, "big") +
+                  len(data).to_bytes(MAX_SIZE_DATA_BYTE, "big") + b"".join(key))
 
-    # compile the output
-    # convert the key to bytes
-    k_temp = b""
-    for k in key:
-        k_temp += k.to_bytes(MAX_SIZE_DATA_BYTE, "big")
-    output = b"li" + (current_byte - prev_byte).to_bytes(MAX_SIZE_DATA_BYTE, "big") + \
-             len(data).to_bytes(MAX_SIZE_DATA_BYTE, "big") + k_temp + output
+    current_byte = start
+    for i in data:
+        current_byte = DUMP_FUNCTIONS[type(i)](i, current_byte, output)
 
-    return output, current_byte
+    return current_byte
 
 
-def __dump_dict(data: dict, current_byte=0):
+def __dump_dict(data: dict, current_byte: int, output: list) -> int:
     """
     pickle the dict object
     :param data: the dict
-    :param start: where to start the byte counter
-    :return: byte string with header
+    :param current_byte: where the dict starts
+    :param output: the list of chunks to append to
+    :return: where the dict ends
     """
-    # convert the dict to a list
-    # TODO Come up with a better way to pickle the dict
-    # TODO WAY TO TIRED TO THINK RIGHT NOW 2023-02-26 10:58:00 PM
-    items = data.items()
+    # version 1 stores a dict as the list of its keys and values (version 2 has keyed dicts, see monode_pickle_v2)
     outlist = []
 
     # create a list of the keys and values
-    for item in items:
+    for item in data.items():
         outlist.append(item[0])
         outlist.append(item[1])
 
-    # pickle the list
-    outlist, current_byte = __dump_list(outlist, current_byte)
-    return b"di" + outlist, current_byte
+    # pickle the list (the 2 bytes of b"di" come before the list header)
+    output.append(b"di")
+    return __dump_list(outlist, current_byte + 2, output)
 
 
-def __dump_str(data: str, current_byte=0):
+def __dump_str(data: str, current_byte: int, output: list) -> int:
     """
     pickle the string object
     :param data: string input
-    :return: byte string with header
+    :param current_byte: where the string starts
+    :param output: the list of chunks to append to
+    :return: where the string ends
     """
     # convert the string to bytes
     data = data.encode()
     # convert the length to bytes
     data_len = len(data)
-    # return the length and the data
-    return b"st" + data_len.to_bytes(MAX_SIZE_DATA_BYTE, "big") + data, \
-           current_byte + 2 + MAX_SIZE_DATA_BYTE + data_len
+    output.append(b"st" + data_len.to_bytes(MAX_SIZE_DATA_BYTE, "big") + data)
+    return current_byte + 2 + MAX_SIZE_DATA_BYTE + data_len
 
 
-def __dump_int(data: int, current_byte=0):
+def __dump_int(data: int, current_byte: int, output: list) -> int:
     """
     pickle the int object
     :param data: int input
-    :return: byte string with header
+    :param current_byte: where the int starts
+    :param output: the list of chunks to append to
+    :return: where the int ends
     """
-    # convert the int to bytes
-    data = data.to_bytes(MAX_SIZE_DATA_BYTE, "big")
-    # return the data
-    return b"in" + data, current_byte + 2 + MAX_SIZE_DATA_BYTE
+    output.append(b"in" + data.to_bytes(MAX_SIZE_DATA_BYTE, "big"))
+    return current_byte + 2 + MAX_SIZE_DATA_BYTE
 
 
-def __dump_float(data: float, current_byte=0):
+def __dump_float(data: float, current_byte: int, output: list) -> int:
     """
     pickle the float object
     :param data: the float
-    :return: byte string with header
+    :param current_byte: where the float starts
+    :param output: the list of chunks to append to
+    :return: where the float ends
     """
-    # convert the float to bytes
-    data = struct.pack('f', data)
-    # return the data
-    return b"fl" + data, current_byte + 2 + MAX_SIZE_DATA_BYTE
+    output.append(b"fl" + struct.pack('f', data))
+    return current_byte + 2 + FLOAT_BYTE
 
 
-def __dump_datetime(data: datetime, current_byte=0):
+def __dump_datetime(data: datetime, current_byte: int, output: list) -> int:
     """
     pickle the datetime object
     :param data: datetime input
-    :return: byte string with header
+    :param current_byte: where the datetime starts
+    :param output: the list of chunks to append to
+    :return: where the datetime ends
     """
-    # convert the datetime to bytes
     # NOTE: the d means that its 8 bytes to use double precision
-    data = struct.pack('d', data.timestamp())
-    # return the data
-    return b"dt" + data, current_byte + 2 + MAX_DATE_BYTE
+    output.append(b"dt" + struct.pack('d', data.timestamp()))
+    return current_byte + 2 + MAX_DATE_BYTE
 
 
-def __dump_bytes(data: bytes, current_byte=0):
+def __dump_bytes(data, current_byte: int, output: list) -> int:
     """
-    pickle the bytes data
-    :param data: the bytes string
-    :return: byte string with header attached
+    pickle the bytes data, the payload itself is appended as is (not copied)
+    :param data: the bytes string (bytes, bytearray or memoryview)
+    :param current_byte: where the bytes start
+    :param output: the list of chunks to append to
+    :return: where the bytes end
     """
-    # convert the length to bytes
-    data_len = len(data)
-    # return the length and the data
-    return b"by" + data_len.to_bytes(MAX_SIZE_DATA_BYTE, "big") + data, \
-           current_byte + 2 + MAX_SIZE_DATA_BYTE + data_len
+    data_len = memoryview(data).nbytes
+    output.append(b"by" + data_len.to_bytes(MAX_SIZE_DATA_BYTE, "big"))
+    output.append(data)
+    return current_byte + 2 + MAX_SIZE_DATA_BYTE + data_len
+
+
+def __dump_large_object(data: LargeObject, current_byte: int, output: list) -> int:
+    """
+    pickle the reference to chunked data (the chunks themselves are stored by the collection)
+    :param data: the LargeObject
+    :param current_byte: where the reference starts
+    :param output: the list of chunks to append to
+    :return: where the reference ends
+    """
+    values = data.chunk_size.to_bytes(MAX_SIZE_DATA_BYTE, "big") + data.chunks.to_bytes(MAX_SIZE_DATA_BYTE, "big") + \
+        data.size.to_bytes(MAX_SIZE_DATA_BYTE, "big")
+    if data.key is None:
+        output.append(b"lo" + values)
+        return current_byte + 2 + 3 * MAX_SIZE_DATA_BYTE
+
+    # the key follows the values, with its length
+    key = data.key.encode("utf-8")
+    output.append(b"lk" + values + len(key).to_bytes(MAX_SIZE_DATA_BYTE, "big") + key)
+    return current_byte + 2 + 4 * MAX_SIZE_DATA_BYTE + len(key)
+
+
+def __dump_blob_ref(data: BlobRef, current_byte: int, output: list) -> int:
+    """
+    pickle the reference to a deduplicated blob (the blob itself is stored by the blob store of the database)
+    :param data: the BlobRef
+    :param current_byte: where the reference starts
+    :param output: the list of chunks to append to
+    :return: where the reference ends
+    """
+    output.append(b"bl" + data.digest + data.size.to_bytes(MAX_SIZE_DATA_BYTE, "big"))
+    return current_byte + 2 + DIGEST_BYTE + MAX_SIZE_DATA_BYTE
+
+
+def __size_compressed(data: Compressed) -> int:
+    """
+    size of a compressed field, the field is compressed here (once) as the size depends on it
+    :param data: the Compressed value
+    :return: the size of the compressed field, or of the plain field if compressing does not make it smaller
+    """
+    if 1 not in data.encoded:
+        # pickle the value on its own, its offsets are relative to the start of the decompressed buffer
+        plain = []
+        DUMP_FUNCTIONS[type(data.value)](data.value, 0, plain)
+        plain = b"".join(plain)
+
+        codec_id, compressed = data.compress(plain)
+        if 2 + 1 + MAX_SIZE_DATA_BYTE + len(compressed) < len(plain):
+            data.encoded[1] = b"cz" + codec_id.to_bytes(1, "big") + \
+                len(compressed).to_bytes(MAX_SIZE_DATA_BYTE, "big") + compressed
+        else:
+            data.encoded[1] = b""
+    if not data.encoded[1]:
+        return SIZE_FUNCTIONS[type(data.value)](data.value)
+    return len(data.encoded[1])
+
+
+def __dump_compressed(data: Compressed, current_byte: int, output: list) -> int:
+    """
+    pickle a compressed field (codec id and compressed length in the header), the plain field if compressing does not
+    make it smaller
+    :param data: the Compressed value
+    :param current_byte: where the field starts
+    :param output: the list of chunks to append to
+    :return: where the field ends
+    """
+    __size_compressed(data)
+    if not data.encoded[1]:
+        return DUMP_FUNCTIONS[type(data.value)](data.value, current_byte, output)
+    output.append(data.encoded[1])
+    return current_byte + len(data.encoded[1])
 
 
 DUMP_FUNCTIONS = {
@@ -177,169 +390,408 @@ DUMP_FUNCTIONS = {
     int: __dump_int,
     float: __dump_float,
     datetime: __dump_datetime,
-    bytes: __dump_bytes
+    bytes: __dump_bytes,
+    bytearray: __dump_bytes,
+    memoryview: __dump_bytes,
+    LargeObject: __dump_large_object,
+    BlobRef: __dump_blob_ref,
+    Compressed: __dump_compressed
 }
 
 
-def load(data):
+def format_version(data):
+    """
+    Get the format of a pickled MoNode
+    :param data: the pickled MoNode (at least its first 2 bytes)
+    :return: 1 or 2, None if it is not a MoNode of this module (e.g. a MoNode pickled by python pickle)
+    """
+    if data[:2] == b"mn":
+        return 1
+    if data[:1] == bytes([monode_pickle_v2.VERSION]):
+        return monode_pickle_v2.VERSION
+    return None
+
+
+def load(data, copy=True):
     """
-    Load the data from the byte string of the pickled data
+    Load the data from the byte string of the pickled data (of any version)
+
+    The whole decode walks a single memoryview with an integer cursor, so no intermediate tail of the buffer is ever
+    copied. With copy=False the bytes fields (such as MoNode.data) are returned as memoryviews into the source buffer,
+    the caller must then keep the source buffer alive for as long as the MoNode is in use.
 
-    :param data: the byte string to be loaded
+    :param data: the byte string to be loaded (bytes, bytearray or memoryview)
+    :param copy: whether to copy the bytes fields out of the source buffer
     :return: MoNode object
     """
     # verify the type
-    if type(data) != bytes:
+    if not isinstance(data, (bytes, bytearray, memoryview)):
         raise TypeError("data must be a byte string")
 
+    view = memoryview(data)
+    if format_version(view) == monode_pickle_v2.VERSION:
+        return monode_pickle_v2.load(view, copy)
+
     # verify the header
-    if data[:2] != b"mn":
+    if view[:2] != b"mn":
         raise ValueError("This is not a MoNode byte string")
 
-    # get the length of the data
-    data_len = int.from_bytes(data[2:10], "big")
-
-    outlist = []
-
-    # get the number of elements in the list
-    data = data[10:]
-    output, _ = __load_list(data)
+    # skip the header (2 bytes for b"mn" and 8 bytes for the length)
+    output, _ = __load_list(view, 10, copy)
 
     # create a MoNode object from the list
     return MoNode(name=output[0], f_type=output[1], size=output[2], date=output[3], description=output[4],
                   notes=output[5], tags=output[6], data=output[7])
 
 
-def __load_list(data) -> tuple[list[Any], bytes]:
+def read_offset_key(data) -> List[int]:
     """
-    Load the list object from pickled data
-    must start with "li"
-    :param data: the pickled data
-    :return: the list and the remaining data
+    Read the offset key of a pickled MoNode (of any version), the key holds the absolute byte position of each field in
+    MONODE_FIELDS
+    :param data: the pickled MoNode (only the header and the key are needed)
+    :return: list of byte positions
     """
-    # verify the header
-    if data[:2] != b"li":
+    return __read_bounds(data)[:-1]
+
+
+def __read_bounds(data) -> List[int]:
+    """
+    the byte position of each field followed by the end of the MoNode
+    """
+    view = memoryview(data)
+    if format_version(view) == monode_pickle_v2.VERSION:
+        bounds = monode_pickle_v2.read_bounds(view)
+        if len(bounds) != len(MONODE_FIELDS) + 1:
+            raise ValueError(f"A MoNode has {len(MONODE_FIELDS)} fields not {len(bounds) - 1}")
+        return bounds
+
+    if view[:2] != b"mn":
+        raise ValueError("This is not a MoNode byte string")
+    if view[10:12] != b"li":
         raise ValueError("This is not a list byte string")
 
-    output = []
-    # get the length of the data
-    data_len = int.from_bytes(data[2:10], "big")
-    # trim the data
-    list_data = data[10:data_len + 10]
-    # get the number of elements in the list
-    num_elements = int.from_bytes(list_data[:8], "big")
-    # remove the key portion of the data
-    list_data = list_data[8 + num_elements * MAX_SIZE_DATA_BYTE:]
+    num_elements = int.from_bytes(view[20:28], "big")
+    if num_elements != len(MONODE_FIELDS):
+        raise ValueError(f"A MoNode has {len(MONODE_FIELDS)} fields not {num_elements}")
+
+    if len(view) < HEADER_SIZE + num_elements * MAX_SIZE_DATA_BYTE:
+        raise ValueError("The MoNode byte string is truncated")
+
+    return [int.from_bytes(view[28 + i * MAX_SIZE_DATA_BYTE:36 + i * MAX_SIZE_DATA_BYTE], "big")
+            for i in range(num_elements)] + [int.from_bytes(view[2:10], "big")]
+
+
+def load_element(data, pos, copy=True, version=1):
+    """
+    Load a single pickled object starting at byte pos
+    :param data: the pickled data
+    :param pos: the byte position of the object type header
+    :param copy: whether to copy the bytes fields
+    :param version: the format of the MoNode the object comes from
+    :return: the object
+    """
+    if version == monode_pickle_v2.VERSION:
+        return monode_pickle_v2.load_element(data, pos, copy)
+    return __load_any(memoryview(data), pos, copy)[0]
+
+
+def load_fields(read_at, fields, copy=True) -> dict:
+    """
+    Load only some fields of a pickled MoNode using positioned reads, the header and the offset key are read first and
+    then only the byte ranges of the requested fields (fields next to each other are read in one go)
+
+    :param read_at: function (offset, length) -> bytes reading from the pickled MoNode
+    :param fields: the fields to load (see MONODE_FIELDS), or "notes.<key>" to only decode some keys of the notes (see
+    get_note), they are returned in a notes dict holding only the keys the MoNode has
+    :param copy: whether to copy the bytes fields out of the read buffer
+    :return: dict of field name to value
+    """
+    note_keys = [f[len("notes."):] for f in fields if f.startswith("notes.")]
+    fields = [f for f in fields if not f.startswith("notes.")]
+    unknown = [f for f in fields if f not in MONODE_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown MoNode fields {unknown}")
+    # the whole notes are decoded anyway
+    if "notes" in fields:
+        note_keys = []
+
+    head = read_at(0, HEAD_READ)
+    version = format_version(head)
+
+    # the end of a field is the start of the next one, the last one ends with the MoNode
+    bounds = __read_bounds(head)
+
+    # group the fields that are next to each other
+    groups = []
+    for i in sorted({MONODE_FIELDS.index(f) for f in fields + (["notes"] if note_keys else [])}):
+        if groups and groups[-1][-1] == i - 1:
+            groups[-1].append(i)
+        else:
+            groups.append([i])
+
+    output = {}
+    for group in groups:
+        start = bounds[group[0]]
+        length = bounds[group[-1] + 1] - start
+        chunk = read_at(start, length)
+        if len(chunk) < length:
+            raise ValueError("The MoNode byte string is truncated")
+        for i in group:
+            if note_keys and MONODE_FIELDS[i] == "notes":
+                output["notes"] = __load_notes(chunk, bounds[i] - start, note_keys, copy, version)
+            else:
+                output[MONODE_FIELDS[i]] = load_element(chunk, bounds[i] - start, copy, version)
+
+    return output
+
+
+def get_note(data, key, default=None, copy=True):
+    """
+    Get one key of the notes of a pickled MoNode, the notes of version 2 are searched in their offset table (the other
+    keys are not decoded), the notes of version 1 are decoded
+    :param data: the pickled MoNode
+    :param key: the key of the notes
+    :param default: returned if the notes do not have the key
+    :param copy: whether to copy the bytes fields
+    :return: the value
+    """
+    view = memoryview(data)
+    notes = __load_notes(view, read_offset_key(view)[MONODE_FIELDS.index("notes")], [key], copy,
+                         format_version(view))
+    return notes.get(key, default)
+
+
+def __load_notes(data, pos, keys, copy=True, version=1) -> dict:
+    """
+    Load some keys of the pickled notes at pos
+    :return: dict of the keys the notes have to their value
+    """
+    if version != monode_pickle_v2.VERSION:
+        notes = load_element(data, pos, copy, version)
+        return {key: notes[key] for key in keys if key in notes}
+
+    output = {}
+    for key in keys:
+        found, value = monode_pickle_v2.lookup(data, pos, key, copy)
+        if found:
+            output[key] = value
+    return output
+
+
+def load_type(read_at, field):
+    """
+    Get the type of a field of a pickled MoNode without loading it (e.g. to know if the data is a reference)
+    :param read_at: function (offset, length) -> bytes reading from the pickled MoNode
+    :param field: the field (see MONODE_FIELDS)
+    :return: the type (see KEY_CODE)
+    """
+    head = read_at(0, HEAD_READ)
+    position = read_offset_key(head)[MONODE_FIELDS.index(field)]
+    if format_version(head) == monode_pickle_v2.VERSION:
+        return monode_pickle_v2.load_type_code(read_at(position, 1))
+
+    code = bytes(read_at(position, 2))
+    if code not in KEY_CODE:
+        raise ValueError(f"Unknown type code {code}")
+    return KEY_CODE[code]
+
+
+def open_view(data, copy=True):
+    """
+    Open a lazy view over a pickled MoNode, see LazyMoNode
+    :param data: the pickled MoNode
+    :param copy: whether to copy the bytes fields out of the buffer when they are accessed
+    :return: LazyMoNode
+    """
+    return LazyMoNode(data, copy)
+
+
+def __check_header(view: memoryview, pos: int, code: bytes):
+    """
+    Verify the 2 bytes type header at the cursor
+    :param view: the pickled data
+    :param pos: the cursor
+    :param code: the expected type code
+    """
+    if view[pos:pos + 2] != code:
+        raise ValueError(f"This is not a {KEY_CODE[code].__name__} byte string {bytes(view[pos:pos + 2])}")
+
+
+def __load_any(view: memoryview, pos: int, copy=True) -> Tuple[Any, int]:
+    """
+    Load whatever object is at the cursor by looking at its type header
+    :param view: the pickled data
+    :param pos: the cursor
+    :param copy: whether to copy the bytes fields
+    :return: the object and the cursor after it
+    """
+    data_type = KEY_CODE.get(bytes(view[pos:pos + 2]))
+    if data_type is None or data_type not in LOAD_FUNCTIONS:
+        raise ValueError(f"Unknown type header {bytes(view[pos:pos + 2])} at byte {pos}")
+    return LOAD_FUNCTIONS[data_type](view, pos, copy)
+
+
+def __load_list(view: memoryview, pos: int, copy=True) -> Tuple[List[Any], int]:
+    """
+    Load the list object from pickled data
+    must start with "li"
+    :param view: the pickled data
+    :param pos: the cursor
+    :param copy: whether to copy the bytes fields
+    :return: the list and the cursor after it
+    """
+    __check_header(view, pos, b"li")
 
+    # get the number of elements in the list (after the 2 + 8 bytes header)
+    num_elements = int.from_bytes(view[pos + 10:pos + 18], "big")
+    # skip the key portion of the data, the elements are read in order
+    pos += 18 + num_elements * MAX_SIZE_DATA_BYTE
 
+    output = []
     for n in range(num_elements):
-        # get the type of the first element
-        data_type = list_data[:2]
-        # get the function to load the data
-        n_ele, list_data = LOAD_FUNCTIONS[KEY_CODE[data_type]](list_data)
+        n_ele, pos = __load_any(view, pos, copy)
         output.append(n_ele)
 
-    return output, data[10 + data_len:]
+    return output, pos
 
 
-def __load_dict(data) -> tuple[dict, bytes]:
+def __load_dict(view: memoryview, pos: int, copy=True) -> Tuple[dict, int]:
     """
     load the dict object from pickled data
-    :param data: the pickled data
-    :return: the dict
+    :param view: the pickled data
+    :param pos: the cursor
+    :param copy: whether to copy the bytes fields
+    :return: the dict and the cursor after it
     """
-    # TODO CHANGE THIS TO BE MORE EFFICIENT LOOK AT __dump_dict
-    # verify the header
-    if data[:2] != b"di":
-        raise ValueError(f"This is not a dict byte string {data[:2]}")
+    __check_header(view, pos, b"di")
 
     # remove the header and get list back
-    data = data[2:]
-    l, data = __load_list(data)
-
-    output = {}
+    l, pos = __load_list(view, pos + 2, copy)
 
     # check integrity of the list to dict
     if len(l) % 2 != 0:
         raise ValueError("The list is not a valid dict")
-    else:
-        for i in range(int(len(l) / 2)):
-            output[l[2 * i]] = l[2 * i + 1]
 
-    return output, data
+    return dict(zip(l[::2], l[1::2])), pos
 
 
-def __load_str(data) -> tuple[str, bytes]:
+def __load_str(view: memoryview, pos: int, copy=True) -> Tuple[str, int]:
     """
     Load the string object from pickled data
-    :param data: the pickled data
-    :return: the string
+    :param view: the pickled data
+    :param pos: the cursor
+    :return: the string and the cursor after it
     """
-    # verify the header
-    if data[:2] != b"st":
-        raise ValueError("This is not a string byte string")
+    __check_header(view, pos, b"st")
     # get the length of the data
-    data_len = int.from_bytes(data[2:10], "big")
-    # return the data
-    return data[10:10 + data_len].decode(), data[10 + data_len:]
+    data_len = int.from_bytes(view[pos + 2:pos + 10], "big")
+    end = pos + 10 + data_len
+    # decode straight out of the buffer
+    return str(view[pos + 10:end], "utf-8"), end
 
 
-def __load_int(data) -> tuple[int, bytes]:
+def __load_int(view: memoryview, pos: int, copy=True) -> Tuple[int, int]:
     """
     Load the int object from pickled data
-    :param data: the pickled data
-    :return: the int
+    :param view: the pickled data
+    :param pos: the cursor
+    :return: the int and the cursor after it
     """
-    # verify the header
-    if data[:2] != b"in":
-        raise ValueError("This is not an int byte string")
-
-    # return the data
-    return int.from_bytes(data[2:10], "big"), data[10:]
+    __check_header(view, pos, b"in")
+    return int.from_bytes(view[pos + 2:pos + 10], "big"), pos + 10
 
 
-def __load_float(data) -> tuple[float, bytes]:
+def __load_float(view: memoryview, pos: int, copy=True) -> Tuple[float, int]:
     """
     Load the float object from pickled data
-    :param data: the pickled data
-    :return: the float
+    :param view: the pickled data
+    :param pos: the cursor
+    :return: the float and the cursor after it
     """
-    # verify the header
-    if data[:2] != b"fl":
-        raise ValueError("This is not a float byte string")
-
-    # return the data
-    return struct.unpack('f', data[2:10])[0], data[10:]
+    __check_header(view, pos, b"fl")
+    # NOTE: __dump_float packs a 4 bytes single precision float
+    return struct.unpack_from('f', view, pos + 2)[0], pos + 2 + FLOAT_BYTE
 
 
-def __load_datetime(data) -> tuple[datetime, bytes]:
+def __load_datetime(view: memoryview, pos: int, copy=True) -> Tuple[datetime, int]:
     """
     Load the datetime object from pickled data
-    :param data: the pickled data
-    :return: the datetime
+    :param view: the pickled data
+    :param pos: the cursor
+    :return: the datetime and the cursor after it
     """
-    # verify the header
-    if data[:2] != b"dt":
-        raise ValueError("This is not a datetime byte string")
-
-    # return the data
-    return datetime.fromtimestamp(struct.unpack('d', data[2:10])[0]), data[10:]
+    __check_header(view, pos, b"dt")
+    return datetime.fromtimestamp(struct.unpack_from('d', view, pos + 2)[0]), pos + 2 + MAX_DATE_BYTE
 
 
-def __load_bytes(data) -> tuple[bytes, bytes]:
+def __load_bytes(view: memoryview, pos: int, copy=True) -> Tuple[Any, int]:
     """
     Load the bytes object from pickled data
-    :param data: the pickled data
-    :return: the bytes
+    :param view: the pickled data
+    :param pos: the cursor
+    :param copy: if False return a memoryview into the source buffer instead of a copy
+    :return: the bytes and the cursor after it
     """
-    # verify the header
-    if data[:2] != b"by":
-        raise ValueError("This is not a bytes byte string")
-
+    __check_header(view, pos, b"by")
     # get the length of the data
-    data_len = int.from_bytes(data[2:10], "big")
-    # return the data
-    return data[10:10 + data_len], data[10 + data_len:]
+    data_len = int.from_bytes(view[pos + 2:pos + 10], "big")
+    end = pos + 10 + data_len
+    if copy:
+        return view[pos + 10:end].tobytes(), end
+    return view[pos + 10:end], end
+
+
+def __load_large_object(view: memoryview, pos: int, copy=True) -> Tuple[LargeObject, int]:
+    """
+    Load the reference to chunked data from pickled data
+    :param view: the pickled data
+    :param pos: the cursor
+    :return: the LargeObject and the cursor after it
+    """
+    if view[pos:pos + 2] == b"lo":
+        keyed = False
+    else:
+        __check_header(view, pos, b"lk")
+        keyed = True
+    values = [int.from_bytes(view[pos + 2 + i * MAX_SIZE_DATA_BYTE:pos + 10 + i * MAX_SIZE_DATA_BYTE], "big")
+              for i in range(3)]
+    pos += 2 + 3 * MAX_SIZE_DATA_BYTE
+    if not keyed:
+        return LargeObject(*values), pos
+
+    key_len = int.from_bytes(view[pos:pos + MAX_SIZE_DATA_BYTE], "big")
+    end = pos + MAX_SIZE_DATA_BYTE + key_len
+    return LargeObject(*values, key=str(view[pos + MAX_SIZE_DATA_BYTE:end], "utf-8")), end
+
+
+def __load_blob_ref(view: memoryview, pos: int, copy=True) -> Tuple[BlobRef, int]:
+    """
+    Load the reference to a deduplicated blob from pickled data
+    :param view: the pickled data
+    :param pos: the cursor
+    :return: the BlobRef and the cursor after it
+    """
+    __check_header(view, pos, b"bl")
+    end = pos + 2 + DIGEST_BYTE
+    return BlobRef(view[pos + 2:end].tobytes(), int.from_bytes(view[end:end + MAX_SIZE_DATA_BYTE], "big")), \
+        end + MAX_SIZE_DATA_BYTE
+
+
+def __load_compressed(view: memoryview, pos: int, copy=True) -> Tuple[Any, int]:
+    """
+    Load a compressed field from pickled data
+    :param view: the pickled data
+    :param pos: the cursor
+    :return: the value of the field (decompressed) and the cursor after it
+    """
+    __check_header(view, pos, b"cz")
+    codec_id = view[pos + 2]
+    if codec_id not in DECOMPRESS:
+        raise ValueError(f"Unknown codec {codec_id} at byte {pos}")
+    data_len = int.from_bytes(view[pos + 3:pos + 11], "big")
+    end = pos + 11 + data_len
+    plain = DECOMPRESS[codec_id](view[pos + 11:end])
+    return __load_any(memoryview(plain), 0, True)[0], end
 
 
 LOAD_FUNCTIONS = {
@@ -349,5 +801,49 @@ LOAD_FUNCTIONS = {
     int: __load_int,
     float: __load_float,
     datetime: __load_datetime,
-    bytes: __load_bytes
+    bytes: __load_bytes,
+    LargeObject: __load_large_object,
+    BlobRef: __load_blob_ref,
+    Compressed: __load_compressed
 }
+
+
+class LazyMoNode:
+    """
+    Read only view of a pickled MoNode
+
+    Only the offset key is read when the view is created, each field (name, type, size, modi, desc, notes, tags, data)
+    is decoded the first time it is accessed by jumping straight to its recorded offset and is then kept on the view.
+    Listing the name and tags of a node never decodes its data.
+    """
+
+    def __init__(self, data, copy=True):
+        """
+        Create the view (USE monode_pickle.open_view() INSTEAD)
+
+        :param data: the pickled MoNode
+        :param copy: whether to copy the bytes fields out of the buffer when they are accessed
+        """
+        self._view = memoryview(data)
+        self._copy = copy
+        self._version = format_version(self._view)
+        self._key = read_offset_key(self._view)
+
+    def __getattr__(self, item):
+        """
+        Decode a field on first access (only called when the field is not cached yet)
+        """
+        if item not in MONODE_FIELDS:
+            raise AttributeError(f"MoNode has no field {item}")
+
+        value = load_element(self._view, self._key[MONODE_FIELDS.index(item)], self._copy, self._version)
+        setattr(self, item, value)
+        return value
+
+    def to_monode(self):
+        """
+        Decode every remaining field and build a regular MoNode
+        :return: the MoNode
+        """
+        return MoNode(name=self.name, f_type=self.type, size=self.size, date=self.modi, description=self.desc,
+                      notes=self.notes, tags=self.tags, data=self.data)
@@ -0,0 +1,592 @@
+"""
+monode_pickle_v2.py
+Created on 2026-10-19 2:00:00 AM
+By: Will Selke
+
+This file contains the version 2 of the MoNode format (USE monode_pickle INSTEAD, it reads both versions). Version 1
+spends 2 bytes of type and 8 bytes of length on every element and 8 bytes per entry of every list, version 2 keeps the
+same layout with smaller headers:
+    MoNode : the version byte (2), a varint of the number of fields, a varint of the length of each field, the fields
+    (the offset of a field is the end of the head plus the lengths of the fields before it)
+    every element : a single byte type code (see TYPE_CODE) followed by
+        list / dict : varint number of elements (of pairs for a dict), varint length of the elements, the elements
+        keyed dict (the dicts with str keys, e.g. the notes) : varint number of pairs, varint length of the rest, the
+        width of an offset (1 byte), the offset table (the offset of each pair from the first pair, sorted by key) and
+        the pairs in their order, a key is found by a binary search over the table without decoding the other pairs
+        (see lookup)
+        str / bytes : varint length, the utf-8 / raw bytes
+        int : zigzag varint (negative ints are stored too)
+        float / datetime : 8 bytes double, little endian (datetime as a timestamp)
+        LargeObject : varints of the chunk size, the number of chunks and the size (keyed large object: then varint
+        length and the utf-8 key of the chunks)
+        BlobRef : the 32 bytes digest, varint size
+        Compressed : the codec byte, varint length, the compressed element (pickled on its own, at offset 0)
+"""
+import struct
+from datetime import datetime
+from typing import Tuple, List, Any
+
+from MoMem import MoNode
+from MoMem.MoNode.large_object import LargeObject
+from MoMem.MoNode.blob_ref import BlobRef
+from MoMem.MoNode.compression import Compressed, DECOMPRESS
+
+VERSION = 2
+
+DIGEST_BYTE = 32
+DOUBLE = struct.Struct("<d")
+
+# the longest varint (a 64 bits number)
+MAX_VARINT_BYTE = 10
+
+
+class KeyedDict(dict):
+    """
+    Type of the dicts stored with a sorted offset table (every dict with str keys, they are loaded as dict)
+    """
+
+
+class KeyedLargeObject(LargeObject):
+    """
+    Type of the large objects stored with the key of their chunks (they are loaded as LargeObject)
+    """
+
+
+# the single byte preceding the data to determine the type
+TYPE_CODE = {
+    b"l": list,
+    b"d": dict,
+    b"k": KeyedDict,
+    b"s": str,
+    b"i": int,
+    b"f": float,
+    b"t": datetime,
+    b"b": bytes,
+    b"o": LargeObject,
+    b"g": KeyedLargeObject,
+    b"r": BlobRef,
+    b"z": Compressed
+}
+CODE = {data_type: code for code, data_type in TYPE_CODE.items()}
+
+# widths of the offsets of a keyed dict
+OFFSET_WIDTHS = (1, 2, 4, 8)
+
+
+def varint(value: int) -> bytes:
+    """
+    Encode an unsigned int on as few bytes as it needs (7 bits per byte, the high bit tells another byte follows)
+    """
+    output = bytearray()
+    while value >= 0x80:
+        output.append(value & 0x7F | 0x80)
+        value >>= 7
+    output.append(value)
+    return bytes(output)
+
+
+def varint_size(value: int) -> int:
+    """
+    number of bytes of the varint of value
+    """
+    return max(1, (value.bit_length() + 6) // 7)
+
+
+def read_varint(view, pos: int) -> Tuple[int, int]:
+    """
+    Decode a varint
+    :return: the value and the cursor after it
+    """
+    value = shift = 0
+    while True:
+        if pos >= len(view):
+            raise ValueError("The varint is truncated")
+        byte = view[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def dump_chunks(MoNode) -> List[Any]:
+    """
+    Pickle the MoNode as a list of byte chunks (see monode_pickle.dump_chunks)
+
+    :param MoNode: MoNode to pickle
+    :return: list of bytes-like chunks
+    """
+    data = [MoNode.name, MoNode.type, MoNode.size, MoNode.modi, MoNode.desc, MoNode.notes, MoNode.tags, MoNode.data]
+    sizes = [SIZE_FUNCTIONS[type(i)](i) for i in data]
+
+    output = [bytes([VERSION]) + varint(len(data)) + b"".join(varint(size) for size in sizes)]
+    for i in data:
+        DUMP_FUNCTIONS[type(i)](i, output)
+    return output
+
+
+def read_bounds(head) -> List[int]:
+    """
+    Read the head of a pickled MoNode
+    :param head: the start of the pickled MoNode (at least the head, see max_head_size)
+    :return: list of the byte position of each field followed by the end of the MoNode
+    """
+    view = memoryview(head)
+    if not len(view) or view[0] != VERSION:
+        raise ValueError("This is not a version 2 MoNode byte string")
+    num_elements, pos = read_varint(view, 1)
+    sizes = []
+    for _ in range(num_elements):
+        size, pos = read_varint(view, pos)
+        sizes.append(size)
+
+    bounds = [pos]
+    for size in sizes:
+        bounds.append(bounds[-1] + size)
+    return bounds
+
+
+def max_head_size(num_elements: int) -> int:
+    """
+    the longest head of a MoNode of num_elements fields (read it to get the bounds in one read)
+    """
+    return 1 + MAX_VARINT_BYTE * (num_elements + 1)
+
+
+def __size_list(data: list) -> int:
+    """
+    size in bytes of the pickled list
+    """
+    body = sum(SIZE_FUNCTIONS[type(i)](i) for i in data)
+    return 1 + varint_size(len(data)) + varint_size(body) + body
+
+
+def __is_keyed(data: dict) -> bool:
+    """
+    whether a dict is stored with an offset table (its keys can be sorted)
+    """
+    return all(type(k) is str for k in data)
+
+
+def __offset_width(size: int) -> int:
+    """
+    the smallest width of the offsets of a keyed dict whose pairs take size bytes
+    """
+    return next(width for width in OFFSET_WIDTHS if size < 256 ** width)
+
+
+def __size_dict(data: dict) -> int:
+    """
+    size in bytes of the pickled dict
+    """
+    body = sum(SIZE_FUNCTIONS[type(k)](k) + SIZE_FUNCTIONS[type(v)](v) for k, v in data.items())
+    if __is_keyed(data):
+        body += 1 + len(data) * __offset_width(body)
+    return 1 + varint_size(len(data)) + varint_size(body) + body
+
+
+def __size_str(data: str) -> int:
+    """
+    size in bytes of the pickled string
+    """
+    size = len(data.encode())
+    return 1 + varint_size(size) + size
+
+
+def __size_bytes(data) -> int:
+    """
+    size in bytes of the pickled bytes
+    """
+    size = memoryview(data).nbytes
+    return 1 + varint_size(size) + size
+
+
+def __zigzag(data: int) -> int:
+    """
+    the negative ints are mapped to the odd numbers so small negative ints stay short
+    """
+    return data * 2 if data >= 0 else -data * 2 - 1
+
+
+SIZE_FUNCTIONS = {
+    list: __size_list,
+    dict: __size_dict,
+    str: __size_str,
+    int: lambda data: 1 + varint_size(__zigzag(data)),
+    float: lambda data: 1 + DOUBLE.size,
+    datetime: lambda data: 1 + DOUBLE.size,
+    bytes: __size_bytes,
+    bytearray: __size_bytes,
+    memoryview: __size_bytes,
+    LargeObject: lambda data: 1 + varint_size(data.chunk_size) + varint_size(data.chunks) + varint_size(data.size) +
+    (0 if data.key is None else __size_str(data.key) - 1),
+    BlobRef: lambda data: 1 + DIGEST_BYTE + varint_size(data.size),
+    Compressed: lambda data: __size_compressed(data)
+}
+
+
+def __dump_list(data: list, output: list):
+    """
+    pickle the list object
+    :param data: the list
+    :param output: the list of chunks to append to
+    """
+    body = sum(SIZE_FUNCTIONS[type(i)](i) for i in data)
+    output.append(b"l" + varint(len(data)) + varint(body))
+    for i in data:
+        DUMP_FUNCTIONS[type(i)](i, output)
+
+
+def __dump_dict(data: dict, output: list):
+    """
+    pickle the dict object, the keys and values one after the other (after the offset table for a keyed dict)
+    :param data: the dict
+    :param output: the list of chunks to append to
+    """
+    sizes = [SIZE_FUNCTIONS[type(k)](k) + SIZE_FUNCTIONS[type(v)](v) for k, v in data.items()]
+    body = sum(sizes)
+    if not __is_keyed(data):
+        output.append(b"d" + varint(len(data)) + varint(body))
+    else:
+        # the offset of each pair, ordered by the utf-8 bytes of the keys (the order of the binary search)
+        offsets = [0]
+        for size in sizes[:-1]:
+            offsets.append(offsets[-1] + size)
+        width = __offset_width(body)
+        table = b"".join(offset.to_bytes(width, "little")
+                         for _, offset in sorted(zip((k.encode() for k in data), offsets)))
+        output.append(b"k" + varint(len(data)) + varint(1 + len(table) + body) + bytes([width]) + table)
+
+    for k, v in data.items():
+        DUMP_FUNCTIONS[type(k)](k, output)
+        DUMP_FUNCTIONS[type(v)](v, output)
+
+
+def __dump_str(data: str, output: list):
+    """
+    pickle the string object
+    """
+    data = data.encode()
+    output.append(b"s" + varint(len(data)) + data)
+
+
+def __dump_int(data: int, output: list):
+    """
+    pickle the int object
+    """
+    output.append(b"i" + varint(__zigzag(data)))
+
+
+def __dump_float(data: float, output: list):
+    """
+    pickle the float object (double precision)
+    """
+    output.append(b"f" + DOUBLE.pack(data))
+
+
+def __dump_datetime(data: datetime, output: list):
+    """
+    pickle the datetime object
+    """
+    output.append(b"t" + DOUBLE.pack(data.timestamp()))
+
+
+def __dump_bytes(data, output: list):
+    """
+    pickle the bytes data, the payload itself is appended as is (not copied)
+    """
+    output.append(b"b" + varint(memoryview(data).nbytes))
+    output.append(data)
+
+
+def __dump_large_object(data: LargeObject, output: list):
+    """
+    pickle the reference to chunked data (the chunks themselves are stored by the collection)
+    """
+    if data.key is None:
+        output.append(b"o" + varint(data.chunk_size) + varint(data.chunks) + varint(data.size))
+        return
+    key = data.key.encode("utf-8")
+    output.append(b"g" + varint(data.chunk_size) + varint(data.chunks) + varint(data.size) + varint(len(key)) + key)
+
+
+def __dump_blob_ref(data: BlobRef, output: list):
+    """
+    pickle the reference to a deduplicated blob (the blob itself is stored by the blob store of the database)
+    """
+    output.append(b"r" + data.digest + varint(data.size))
+
+
+def __size_compressed(data: Compressed) -> int:
+    """
+    size of a compressed field, the field is compressed here (once) as the size depends on it
+    :return: the size of the compressed field, or of the plain field if compressing does not make it smaller
+    """
+    if VERSION not in data.encoded:
+        plain = []
+        DUMP_FUNCTIONS[type(data.value)](data.value, plain)
+        plain = b"".join(plain)
+
+        codec_id, compressed = data.compress(plain)
+        encoded = b"z" + bytes([codec_id]) + varint(len(compressed)) + compressed
+        data.encoded[VERSION] = encoded if len(encoded) < len(plain) else b""
+    if not data.encoded[VERSION]:
+        return SIZE_FUNCTIONS[type(data.value)](data.value)
+    return len(data.encoded[VERSION])
+
+
+def __dump_compressed(data: Compressed, output: list):
+    """
+    pickle a compressed field, the plain field if compressing does not make it smaller
+    """
+    __size_compressed(data)
+    if not data.encoded[VERSION]:
+        DUMP_FUNCTIONS[type(data.value)](data.value, output)
+    else:
+        output.append(data.encoded[VERSION])
+
+
+DUMP_FUNCTIONS = {
+    list: __dump_list,
+    dict: __dump_dict,
+    str: __dump_str,
+    int: __dump_int,
+    float: __dump_float,
+    datetime: __dump_datetime,
+    bytes: __dump_bytes,
+    bytearray: __dump_bytes,
+    memoryview: __dump_bytes,
+    LargeObject: __dump_large_object,
+    BlobRef: __dump_blob_ref,
+    Compressed: __dump_compressed
+}
+
+
+def load(data, copy=True):
+    """
+    Load a version 2 pickled MoNode (see monode_pickle.load)
+    """
+    view = memoryview(data)
+    bounds = read_bounds(view)
+    output = [load_element(view, pos, copy) for pos in bounds[:-1]]
+    return MoNode(name=output[0], f_type=output[1], size=output[2], date=output[3], description=output[4],
+                  notes=output[5], tags=output[6], data=output[7])
+
+
+def load_element(data, pos, copy=True):
+    """
+    Load a single pickled object starting at byte pos
+    """
+    return __load_any(memoryview(data), pos, copy)[0]
+
+
+def load_type_code(code) -> type:
+    """
+    :return: the type of a type code (see TYPE_CODE)
+    """
+    if bytes(code) not in TYPE_CODE:
+        raise ValueError(f"Unknown type code {bytes(code)}")
+    data_type = TYPE_CODE[bytes(code)]
+    return {KeyedDict: dict, KeyedLargeObject: LargeObject}.get(data_type, data_type)
+
+
+def __load_any(view: memoryview, pos: int, copy=True) -> Tuple[Any, int]:
+    """
+    Load whatever object is at the cursor by looking at its type code
+    """
+    data_type = TYPE_CODE.get(bytes(view[pos:pos + 1]))
+    if data_type is None:
+        raise ValueError(f"Unknown type code {bytes(view[pos:pos + 1])} at byte {pos}")
+    return LOAD_FUNCTIONS[data_type](view, pos + 1, copy)
+
+
+def __load_list(view: memoryview, pos: int, copy=True) -> Tuple[List[Any], int]:
+    """
+    Load the list object (the cursor is after the type code)
+    """
+    num_elements, pos = read_varint(view, pos)
+    _, pos = read_varint(view, pos)
+    output = []
+    for _ in range(num_elements):
+        element, pos = __load_any(view, pos, copy)
+        output.append(element)
+    return output, pos
+
+
+def __load_dict(view: memoryview, pos: int, copy=True) -> Tuple[dict, int]:
+    """
+    Load the dict object (the cursor is after the type code)
+    """
+    num_elements, pos = read_varint(view, pos)
+    _, pos = read_varint(view, pos)
+    output = {}
+    for _ in range(num_elements):
+        key, pos = __load_any(view, pos, copy)
+        output[key], pos = __load_any(view, pos, copy)
+    return output, pos
+
+
+def __load_keyed_dict(view: memoryview, pos: int, copy=True) -> Tuple[dict, int]:
+    """
+    Load the keyed dict object (the cursor is after the type code), the pairs are read in order, the table is skipped
+    """
+    num_elements, pos = read_varint(view, pos)
+    _, pos = read_varint(view, pos)
+    pos += 1 + num_elements * view[pos]
+    output = {}
+    for _ in range(num_elements):
+        key, pos = __load_any(view, pos, copy)
+        output[key], pos = __load_any(view, pos, copy)
+    return output, pos
+
+
+def lookup(data, pos, key, copy=True) -> Tuple[bool, Any]:
+    """
+    Get one key of a pickled dict without decoding the other pairs (binary search in the offset table of a keyed dict,
+    the other dicts are decoded)
+    :param data: the pickled data
+    :param pos: the byte position of the dict type code
+    :param key: the key
+    :param copy: whether to copy the bytes fields
+    :return: (whether the dict has the key, the value or None)
+    """
+    view = memoryview(data)
+    code = bytes(view[pos:pos + 1])
+    if code == b"z":
+        # the dict was compressed as a whole
+        codec_id = view[pos + 1]
+        if codec_id not in DECOMPRESS:
+            raise ValueError(f"Unknown codec {codec_id} at byte {pos}")
+        data_len, start = read_varint(view, pos + 2)
+        return lookup(DECOMPRESS[codec_id](view[start:start + data_len]), 0, key, copy)
+    if code != b"k":
+        output = load_element(view, pos, copy)
+        if not isinstance(output, dict):
+            raise ValueError(f"This is not a dict byte string {code}")
+        return key in output, output.get(key)
+
+    # a keyed dict only has str keys
+    if not isinstance(key, str):
+        return False, None
+    num_elements, pos = read_varint(view, pos + 1)
+    _, pos = read_varint(view, pos)
+    width = view[pos]
+    table = pos + 1
+    pairs = table + num_elements * width
+
+    target = key.encode()
+    lo, hi = 0, num_elements
+    while lo < hi:
+        mid = (lo + hi) // 2
+        start = pairs + int.from_bytes(view[table + mid * width:table + (mid + 1) * width], "little")
+        key_len, start = read_varint(view, start + 1)
+        found = bytes(view[start:start + key_len])
+        if found == target:
+            return True, __load_any(view, start + key_len, copy)[0]
+        if found < target:
+            lo = mid + 1
+        else:
+            hi = mid
+    return False, None
+
+
+def __load_str(view: memoryview, pos: int, copy=True) -> Tuple[str, int]:
+    """
+    Load the string object (the cursor is after the type code)
+    """
+    data_len, pos = read_varint(view, pos)
+    return str(view[pos:pos + data_len], "utf-8"), pos + data_len
+
+
+def __load_int(view: memoryview, pos: int, copy=True) -> Tuple[int, int]:
+    """
+    Load the int object (the cursor is after the type code)
+    """
+    value, pos = read_varint(view, pos)
+    return (value >> 1) ^ -(value & 1), pos
+
+
+def __load_float(view: memoryview, pos: int, copy=True) -> Tuple[float, int]:
+    """
+    Load the float object (the cursor is after the type code)
+    """
+    return DOUBLE.unpack_from(view, pos)[0], pos + DOUBLE.size
+
+
+def __load_datetime(view: memoryview, pos: int, copy=True) -> Tuple[datetime, int]:
+    """
+    Load the datetime object (the cursor is after the type code)
+    """
+    return datetime.fromtimestamp(DOUBLE.unpack_from(view, pos)[0]), pos + DOUBLE.size
+
+
+def __load_bytes(view: memoryview, pos: int, copy=True) -> Tuple[Any, int]:
+    """
+    Load the bytes object (the cursor is after the type code)
+    :param copy: if False return a memoryview into the source buffer instead of a copy
+    """
+    data_len, pos = read_varint(view, pos)
+    end = pos + data_len
+    if copy:
+        return view[pos:end].tobytes(), end
+    return view[pos:end], end
+
+
+def __load_large_object(view: memoryview, pos: int, copy=True) -> Tuple[LargeObject, int]:
+    """
+    Load the reference to chunked data (the cursor is after the type code)
+    """
+    values = []
+    for _ in range(3):
+        value, pos = read_varint(view, pos)
+        values.append(value)
+    return LargeObject(*values), pos
+
+
+def __load_keyed_large_object(view: memoryview, pos: int, copy=True) -> Tuple[LargeObject, int]:
+    """
+    Load the reference to chunked data and the key of its chunks (the cursor is after the type code)
+    """
+    large_object, pos = __load_large_object(view, pos)
+    key_len, pos = read_varint(view, pos)
+    large_object.key = str(view[pos:pos + key_len], "utf-8")
+    return large_object, pos + key_len
+
+
+def __load_blob_ref(view: memoryview, pos: int, copy=True) -> Tuple[BlobRef, int]:
+    """
+    Load the reference to a deduplicated blob (the cursor is after the type code)
+    """
+    digest = view[pos:pos + DIGEST_BYTE].tobytes()
+    size, pos = read_varint(view, pos + DIGEST_BYTE)
+    return BlobRef(digest, size), pos
+
+
+def __load_compressed(view: memoryview, pos: int, copy=True) -> Tuple[Any, int]:
+    """
+    Load a compressed field (the cursor is after the type code)
+    :return: the value of the field (decompressed) and the cursor after it
+    """
+    codec_id = view[pos]
+    if codec_id not in DECOMPRESS:
+        raise ValueError(f"Unknown codec {codec_id} at byte {pos}")
+    data_len, pos = read_varint(view, pos + 1)
+    end = pos + data_len
+    plain = DECOMPRESS[codec_id](view[pos:end])
+    return __load_any(memoryview(plain), 0, True)[0], end
+
+
+LOAD_FUNCTIONS = {
+    list: __load_list,
+    dict: __load_dict,
+    KeyedDict: __load_keyed_dict,
+    str: __load_str,
+    int: __load_int,
+    float: __load_float,
+    datetime: __load_datetime,
+    bytes: __load_bytes,
+    LargeObject: __load_large_object,
+    KeyedLargeObject: __load_keyed_large_object,
+    BlobRef: __load_blob_ref,
+    Compressed: __load_compressed
+}
@@ -1,3 +1,4 @@
 from .MoNode.monode import MoNode
 from .MoNode.monode_basic import *
-from .DB_COL.database import Database, Collection
\ No newline at end of file
+from .DB_COL.database import Database, Collection
+from .DB_COL.async_database import AsyncDatabase, AsyncCollection
\ No newline at end of file
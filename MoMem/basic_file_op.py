@@ -4,84 +4,606 @@ Created on 2023-02-25 7:46:00 PM
 By: Will Selke
 
 This file contains the basic file save / load / read / delete functions for MoMem. These functions serves as an interface between
-the MoMem and the file system. This file should not be used directly, instead use the MoMem functions.
+the MoMem and the storage backend (see storage.backend). This file should not be used directly, instead use the MoMem functions.
 """
 
-import os
 import MoMem.config.config as cfg
+from MoMem.storage.backend import get_backend
 
 
-def base_write(name, data, database, collection, overwrite=False):
+def __collection_path(database, collection, check=True):
     """
-    Most basic save function which set the name of the stored file
-
-    :param name: name of the file
-    :param data: data to save
-    :param database: database to save to
-    :param collection: collection to save to
-    :param overwrite: overwrite the file or not
+    Get the path of a collection
+    :param database: name of the database
+    :param collection: name of the collection
+    :param check: check that the database and the collection exist
+    :return: the path
     """
-    DISK = cfg.ROOT_DIR
-    path = os.path.join(DISK, database)
+    backend = get_backend()
     # check if database exists
-    if not os.path.exists(path):
+    if check and not backend.exists(database):
         raise FileNotFoundError("The database does not exist")
 
     # check if collection exists
-    path = os.path.join(path, collection)
-    if not os.path.exists(os.path.dirname(path)):
+    path = f"{database}/{collection}"
+    if check and not backend.exists(path):
         raise FileNotFoundError("The collection does not exist")
 
-    # check if file exists
-    path = os.path.join(path + "/data", name)
-    if not overwrite and os.path.exists(path):
-        raise FileExistsError(f"File {path} already exists")
+    return path
+
+
+def base_write(name, data, database, collection, overwrite=False, check=True, folder="data"):
+    """
+    Most basic save function which set the name of the stored file
+
+    :param name: name of the file
+    :param data: data to save (bytes or a list of bytes chunks, see monode_pickle.dump_chunks)
+    :param database: database to save to
+    :param collection: collection to save to
+    :param overwrite: overwrite the file or not
+    :param check: check that the database and the collection exist (bulk operations check them once)
+    :param folder: folder of the collection holding the file (see storage.file_engine for the sharded layout)
+    """
+    path = __collection_path(database, collection, check)
 
-    with open(path, "wb") as f:
-        # get the size in bytes of the data
-        f.write(data)
+    # exclusive fails if the file exists, no need to look for it first
+    get_backend().write(f"{path}/{folder}/{name}", data, exclusive=not overwrite)
 
 
-def base_read(name, database, collection):
+def base_read(name, database, collection, check=True, folder="data"):
     """
     Most basic read function
     :param name: name of the file
     :param database: name of the database
     :param collection: name of the collection
+    :param check: check that the database and the collection exist (bulk operations check them once)
+    :param folder: folder of the collection holding the file
     :return: data
     """
-    DISK = cfg.ROOT_DIR
-    path = os.path.join(DISK, database)
-    # check if database exists
-    if not os.path.exists(path):
-        raise FileNotFoundError("The database does not exist")
+    path = __collection_path(database, collection, check)
+
+    # check if file exists
+    path = f"{path}/{folder}/{name}"
+    backend = get_backend()
+    if not backend.exists(path):
+        raise FileNotFoundError(f"File {path} does not exist")
+
+    return backend.read(path)
 
-    # check if collection exists
-    path = os.path.join(path, collection)
-    if not os.path.exists(os.path.dirname(path)):
-        raise FileNotFoundError("The collection does not exist")
+
+def base_open(name, database, collection, check=True, folder="data"):
+    """
+    Open a file for positioned reads (see base_pread), the caller must close it
+    :param name: name of the file
+    :param database: name of the database
+    :param collection: name of the collection
+    :param check: check that the database and the collection exist (bulk operations check them once)
+    :param folder: folder of the collection holding the file
+    :return: the handle of the backend
+    """
+    path = __collection_path(database, collection, check)
 
     # check if file exists
-    path = os.path.join(path + "/data", name)
-    if not os.path.exists(path):
+    path = f"{path}/{folder}/{name}"
+    backend = get_backend()
+    if not backend.exists(path):
         raise FileNotFoundError(f"File {path} does not exist")
 
-    with open(path, "rb") as f:
-        data = f.read()
+    return backend.open(path)
 
-    return data
+
+def base_pread(handle, length, offset):
+    """
+    Read length bytes at offset without moving through the rest of the file
+    :param handle: handle from base_open
+    :param length: number of bytes to read
+    :param offset: where to start reading
+    :return: data
+    """
+    return handle.read_at(offset, length)
 
 
-def base_del(name, database, collection):
+def base_del(name, database, collection, folder="data"):
     """
     Most basic delete function
     :param name: name / id of the file
     :param database: name of the database
     :param collection: name of the collection
+    :param folder: folder of the collection holding the file
     """
-    DISK = cfg.ROOT_DIR
-    path = os.path.join(DISK, database, collection + "/data", name)
-    if not os.path.exists(path):
+    path = f"{database}/{collection}/{folder}/{name}"
+    backend = get_backend()
+    if not backend.exists(path):
         raise FileNotFoundError(f"File {path} does not exist")
     else:
-        os.remove(path)
\ No newline at end of file
+        backend.remove(path)
+
+
+def base_write_chunk(name, index, data, database, collection):
+    """
+    Write one chunk of a large object, chunks are stored in <collection>/chunks/<name>/<index>
+    :param name: name / id of the file the chunk belongs to
+    :param index: index of the chunk
+    :param data: data of the chunk
+    :param database: name of the database
+    :param collection: name of the collection
+    """
+    path = f"{database}/{collection}"
+    backend = get_backend()
+    # check if collection exists
+    if not backend.exists(path):
+        raise FileNotFoundError("The collection does not exist")
+
+    path = f"{path}/chunks/{name}"
+    backend.makedirs(path)
+    backend.write(f"{path}/{index}", data)
+
+
+def base_read_chunk(name, index, database, collection):
+    """
+    Read one chunk of a large object
+    :param name: name / id of the file the chunk belongs to
+    :param index: index of the chunk
+    :param database: name of the database
+    :param collection: name of the collection
+    :return: data of the chunk
+    """
+    path = f"{database}/{collection}/chunks/{name}/{index}"
+    backend = get_backend()
+    if not backend.exists(path):
+        raise FileNotFoundError(f"Chunk {path} does not exist")
+
+    return backend.read(path)
+
+
+def base_del_chunks(name, database, collection, keep=None):
+    """
+    Delete all the chunks of a large object (nothing happens if there are none)
+    :param name: name / id of the file the chunks belong to
+    :param database: name of the database
+    :param collection: name of the collection
+    :param keep: key of the chunks to keep (see LargeObject.key), the chunks of every other key are deleted
+    """
+    path = f"{database}/{collection}/chunks/{name}"
+    backend = get_backend()
+    if not backend.exists(path):
+        return
+
+    if keep is None:
+        backend.rmtree(path)
+        return
+    for entry in backend.listdir(path):
+        if entry == keep:
+            continue
+        elif backend.isdir(f"{path}/{entry}"):
+            backend.rmtree(f"{path}/{entry}")
+        else:
+            backend.remove(f"{path}/{entry}")
+
+
+def __meta_folder(database, collection):
+    """
+    path of the metadata folder of a collection, created if it does not exist
+    """
+    path = f"{database}/{collection}"
+    backend = get_backend()
+    # check if collection exists
+    if not backend.exists(path):
+        raise FileNotFoundError("The collection does not exist")
+
+    path = f"{path}/meta"
+    backend.makedirs(path)
+    return path
+
+
+def base_write_meta(name, data, database, collection):
+    """
+    Write a metadata file of a collection (indexes, catalog...), metadata files are stored in <collection>/meta and are
+    replaced atomically so a reader never sees half of a file
+    :param name: name of the metadata file
+    :param data: data to save
+    :param database: name of the database
+    :param collection: name of the collection
+    """
+    path = __meta_folder(database, collection)
+    get_backend().write_atomic(f"{path}/{name}", data)
+
+
+def base_write_meta_at(name, offset, data, database, collection):
+    """
+    Overwrite part of a metadata file of a collection in place (the file is created if it does not exist)
+    :param name: name of the metadata file
+    :param offset: where to write
+    :param data: data to write
+    :param database: name of the database
+    :param collection: name of the collection
+    """
+    path = __meta_folder(database, collection)
+    get_backend().write_at(f"{path}/{name}", offset, data)
+
+
+def base_read_meta(name, database, collection):
+    """
+    Read a metadata file of a collection
+    :param name: name of the metadata file
+    :param database: name of the database
+    :param collection: name of the collection
+    :return: data, None if the metadata file does not exist
+    """
+    path = f"{database}/{collection}/meta/{name}"
+    backend = get_backend()
+    if not backend.exists(path):
+        return None
+
+    return backend.read(path)
+
+
+def base_read_meta_from(name, offset, database, collection):
+    """
+    Read the end of a metadata file of a collection starting at offset (for append only files)
+    :param name: name of the metadata file
+    :param offset: where to start reading
+    :param database: name of the database
+    :param collection: name of the collection
+    :return: data, None if the metadata file does not exist or is shorter than offset
+    """
+    path = f"{database}/{collection}/meta/{name}"
+    backend = get_backend()
+    if not backend.exists(path):
+        return None
+    size = backend.size(path)
+    if size < offset:
+        return None
+
+    with backend.open(path) as handle:
+        return handle.read_at(offset, size - offset)
+
+
+def base_read_meta_at(name, offset, length, database, collection):
+    """
+    Read part of a metadata file of a collection
+    :param name: name of the metadata file
+    :param offset: where to start reading
+    :param length: number of bytes to read
+    :param database: name of the database
+    :param collection: name of the collection
+    :return: data (shorter than length at the end of the file), None if the metadata file does not exist
+    """
+    path = f"{database}/{collection}/meta/{name}"
+    backend = get_backend()
+    if not backend.exists(path):
+        return None
+
+    with backend.open(path) as handle:
+        return handle.read_at(offset, length)
+
+
+def base_del_meta(name, database, collection):
+    """
+    Delete a metadata file of a collection (nothing happens if it does not exist)
+    :param name: name of the metadata file
+    :param database: name of the database
+    :param collection: name of the collection
+    """
+    path = f"{database}/{collection}/meta/{name}"
+    backend = get_backend()
+    if backend.exists(path):
+        backend.remove(path)
+
+
+def base_append_meta(name, data, database, collection):
+    """
+    Append to a metadata file of a collection (the file is created if it does not exist)
+    :param name: name of the metadata file
+    :param data: data to append
+    :param database: name of the database
+    :param collection: name of the collection
+    """
+    path = __meta_folder(database, collection)
+    get_backend().append(f"{path}/{name}", data)
+
+
+def base_lock_meta(name, database, collection, wait=True):
+    """
+    Lock a metadata file of a collection against the other processes (the file is created if it does not exist)
+    :param name: name of the metadata file
+    :param database: name of the database
+    :param collection: name of the collection
+    :param wait: wait for the process holding the lock
+    :return: handle of the file, the lock is released when it is closed (None if another process holds the lock and wait
+    is False)
+    """
+    path = __meta_folder(database, collection)
+    handle = get_backend().open(f"{path}/{name}", append=True)
+    if not handle.lock(wait=wait):
+        handle.close()
+        if not wait:
+            return None
+        raise TimeoutError(f"The metadata file {name} is locked by another process")
+    return handle
+
+
+def base_ls_meta(database, collection):
+    """
+    List the metadata files of a collection
+    :param database: name of the database
+    :param collection: name of the collection
+    :return: list of metadata file names
+    """
+    path = f"{database}/{collection}/meta"
+    backend = get_backend()
+    if not backend.exists(path):
+        return []
+    return [name for name in backend.listdir(path) if not name.endswith(".tmp")]
+
+
+def __segment_path(index, database, collection):
+    """
+    path of a segment file, segments are stored in <collection>/segments/<index>.seg
+    """
+    return f"{database}/{collection}/segments/{index:08d}.seg"
+
+
+def base_ls_segments(database, collection):
+    """
+    List the segment files of a collection (see storage.segment_engine)
+    :param database: name of the database
+    :param collection: name of the collection
+    :return: sorted list of segment indexes
+    """
+    path = f"{database}/{collection}/segments"
+    backend = get_backend()
+    if not backend.exists(path):
+        return []
+    return sorted(int(name[:-len(".seg")]) for name in backend.listdir(path) if name.endswith(".seg"))
+
+
+def base_append_segment(index, database, collection):
+    """
+    Open a segment file to append to it (the file is created if it does not exist), the caller must close it
+    :param index: index of the segment
+    :param database: name of the database
+    :param collection: name of the collection
+    :return: the handle of the backend (see base_pread)
+    """
+    path = f"{database}/{collection}"
+    backend = get_backend()
+    # check if collection exists
+    if not backend.exists(path):
+        raise FileNotFoundError("The collection does not exist")
+
+    backend.makedirs(f"{path}/segments")
+    return backend.open(__segment_path(index, database, collection), append=True)
+
+
+def base_open_segment(index, database, collection):
+    """
+    Open a segment file for positioned reads (see base_pread), the caller must close it
+    :param index: index of the segment
+    :param database: name of the database
+    :param collection: name of the collection
+    :return: the handle of the backend
+    """
+    path = __segment_path(index, database, collection)
+    backend = get_backend()
+    if not backend.exists(path):
+        raise FileNotFoundError(f"Segment {path} does not exist")
+
+    return backend.open(path)
+
+
+def base_truncate_segment(index, size, database, collection):
+    """
+    Cut a segment file to size bytes (to drop a record torn by a crash)
+    :param index: index of the segment
+    :param size: new size of the file
+    :param database: name of the database
+    :param collection: name of the collection
+    """
+    get_backend().truncate(__segment_path(index, database, collection), size)
+
+
+def base_del_segment(index, database, collection):
+    """
+    Delete a segment file (nothing happens if it does not exist)
+    :param index: index of the segment
+    :param database: name of the database
+    :param collection: name of the collection
+    """
+    path = __segment_path(index, database, collection)
+    backend = get_backend()
+    if backend.exists(path):
+        backend.remove(path)
+
+
+def base_sync(name, database, collection, folder="data"):
+    """
+    Flush a stored file to the disk (fsync)
+    :param name: name / id of the file
+    :param database: name of the database
+    :param collection: name of the collection
+    :param folder: folder of the collection holding the file
+    """
+    path = f"{database}/{collection}/{folder}/{name}"
+    backend = get_backend()
+    if not backend.exists(path):
+        return
+
+    backend.sync(path)
+
+
+def base_sync_dir(database, collection, folder="data"):
+    """
+    Flush the entries of a folder of a collection to the disk (the files created and deleted in it)
+    :param database: name of the database
+    :param collection: name of the collection
+    :param folder: name of the folder
+    """
+    get_backend().sync_dir(f"{database}/{collection}/{folder}")
+
+
+def base_open_wal(database, lock=False):
+    """
+    Open the write-ahead log of a database for appending and positioned reads (the file is created if it does not
+    exist), the caller must close it
+    :param database: name of the database
+    :param lock: open the file locked by the processes appending to the log instead
+    :return: the handle of the backend
+    """
+    backend = get_backend()
+    # check if database exists
+    if not backend.exists(database):
+        raise FileNotFoundError("The database does not exist")
+
+    return backend.open(f"{database}/{cfg.WAL_FILE}{'.lock' if lock else ''}", append=True)
+
+
+def base_del_wal(database):
+    """
+    Delete the write-ahead log of a database and its lock file (nothing happens if they do not exist)
+    :param database: name of the database
+    """
+    backend = get_backend()
+    for path in (f"{database}/{cfg.WAL_FILE}", f"{database}/{cfg.WAL_FILE}.lock"):
+        if backend.exists(path):
+            backend.remove(path)
+
+
+def __blob_path(digest, database):
+    """
+    path of a blob, blobs are stored in <database>/.blobs/<first 2 characters of the digest>/<digest>
+    """
+    return f"{database}/{cfg.BLOBS_FOLDER}/{digest[:2]}/{digest}"
+
+
+def base_write_blob(digest, data, database):
+    """
+    Write a blob of the blob store of a database (see storage.blob_store), the blob is replaced atomically
+    :param digest: hex digest of the data
+    :param data: data to save
+    :param database: name of the database
+    """
+    backend = get_backend()
+    # check if database exists
+    if not backend.exists(database):
+        raise FileNotFoundError("The database does not exist")
+
+    backend.makedirs(f"{database}/{cfg.BLOBS_FOLDER}/{digest[:2]}")
+    backend.write_atomic(__blob_path(digest, database), data)
+
+
+def base_read_blob(digest, database):
+    """
+    Read a blob of the blob store of a database
+    :param digest: hex digest of the data
+    :param database: name of the database
+    :return: data
+    """
+    path = __blob_path(digest, database)
+    backend = get_backend()
+    if not backend.exists(path):
+        raise FileNotFoundError(f"Blob {path} does not exist")
+
+    return backend.read(path)
+
+
+def base_blob_size(digest, database):
+    """
+    Get the size of a blob
+    :param digest: hex digest of the data
+    :param database: name of the database
+    :return: size in bytes, None if the blob does not exist
+    """
+    path = __blob_path(digest, database)
+    backend = get_backend()
+    if not backend.exists(path):
+        return None
+    return backend.size(path)
+
+
+def base_read_blob_refs(digest, database):
+    """
+    Read the reference count of a blob
+    :param digest: hex digest of the data
+    :param database: name of the database
+    :return: the count, 0 if the blob has no count
+    """
+    path = __blob_path(digest, database) + ".refs"
+    backend = get_backend()
+    if not backend.exists(path):
+        return 0
+
+    return int.from_bytes(backend.read(path), "big")
+
+
+def base_write_blob_refs(digest, count, database):
+    """
+    Write the reference count of a blob, the count is replaced atomically
+    :param digest: hex digest of the data
+    :param count: the count
+    :param database: name of the database
+    """
+    backend = get_backend()
+    backend.makedirs(f"{database}/{cfg.BLOBS_FOLDER}/{digest[:2]}")
+    backend.write_atomic(__blob_path(digest, database) + ".refs", count.to_bytes(8, "big"))
+
+
+def base_del_blob(digest, database):
+    """
+    Delete a blob and its reference count (nothing happens if they do not exist)
+    :param digest: hex digest of the data
+    :param database: name of the database
+    """
+    path = __blob_path(digest, database)
+    backend = get_backend()
+    for name in (path, path + ".refs"):
+        if backend.exists(name):
+            backend.remove(name)
+
+
+def base_ls_blobs(database):
+    """
+    List the blobs of the blob store of a database
+    :param database: name of the database
+    :return: list of hex digests
+    """
+    path = f"{database}/{cfg.BLOBS_FOLDER}"
+    backend = get_backend()
+    if not backend.exists(path):
+        return []
+    return [name for folder in backend.listdir(path) for name in backend.listdir(f"{path}/{folder}")
+            if "." not in name]
+
+
+def base_lock_blobs(database):
+    """
+    Lock the reference counts of the blob store of a database against the other processes and threads (the lock file
+    <database>/.blobs.lock is created if it does not exist)
+    :param database: name of the database
+    :return: handle of the file, the lock is released when it is closed
+    """
+    backend = get_backend()
+    # check if database exists
+    if not backend.exists(database):
+        raise FileNotFoundError("The database does not exist")
+
+    handle = backend.open(f"{database}/{cfg.BLOBS_FOLDER}.lock", append=True)
+    if not handle.lock(wait=True):
+        handle.close()
+        raise TimeoutError("The blob store is locked by another process")
+    return handle
+
+
+def base_del_blobs(database):
+    """
+    Delete the whole blob store of a database and its lock file (nothing happens if they do not exist)
+    :param database: name of the database
+    """
+    path = f"{database}/{cfg.BLOBS_FOLDER}"
+    backend = get_backend()
+    if backend.exists(f"{path}.lock"):
+        backend.remove(f"{path}.lock")
+    if not backend.exists(path):
+        return
+
+    backend.rmtree(path)
@@ -1,3 +1,16 @@
 ROOT_DIR = "F:\\MoMem\\"
 MONODE_EXTENSION = ".mn"
-FILE_ID_LENGTH = 15
\ No newline at end of file
+FILE_ID_LENGTH = 15
+ID_SCHEME = "random"
+CHUNK_SIZE = 4 * 1024 * 1024
+BULK_WORKERS = 8
+SEGMENT_SIZE = 64 * 1024 * 1024
+WAL_FILE = ".wal"
+DURABILITY = "none"
+WAL_INTERVAL = 0.05
+WAL_SIZE = 64 * 1024 * 1024
+BLOBS_FOLDER = ".blobs"
+DEDUP_MIN_SIZE = 1024
+COMPRESS_MIN_SIZE = 256
+SCAN_BATCH_SIZE = 256
+SCAN_PREFETCH = 2
\ No newline at end of file
@@ -29,5 +29,30 @@ file_type = {
     "rtf": "text",
     "tex": "text",
     "wks": "text",
-    "wps": "text"
+    "wps": "text",
+    "md": "text",
+    "log": "text",
+    "json": "text",
+    "csv": "text",
+    "tsv": "text",
+    "xml": "text",
+    "html": "text",
+    "htm": "text",
+    "yaml": "text",
+    "yml": "text",
+
+    "zip": "archive",
+    "gz": "archive",
+    "bz2": "archive",
+    "xz": "archive",
+    "7z": "archive",
+    "rar": "archive"
+}
+
+# the extensions whose data is already compressed, compressing it again only costs time (see MoNode.compression)
+compressed_types = {
+    "jpg", "jpeg", "png", "gif", "webp",
+    "mp4", "m4v", "f4v", "f4p", "f4a", "f4b", "mov",
+    "docx", "odt",
+    "zip", "gz", "bz2", "xz", "7z", "rar"
 }
\ No newline at end of file
@@ -0,0 +1,281 @@
+"""
+hash_index.py
+Created on 2026-10-18 3:55:00 PM
+By: Will Selke
+
+This file contains the persistent hash index. The index maps the values of one field to the ids of the documents
+holding them, it is split in buckets (one metadata file each) picked by a stable hash of the value so a lookup or an
+update only reads and writes a single bucket no matter how many documents the collection holds. The build picks enough
+buckets for the number of values.
+
+A value held by more than POSTING_SIZE documents (e.g. the values of a low cardinality field) is moved out of its bucket
+to a posting of its own: a pickled set of ids and a log of the changes appended next to it, merged back by find once it
+grows (like the posting lists of the tag index), so saving a document never rewrites the ids of a popular value.
+"""
+import hashlib
+import io
+import pickle
+import re
+import zlib
+
+from MoMem.DB_COL.collection_meta import collection_lock, read_meta, write_meta
+from MoMem.basic_file_op import base_read_meta, base_append_meta, base_del_meta, base_ls_meta
+from MoMem.index.index import MISSING, field_value, source_field
+
+HASH_BUCKETS = 256
+
+# the build picks a bucket for about this many values
+BUCKET_VALUES = 64
+
+# values held by more documents than this get a posting of their own
+POSTING_SIZE = 256
+
+# merge the log of a posting once it has more entries than this (or than 1/8 of the posting)
+LOG_MERGE = 1024
+
+
+def normal_key(value):
+    """
+    Get the key of a value, values equal for the queries (see query.match) have the same key: 1, 1.0 and True share
+    a key, "1" does not, the dicts do not depend on the order of their keys
+    :param value: the value
+    :return: the key
+    """
+    if isinstance(value, (bool, int)):
+        return repr(int(value))
+    if isinstance(value, float):
+        return repr(int(value)) if value.is_integer() else repr(value)
+    if isinstance(value, list):
+        return "[" + ", ".join(normal_key(v) for v in value) + "]"
+    if isinstance(value, tuple):
+        return "(" + ", ".join(normal_key(v) for v in value) + ",)"
+    if isinstance(value, dict):
+        return "{" + ", ".join(sorted(f"{normal_key(k)}: {normal_key(v)}" for k, v in value.items())) + "}"
+    if isinstance(value, (set, frozenset)):
+        return "set{" + ", ".join(sorted(normal_key(v) for v in value)) + "}"
+    return repr(value)
+
+
+class HashIndex:
+    """
+    # field : The full name of the indexed field (see index.normalize_field)
+    # buckets : The number of buckets
+    # name : The name of the index files (see index_build.IndexBuildJob)
+    """
+    TYPE = "hash"
+
+    def __init__(self, database, collection, field, buckets=HASH_BUCKETS, name=None):
+        """
+        Create the index object (the index files are only written by build / add / remove)
+
+        :param database: name of the database
+        :param collection: name of the collection
+        :param field: the full name of the indexed field
+        :param buckets: the number of buckets (the build may pick more)
+        :param name: the name of the index files (default the field)
+        """
+        self.database = database
+        self.collection = collection
+        self.field = field
+        self.buckets = buckets
+        self.name = field if name is None else name
+
+    @property
+    def fields(self):
+        """
+        The MoNode fields to read from a document to update the index
+        """
+        return [source_field(self.field)]
+
+    @property
+    def settings(self):
+        """
+        The settings to store in the registry to open the index again
+        """
+        return {"type": self.TYPE, "buckets": self.buckets, "name": self.name}
+
+    def key(self, value):
+        """
+        Get the key of a value (see normal_key)
+        :param value: the value
+        :return: the key
+        """
+        return normal_key(value)
+
+    def __bucket_name(self, key):
+        """
+        name of the metadata file of the bucket holding a key
+        """
+        return f"hash.{self.name}.{zlib.crc32(key.encode()) % self.buckets}"
+
+    def __posting_names(self, key):
+        """
+        names of the metadata files of the posting of a key and of its log (keys can hold any character so the files
+        are named after a hash of the key)
+        """
+        digest = hashlib.sha1(key.encode()).hexdigest()
+        return f"hash.{self.name}.p.{digest}", f"hash.{self.name}.l.{digest}"
+
+    def build(self, documents):
+        """
+        Build the index from scratch
+        :param documents: iterable of (id, dict of MoNode field to value)
+        """
+        values = {}
+        for id, fields in documents:
+            value = field_value(fields, self.field)
+            if value is not MISSING:
+                values.setdefault(self.key(value), set()).add(id)
+
+        self.drop()
+        while self.buckets * BUCKET_VALUES < len(values):
+            self.buckets *= 2
+        buckets = {}
+        for key, ids in values.items():
+            bucket = buckets.setdefault(self.__bucket_name(key), {})
+            if len(ids) > POSTING_SIZE:
+                # None marks a key whose ids are in its posting
+                bucket[key] = None
+                write_meta(self.__posting_names(key)[0], ids, self.database, self.collection)
+            else:
+                bucket[key] = ids
+        for name, bucket in buckets.items():
+            write_meta(name, bucket, self.database, self.collection)
+
+    def add(self, id, fields):
+        """
+        Add a document to the index
+        :param id: id of the document
+        :param fields: dict of MoNode field to value
+        """
+        self.add_many([(id, fields)])
+
+    def remove(self, id, fields):
+        """
+        Remove a document from the index
+        :param id: id of the document
+        :param fields: dict of MoNode field to value (as it was indexed)
+        """
+        self.remove_many([(id, fields)])
+
+    def add_many(self, documents):
+        """
+        Add documents to the index, every bucket is read once and written if one of its keys changed (the keys with a
+        posting only get an append to their log)
+        :param documents: iterable of (id, dict of MoNode field to value)
+        """
+        self.__update(documents, 1)
+
+    def remove_many(self, documents):
+        """
+        Remove documents from the index, every bucket is read once and written if one of its keys changed (the keys
+        with a posting only get an append to their log)
+        :param documents: iterable of (id, dict of MoNode field to value (as it was indexed))
+        """
+        self.__update(documents, -1)
+
+    def __update(self, documents, sign):
+        """
+        add (sign 1) or remove (sign -1) documents
+        """
+        for name, bucket, changes in self.__changes(documents):
+            logs = {}
+            changed = False
+            for key, id in changes:
+                if key in bucket and bucket[key] is None:
+                    logs.setdefault(key, []).append((sign, id))
+                elif sign > 0:
+                    bucket.setdefault(key, set()).add(id)
+                    changed = True
+                    if len(bucket[key]) > POSTING_SIZE:
+                        write_meta(self.__posting_names(key)[0], bucket[key], self.database, self.collection)
+                        bucket[key] = None
+                elif id in bucket.get(key, ()):
+                    bucket[key].discard(id)
+                    if not bucket[key]:
+                        del bucket[key]
+                    changed = True
+
+            for key, entries in logs.items():
+                base_append_meta(self.__posting_names(key)[1], b"".join(pickle.dumps(e) for e in entries),
+                                 self.database, self.collection)
+            if changed:
+                write_meta(name, bucket, self.database, self.collection)
+
+    def __changes(self, documents):
+        """
+        group the documents by bucket
+        :return: generator of (bucket name, bucket, list of (key, id))
+        """
+        changes = {}
+        for id, fields in documents:
+            value = field_value(fields, self.field)
+            if value is MISSING:
+                continue
+            key = self.key(value)
+            changes.setdefault(self.__bucket_name(key), []).append((key, id))
+
+        for name, entries in changes.items():
+            yield name, read_meta(name, self.database, self.collection, {}), entries
+
+    def __read_posting(self, key):
+        """
+        read the posting of a key with its log applied
+        :return: (set of ids, number of entries of the log)
+        """
+        posting_name, log_name = self.__posting_names(key)
+        ids = read_meta(posting_name, self.database, self.collection, set())
+        data = base_read_meta(log_name, self.database, self.collection) or b""
+
+        entries = 0
+        stream = io.BytesIO(data)
+        while stream.tell() < len(data):
+            try:
+                sign, id = pickle.load(stream)
+            except (EOFError, pickle.UnpicklingError):
+                # partially written last entry
+                break
+            entries += 1
+            if sign > 0:
+                ids.add(id)
+            else:
+                ids.discard(id)
+        return ids, entries
+
+    def __posting(self, key):
+        """
+        read the posting of a key, the log is merged into the posting once it grew
+        :return: set of ids
+        """
+        ids, entries = self.__read_posting(key)
+        if entries <= max(LOG_MERGE, len(ids) // 8):
+            return ids
+
+        # the writers append to the log while holding the lock of the collection
+        with collection_lock(self.database, self.collection):
+            ids, _ = self.__read_posting(key)
+            posting_name, log_name = self.__posting_names(key)
+            write_meta(posting_name, ids, self.database, self.collection)
+            base_del_meta(log_name, self.database, self.collection)
+        return ids
+
+    def find(self, value):
+        """
+        Find the documents where the field is equal to value
+        :param value: the value
+        :return: sorted list of ids
+        """
+        key = self.key(value)
+        bucket = read_meta(self.__bucket_name(key), self.database, self.collection, {})
+        if key in bucket and bucket[key] is None:
+            return sorted(self.__posting(key))
+        return sorted(bucket.get(key, ()))
+
+    def drop(self):
+        """
+        Delete every bucket and posting of the index
+        """
+        files = re.compile(re.escape(f"hash.{self.name}.") + r"(\d+|[pl]\.[0-9a-f]{40})")
+        for name in base_ls_meta(self.database, self.collection):
+            if files.fullmatch(name):
+                base_del_meta(name, self.database, self.collection)
@@ -0,0 +1,106 @@
+"""
+index.py
+Created on 2026-10-18 3:45:00 PM
+By: Will Selke
+
+This file contains the helpers shared by the MoMem indexes: how an indexed field is named and read from a MoNode, how
+its values are ordered, and the registry (stored in the collection metadata) of the indexes of a collection.
+"""
+from datetime import datetime
+
+from MoMem.DB_COL.collection_meta import read_meta, write_meta
+
+# the MoNode fields which can be indexed and queried directly, any other field is a key of MoNode.notes ("notes.<key>")
+MONODE_INDEX_FIELDS = ("name", "type", "size", "modi", "desc", "tags")
+
+# name of the metadata file holding the registry
+REGISTRY = "indexes"
+
+# value of a field which is not in the MoNode
+MISSING = object()
+
+# the order of the types of the values, the values of a type are only compared with each other (the numbers together),
+# the values of any other type come last in the order of their repr
+TYPE_ORDER = ((bool, int, float), str, (bytes, bytearray), datetime, (list, tuple))
+OTHER_TYPES = len(TYPE_ORDER)
+
+
+def normalize_field(field):
+    """
+    Get the full name of a field, "color" and "notes.color" both name the color key of the notes
+    :param field: the field
+    :return: the full name
+    """
+    if field in MONODE_INDEX_FIELDS or field.startswith("notes."):
+        return field
+    return "notes." + field
+
+
+def source_field(field):
+    """
+    Get the MoNode field to read to get the value of a field
+    :param field: the full name of the field
+    :return: the MoNode field (see monode_pickle.MONODE_FIELDS)
+    """
+    return "notes" if field.startswith("notes.") else field
+
+
+def field_value(fields, field):
+    """
+    Get the value of a field
+    :param fields: dict of MoNode field to value (see Collection.get_monode(fields=...))
+    :param field: the full name of the field
+    :return: the value, MISSING if the MoNode does not have it
+    """
+    if field.startswith("notes."):
+        notes = fields.get("notes")
+        if not isinstance(notes, dict):
+            return MISSING
+        return notes.get(field[len("notes."):], MISSING)
+    return fields.get(field, MISSING)
+
+
+def type_rank(value):
+    """
+    Get the position of the type of a value in the order of the types (see TYPE_ORDER)
+    :param value: the value
+    :return: the rank, OTHER_TYPES for a type which is not in TYPE_ORDER
+    """
+    for rank, types in enumerate(TYPE_ORDER):
+        if isinstance(value, types):
+            return rank
+    return OTHER_TYPES
+
+
+def order_key(value):
+    """
+    Get the key ordering a value among the values of any type, so a field holding values of mixed types can be sorted
+    :param value: the value
+    :return: (rank of the type, value), the elements of a list are keys themselves
+    """
+    rank = type_rank(value)
+    if rank == OTHER_TYPES:
+        return rank, repr(value)
+    if isinstance(value, (list, tuple)):
+        return rank, tuple(order_key(v) for v in value)
+    return rank, value
+
+
+def read_registry(database, collection):
+    """
+    Read the indexes of a collection
+    :param database: name of the database
+    :param collection: name of the collection
+    :return: dict of field to the index settings (at least {"type": ...})
+    """
+    return read_meta(REGISTRY, database, collection, {})
+
+
+def write_registry(registry, database, collection):
+    """
+    Write the indexes of a collection
+    :param registry: dict of field to the index settings
+    :param database: name of the database
+    :param collection: name of the collection
+    """
+    write_meta(REGISTRY, registry, database, collection)
@@ -0,0 +1,268 @@
+"""
+index_build.py
+Created on 2026-10-18 9:00:00 PM
+By: Will Selke
+
+This file contains the background index builds. A build runs on its own thread and fans the reading and decoding of
+the documents out to a process pool (batches of BATCH_SIZE documents, only the indexed field is read and sent back).
+The collection stays readable and writable during the build, the ids written meanwhile are journaled and read again
+once the pool is done, then the index is written and registered while holding the collection lock. An index built
+again is written under a new name next to the one the queries use, the registry entry is then swapped to it and the
+old files are dropped, so a query never sees a half written index.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import MoMem.config.config as cfg
+from MoMem.DB_COL.collection_meta import collection_lock
+from MoMem.MoNode import monode_pickle
+from MoMem.storage.engine import get_engine
+from MoMem.storage.backend import DiskBackend, get_backend, set_backend
+from MoMem.index.index import MISSING, field_value, read_registry, write_registry
+
+# number of documents read by a worker at once
+BATCH_SIZE = 256
+
+# the collections with fewer documents are read on the job thread by default, starting the worker processes would take
+# longer than reading them
+POOL_MIN_DOCUMENTS = 16 * BATCH_SIZE
+
+# the running builds by (database, collection)
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+def journal(database, collection, ids):
+    """
+    Tell the running builds of a collection that documents were written (Collection calls it while holding the
+    collection lock)
+    :param database: name of the database
+    :param collection: name of the collection
+    :param ids: ids of the saved or deleted documents
+    """
+    with _jobs_lock:
+        jobs = list(_jobs.get((database, collection), ()))
+    for job in jobs:
+        job.journal(ids)
+
+
+def running_jobs(database, collection):
+    """
+    :return: list of the running IndexBuildJob of a collection
+    """
+    with _jobs_lock:
+        return list(_jobs.get((database, collection), ()))
+
+
+def _init_worker(root_dir):
+    """
+    Point the backend of a worker process at the folder of the databases of the building process
+    :param root_dir: the folder holding the databases
+    """
+    set_backend(DiskBackend(root_dir))
+
+
+def _read_batch(database, collection, ids, field, fields, readonly=True):
+    """
+    Read the indexed field of a batch of documents (runs in the worker processes, see _init_worker)
+    :param readonly: read through a read only storage engine (in the worker processes, which do not own the collection)
+    :return: (list of (id, dict of MoNode field to value), list of the ids which could not be read), the documents
+    deleted or moved meanwhile are not read
+    """
+    engine = get_engine(database, collection, readonly)
+    output = []
+    missing = []
+    for id in ids:
+        try:
+            with engine.open(id, check=False) as reader:
+                # only the indexed key of the notes is decoded
+                values = monode_pickle.load_fields(reader.read_at, [field] if field.startswith("notes.") else fields)
+        except FileNotFoundError:
+            missing.append(id)
+            continue
+
+        # only send back what the index needs
+        value = field_value(values, field)
+        if field.startswith("notes."):
+            values = {"notes": {} if value is MISSING else {field[len("notes."):]: value}}
+        output.append((id, values))
+    return output, missing
+
+
+class IndexBuildJob:
+    """
+    Handle of a background index build
+
+    # field : The indexed field
+    # total : The number of documents to read
+    # done : The number of documents read so far
+    # state : "running", "done", "cancelled" or "failed"
+    # error : The exception if the build failed
+    """
+
+    def __init__(self, database, collection, index, workers=None, open_index=None):
+        """
+        Create the job (USE Collection.create_index(background=True) INSTEAD)
+
+        :param database: name of the database
+        :param collection: name of the collection
+        :param index: the index object to build, under another name than the registered index of its field if there is
+        one (see Collection.create_index)
+        :param workers: number of worker processes (default the number of cpus for a collection of POOL_MIN_DOCUMENTS
+        documents or more, 0 to read on the job thread, always 0 when the storage backend is not shared with other
+        processes)
+        :param open_index: function (field, settings) -> index object, opens the registered index the build replaces
+        """
+        self.database = database
+        self.collection = collection
+        self.index = index
+        self.field = index.field
+        self.workers = workers
+        self.__open_index = open_index
+        # the worker processes would not see the data of the process (e.g. the memory backend)
+        if not get_backend().SHARED:
+            self.workers = 0
+        self.total = None
+        self.done = 0
+        self.state = "running"
+        self.error = None
+        self.started = None
+        self.__cancelled = threading.Event()
+        self.__finished = threading.Event()
+        self.__journal = set()
+        self.__journal_lock = threading.Lock()
+        self.__thread = threading.Thread(target=self.__run, name=f"MoMem-index-{self.field}", daemon=True)
+
+    def start(self):
+        """
+        Start the build, the journal is started before the documents are listed
+        """
+        with collection_lock(self.database, self.collection):
+            with _jobs_lock:
+                _jobs.setdefault((self.database, self.collection), []).append(self)
+        self.started = time.time()
+        self.__thread.start()
+        return self
+
+    @property
+    def progress(self):
+        """
+        :return: the fraction of the documents read (0 to 1), None until the documents are listed
+        """
+        if self.total is None:
+            return None
+        return 1.0 if self.total == 0 else self.done / self.total
+
+    @property
+    def eta(self):
+        """
+        :return: the estimated number of seconds left, None until the first documents are read
+        """
+        if self.state != "running":
+            return 0.0
+        if not self.done or self.total is None:
+            return None
+        elapsed = time.time() - self.started
+        return elapsed / self.done * (self.total - self.done)
+
+    def cancel(self):
+        """
+        Cancel the build, nothing is written and the index is not registered
+        """
+        self.__cancelled.set()
+
+    def wait(self, timeout=None):
+        """
+        Wait for the build to finish
+        :param timeout: max number of seconds to wait
+        :return: True if the build is finished
+        """
+        return self.__finished.wait(timeout)
+
+    def journal(self, ids):
+        """
+        Record documents written during the build (see index_build.journal)
+        """
+        with self.__journal_lock:
+            self.__journal.update(ids)
+
+    def __batches(self, ids):
+        """
+        read the documents by batch, on the worker processes if there are any
+        :return: generator of (number of documents of the batch, list of (id, fields))
+        """
+        batches = [ids[i:i + BATCH_SIZE] for i in range(0, len(ids), BATCH_SIZE)]
+        args = (self.database, self.collection)
+
+        if self.workers == 0:
+            for batch in batches:
+                yield len(batch), _read_batch(*args, batch, self.field, self.index.fields, False)
+            return
+
+        # the workers read through a disk backend on the same folder (only the shared backends reach this point)
+        root_dir = getattr(get_backend(), "root", None) or cfg.ROOT_DIR
+        with ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=(root_dir,)) as pool:
+            futures = {pool.submit(_read_batch, *args, batch, self.field, self.index.fields): len(batch)
+                       for batch in batches}
+            try:
+                for future in as_completed(futures):
+                    yield futures[future], future.result()
+            finally:
+                for future in futures:
+                    future.cancel()
+
+    def __run(self):
+        """
+        the build itself (on the job thread)
+        """
+        try:
+            ids = get_engine(self.database, self.collection).list()
+            self.total = len(ids)
+            if self.workers is None:
+                self.workers = os.cpu_count() if self.total >= POOL_MIN_DOCUMENTS else 0
+
+            # merge the batches of the workers
+            documents = {}
+            for count, (batch, missing) in self.__batches(ids):
+                if self.__cancelled.is_set():
+                    break
+                documents.update(batch)
+                # deleted meanwhile, or moved by the storage engine, they are read again at the end
+                self.journal(missing)
+                self.done += count
+
+            if self.__cancelled.is_set():
+                self.state = "cancelled"
+                return
+
+            with collection_lock(self.database, self.collection):
+                # catch up with the documents written during the build, the ones deleted meanwhile are dropped
+                with self.__journal_lock:
+                    written = list(self.__journal)
+                for id in written:
+                    documents.pop(id, None)
+                documents.update(_read_batch(self.database, self.collection, written, self.field,
+                                             self.index.fields, False)[0])
+
+                self.index.build(documents.items())
+                registry = read_registry(self.database, self.collection)
+                replaced = registry.get(self.field)
+                registry[self.field] = self.index.settings
+                write_registry(registry, self.database, self.collection)
+                self.done = self.total
+                self.state = "done"
+
+                # the queries use the new index once the registry is written
+                if replaced is not None and self.__open_index is not None:
+                    replaced = self.__open_index(self.field, replaced)
+                    if replaced.name != self.index.name:
+                        replaced.drop()
+        except Exception as e:
+            self.error = e
+            self.state = "failed"
+        finally:
+            with _jobs_lock:
+                _jobs[(self.database, self.collection)].remove(self)
+            self.__finished.set()
@@ -0,0 +1,306 @@
+"""
+ordered_index.py
+Created on 2026-10-18 5:10:00 PM
+By: Will Selke
+
+This file contains the ordered (range) index. The (value, id) pairs of a field are kept as a run sorted by
+index.order_key (so a field may hold values of mixed types) split in pages of PAGE_SIZE entries with a directory holding
+the first and last pair of each page, so a range query only reads the pages overlapping the range. Updates are appended
+to a log which is merged into a new run once it grows.
+"""
+import io
+import pickle
+
+from MoMem.DB_COL.collection_meta import read_meta, write_meta
+from MoMem.basic_file_op import base_read_meta, base_append_meta, base_del_meta, base_ls_meta
+from MoMem.index.index import MISSING, OTHER_TYPES, field_value, order_key, source_field, type_rank
+
+# number of entries of a page
+PAGE_SIZE = 4096
+
+# merge the log into the run once it has more entries than this (or than 1/8 of the run)
+LOG_MERGE = 4096
+
+
+class OrderedIndex:
+    """
+    # field : The full name of the indexed field (see index.normalize_field)
+    # name : The name of the index files (see index_build.IndexBuildJob)
+    """
+    TYPE = "ordered"
+
+    def __init__(self, database, collection, field, name=None):
+        """
+        Create the index object (the index files are only written by build / add / remove)
+
+        :param database: name of the database
+        :param collection: name of the collection
+        :param field: the full name of the indexed field
+        :param name: the name of the index files (default the field)
+        """
+        self.database = database
+        self.collection = collection
+        self.field = field
+        self.name = field if name is None else name
+        self.__prefix = f"ordered.{self.name}."
+
+    @property
+    def fields(self):
+        """
+        The MoNode fields to read from a document to update the index
+        """
+        return [source_field(self.field)]
+
+    @property
+    def settings(self):
+        """
+        The settings to store in the registry to open the index again
+        """
+        return {"type": self.TYPE, "name": self.name}
+
+    def __directory(self):
+        """
+        read the directory of the run: {"generation": n, "pages": [(first pair, last pair, count)], "size": n,
+        "log": number of entries of the log}
+        """
+        return read_meta(self.__prefix + "dir", self.database, self.collection,
+                         {"generation": 0, "pages": [], "size": 0, "log": 0})
+
+    def __page(self, directory, n):
+        """
+        read the n-th page of the run
+        """
+        return read_meta(f"{self.__prefix}{directory['generation']}.{n}", self.database, self.collection, [])
+
+    def __log(self):
+        """
+        read the log
+        :return: list of (+1 / -1, (value, id))
+        """
+        data = base_read_meta(self.__prefix + "log", self.database, self.collection)
+        entries = []
+        if data:
+            stream = io.BytesIO(data)
+            while stream.tell() < len(data):
+                try:
+                    entries.append(pickle.load(stream))
+                except (EOFError, pickle.UnpicklingError):
+                    # partially written last entry
+                    break
+        return entries
+
+    def __write_run(self, pairs):
+        """
+        write a new sorted run and delete the previous one and the log
+        :param pairs: sorted list of (value, id)
+        """
+        old = self.__directory()
+        generation = old["generation"] + 1
+        pages = []
+        for n, start in enumerate(range(0, len(pairs), PAGE_SIZE)):
+            page = pairs[start:start + PAGE_SIZE]
+            write_meta(f"{self.__prefix}{generation}.{n}", page, self.database, self.collection)
+            pages.append((page[0], page[-1], len(page)))
+
+        write_meta(self.__prefix + "dir", {"generation": generation, "pages": pages, "size": len(pairs), "log": 0},
+                   self.database, self.collection)
+        base_del_meta(self.__prefix + "log", self.database, self.collection)
+        for n in range(len(old["pages"])):
+            base_del_meta(f"{self.__prefix}{old['generation']}.{n}", self.database, self.collection)
+
+    def build(self, documents):
+        """
+        Build the index from scratch
+        :param documents: iterable of (id, dict of MoNode field to value)
+        """
+        pairs = []
+        for id, fields in documents:
+            value = field_value(fields, self.field)
+            if value is not MISSING:
+                pairs.append((value, id))
+        pairs.sort(key=self.__pair_key)
+        self.__write_run(pairs)
+
+    def __append(self, entries):
+        """
+        append entries to the log and merge it if it grew too much, the directory counts the entries so the log is only
+        read to merge it
+        """
+        if not entries:
+            return
+        base_append_meta(self.__prefix + "log", b"".join(pickle.dumps(entry) for entry in entries),
+                         self.database, self.collection)
+
+        directory = self.__directory()
+        directory["log"] += len(entries)
+        if directory["log"] <= max(LOG_MERGE, directory["size"] // 8):
+            write_meta(self.__prefix + "dir", directory, self.database, self.collection)
+            return
+
+        pairs = []
+        for n in range(len(directory["pages"])):
+            pairs.extend(self.__page(directory, n))
+        self.__write_run(self.__apply(pairs, self.__log()))
+
+    @staticmethod
+    def __apply(pairs, log):
+        """
+        apply the log to sorted pairs
+        :return: sorted list of pairs
+        """
+        changes = {}
+        for op, pair in log:
+            changes[OrderedIndex.__pair_key(pair)] = op, pair
+        merged = [pair for pair in pairs if changes.pop(OrderedIndex.__pair_key(pair), (1, None))[0] > 0]
+        merged.extend(pair for op, pair in changes.values() if op > 0)
+        merged.sort(key=OrderedIndex.__pair_key)
+        return merged
+
+    @staticmethod
+    def __pair_key(pair):
+        """
+        key ordering the (value, id) pairs, on the value (see index.order_key) then the id, the pairs are also told
+        apart by their key as the values may not be hashable
+        """
+        return order_key(pair[0]), pair[1]
+
+    @staticmethod
+    def __bounds(lo, hi):
+        """
+        turn the bounds of a range into order keys, a single bound only reaches the values of its type
+        :return: (lowest key or None, highest key or None), None if no value can be between the bounds
+        """
+        if lo is None and hi is None:
+            return None, None
+        ranks = {type_rank(value) for value in (lo, hi) if value is not None}
+        if len(ranks) > 1:
+            return None
+        rank = ranks.pop()
+        if rank == OTHER_TYPES:
+            # the values of these types are not ordered by the queries, the whole type is read
+            return (rank,), (rank + 1,)
+        return (rank,) if lo is None else order_key(lo), (rank + 1,) if hi is None else order_key(hi)
+
+    def add(self, id, fields):
+        """
+        Add a document to the index
+        :param id: id of the document
+        :param fields: dict of MoNode field to value
+        """
+        self.add_many([(id, fields)])
+
+    def remove(self, id, fields):
+        """
+        Remove a document from the index
+        :param id: id of the document
+        :param fields: dict of MoNode field to value (as it was indexed)
+        """
+        self.remove_many([(id, fields)])
+
+    def add_many(self, documents):
+        """
+        Add documents to the index with a single append to the log
+        :param documents: iterable of (id, dict of MoNode field to value)
+        """
+        self.__append([(1, (value, id)) for id, value in self.__values(documents)])
+
+    def remove_many(self, documents):
+        """
+        Remove documents from the index with a single append to the log
+        :param documents: iterable of (id, dict of MoNode field to value (as it was indexed))
+        """
+        self.__append([(-1, (value, id)) for id, value in self.__values(documents)])
+
+    def __values(self, documents):
+        """
+        get the values of the documents having the field
+        :return: generator of (id, value)
+        """
+        for id, fields in documents:
+            value = field_value(fields, self.field)
+            if value is not MISSING:
+                yield id, value
+
+    def range(self, lo=None, hi=None, reverse=False, limit=None):
+        """
+        Find the documents where lo <= field <= hi in the order of the field (see index.order_key), a value of another
+        type than the bounds is never in the range (the numbers are one type)
+        :param lo: lowest value (None for no bound)
+        :param hi: highest value (None for no bound)
+        :param reverse: from the highest value to the lowest
+        :param limit: max number of ids
+        :return: list of ids
+        """
+        bounds = self.__bounds(lo, hi)
+        if bounds is None:
+            return []
+        lo, hi = bounds
+
+        def in_range(pair):
+            key = order_key(pair[0])
+            return (lo is None or key >= lo) and (hi is None or key <= hi)
+
+        # changes of the log inside the range
+        changes = {}
+        for op, pair in self.__log():
+            if in_range(pair):
+                changes[self.__pair_key(pair)] = op, pair
+
+        directory = self.__directory()
+        pages = [n for n, (first, last, _) in enumerate(directory["pages"])
+                 if (lo is None or order_key(last[0]) >= lo) and (hi is None or order_key(first[0]) <= hi)]
+        if reverse:
+            pages.reverse()
+
+        pairs = []
+        for n in pages:
+            page = self.__page(directory, n)
+            start = 0 if lo is None else self.__lower(page, lo)
+            end = len(page) if hi is None else self.__upper(page, hi)
+            page = [pair for pair in page[start:end] if changes.get(self.__pair_key(pair), (1, None))[0] > 0]
+            pairs.extend(reversed(page) if reverse else page)
+            # the next pages can only hold pairs after these ones
+            if limit is not None and len(pairs) >= limit:
+                break
+
+        pairs.extend(pair for op, pair in changes.values() if op > 0)
+        keys = sorted({self.__pair_key(pair) for pair in pairs}, reverse=reverse)
+        if limit is not None:
+            keys = keys[:limit]
+        return [id for _, id in keys]
+
+    @staticmethod
+    def __lower(page, key):
+        """
+        position of the first pair with a value key >= key
+        """
+        lo, hi = 0, len(page)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if order_key(page[mid][0]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    @staticmethod
+    def __upper(page, key):
+        """
+        position after the last pair with a value key <= key
+        """
+        lo, hi = 0, len(page)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if order_key(page[mid][0]) <= key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def drop(self):
+        """
+        Delete every file of the index
+        """
+        for name in base_ls_meta(self.database, self.collection):
+            if name.startswith(self.__prefix):
+                base_del_meta(name, self.database, self.collection)
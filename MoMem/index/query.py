@@ -0,0 +1,351 @@
+"""
+query.py
+Created on 2026-10-18 5:50:00 PM
+By: Will Selke
+
+This file contains the MoMem query engine behind Collection.find. A filter is a Mongo like dict over the MoNode fields
+(name, type, size, modi, desc, tags and notes.<key>), e.g.
+
+    {"type": "image", "tags": {"$all": ["toffu", "picture"]}, "size": {"$gte": 1000}, "notes.color": "orange"}
+
+The planner looks at the indexes of the collection and picks one to get the candidate documents (hash index for an
+equality, the tag index for tags, the ordered index for a range or a sort), without a usable index every document is
+scanned. Only the fields needed by the filter, the sort and the projection are ever read from the documents.
+"""
+from MoMem.MoNode.monode_pickle import MONODE_FIELDS
+from MoMem.index.index import MISSING, field_value, normalize_field, order_key
+
+# the operators of a condition
+OPERATORS = ("$eq", "$ne", "$gt", "$gte", "$lt", "$lte", "$in", "$nin", "$all", "$exists")
+
+# the order in which the plans are preferred (the most selective first)
+PLAN_PRIORITY = ("hash", "inverted", "ordered", "scan")
+
+
+def parse_sort(sort):
+    """
+    Normalize a sort, "size", ("size", -1) and [("size", -1), ("name", 1)] are all valid
+    :param sort: the sort
+    :return: list of (full field name, 1 or -1)
+    """
+    if sort is None:
+        return []
+    if isinstance(sort, str):
+        sort = [(sort, 1)]
+    elif isinstance(sort, tuple):
+        sort = [sort]
+
+    output = []
+    for item in sort:
+        field, direction = (item, 1) if isinstance(item, str) else item
+        if direction not in (1, -1):
+            raise ValueError(f"Sort direction must be 1 or -1 not {direction}")
+        output.append((normalize_field(field), direction))
+    return output
+
+
+def __operators(condition):
+    """
+    Turn a condition into a dict of operator to value ({"$eq": value} for a plain value)
+    """
+    if isinstance(condition, dict) and condition and all(str(k).startswith("$") for k in condition):
+        for op in condition:
+            if op not in OPERATORS:
+                raise ValueError(f"Unknown operator {op}")
+        return condition
+    return {"$eq": condition}
+
+
+def __conditions(filter):
+    """
+    Flatten the top level $and of a filter
+    :return: list of (full field name, dict of operator to value), list of the $or filters
+    """
+    conditions = []
+    ors = []
+    for key, value in filter.items():
+        if key == "$and":
+            for sub in value:
+                c, o = __conditions(sub)
+                conditions.extend(c)
+                ors.extend(o)
+        elif key == "$or":
+            ors.append(value)
+        elif key.startswith("$"):
+            raise ValueError(f"Unknown operator {key}")
+        else:
+            conditions.append((normalize_field(key), __operators(value)))
+    return conditions, ors
+
+
+def filter_fields(filter):
+    """
+    Get the fields needed to evaluate a filter, the keys of the notes keep their full name so only them are decoded (see
+    monode_pickle.load_fields)
+    :param filter: the filter
+    :return: set of MoNode fields and "notes.<key>"
+    """
+    conditions, ors = __conditions(filter)
+    fields = {field for field, _ in conditions}
+    for branches in ors:
+        for branch in branches:
+            fields |= filter_fields(branch)
+    return fields
+
+
+def __compare(value, op, target):
+    """
+    Evaluate a single operator on a value, a value of another type never matches a comparison
+    """
+    try:
+        if op == "$eq":
+            return value is not MISSING and value == target
+        if op == "$ne":
+            return value is MISSING or value != target
+        if op == "$in":
+            return value is not MISSING and value in target
+        if op == "$nin":
+            return value is MISSING or value not in target
+        if op == "$exists":
+            return (value is not MISSING) == bool(target)
+        if value is MISSING:
+            return False
+        if op == "$gt":
+            return value > target
+        if op == "$gte":
+            return value >= target
+        if op == "$lt":
+            return value < target
+        if op == "$lte":
+            return value <= target
+        if op == "$all":
+            return all(t in value for t in target)
+    except TypeError:
+        return False
+    return False
+
+
+def __compare_tags(tags, op, target):
+    """
+    Evaluate a single operator on the tags, a plain value matches if it is one of the tags
+    """
+    if op == "$exists":
+        return (tags is not MISSING) == bool(target)
+    tags = [] if tags is MISSING or tags is None else tags
+    if op == "$eq":
+        return tags == target if isinstance(target, list) else target in tags
+    if op == "$ne":
+        return not __compare_tags(tags, "$eq", target)
+    if op == "$in":
+        return any(t in tags for t in target)
+    if op == "$nin":
+        return not any(t in tags for t in target)
+    if op == "$all":
+        return all(t in tags for t in target)
+    raise ValueError(f"The operator {op} can not be used on tags")
+
+
+def match(filter, fields):
+    """
+    Check if a document matches a filter
+    :param filter: the filter
+    :param fields: dict of MoNode field to value (at least the fields of filter_fields(filter))
+    :return: True if the document matches
+    """
+    conditions, ors = __conditions(filter)
+    for field, ops in conditions:
+        value = field_value(fields, field)
+        compare = __compare_tags if field == "tags" else __compare
+        for op, target in ops.items():
+            if not compare(value, op, target):
+                return False
+
+    for branches in ors:
+        if not any(match(branch, fields) for branch in branches):
+            return False
+    return True
+
+
+def plan(filter, registry, sort=None, limit=None, estimate=None):
+    """
+    Choose how to run a query
+    :param filter: the filter
+    :param registry: the indexes of the collection (see Collection.ls_indexes())
+    :param sort: the sort (see parse_sort)
+    :param limit: max number of documents
+    :param estimate: function (candidate plan) -> number of candidate documents (see estimate), only called to choose
+    between a sorted plan which can stop early and a selective index, None to always prefer the selective index
+    :return: dict describing the plan (also what Collection.explain returns)
+    """
+    conditions, ors = __conditions(filter)
+    sort = parse_sort(sort)
+
+    candidates = []
+    for field, ops in conditions:
+        index = registry.get(field, {}).get("type")
+        if index == "hash" and ("$eq" in ops or "$in" in ops):
+            values = [ops["$eq"]] if "$eq" in ops else list(ops["$in"])
+            candidates.append({"plan": "hash", "field": field, "values": values})
+
+        elif index == "inverted":
+            tags_all = list(ops.get("$all", []))
+            if "$eq" in ops and not isinstance(ops["$eq"], list):
+                tags_all.append(ops["$eq"])
+            tags_any = list(ops.get("$in", []))
+            if tags_all or tags_any:
+                candidates.append({"plan": "inverted", "field": field, "all": tags_all, "any": tags_any})
+
+        elif index == "ordered" and any(op in ops for op in ("$eq", "$gt", "$gte", "$lt", "$lte")):
+            lo = ops.get("$eq", ops.get("$gte", ops.get("$gt")))
+            hi = ops.get("$eq", ops.get("$lte", ops.get("$lt")))
+            candidates.append({"plan": "ordered", "field": field, "lo": lo, "hi": hi, "reverse": False})
+
+    # an ordered index on the first sort field gives the documents already sorted, it can be used if every document
+    # has the field (size and modi always exist, other fields must be required by the filter)
+    if len(sort) == 1 and registry.get(sort[0][0], {}).get("type") == "ordered":
+        field, direction = sort[0]
+        required = ("$eq", "$gt", "$gte", "$lt", "$lte", "$in", "$all")
+        if field in ("size", "modi") or any(f == field and any(op in ops for op in required) for f, ops in conditions):
+            for candidate in candidates:
+                if candidate["plan"] == "ordered" and candidate["field"] == field:
+                    candidate["reverse"] = direction == -1
+                    candidate["sorted"] = True
+            if not any(c.get("sorted") for c in candidates):
+                candidates.append({"plan": "ordered", "field": field, "lo": None, "hi": None,
+                                   "reverse": direction == -1, "sorted": True})
+
+    # a sorted plan with a limit can stop early, otherwise the most selective index wins. The sorted plan reads about
+    # limit * total / matches documents before limit of them match, the selective index reads its matches
+    sorted_plans = [c for c in candidates if c.get("sorted")]
+    selective = [c for c in candidates if c["plan"] in ("hash", "inverted")]
+    early = limit is not None and not selective
+    if limit is not None and sorted_plans and selective and estimate is not None:
+        matches = min(estimate(c) for c in selective)
+        early = matches > limit and matches * matches > limit * estimate(sorted_plans[0])
+
+    def rank(candidate):
+        return 0 if candidate.get("sorted") and early else 1, PLAN_PRIORITY.index(candidate["plan"])
+
+    candidates.sort(key=rank)
+    chosen = candidates[0] if candidates else {"plan": "scan"}
+
+    return {
+        "plan": chosen["plan"],
+        "access": chosen,
+        "sort": "index" if chosen.get("sorted") else ("memory" if sort else None),
+        "rejected": candidates[1:],
+        "read_fields": sorted(filter_fields(filter) | {f for f, _ in sort}),
+        "limit": limit
+    }
+
+
+def sort_key(field):
+    """
+    Key function to sort documents on a field, documents without the field come first, the values are ordered like an
+    ordered index orders them (see index.order_key)
+    """
+    def key(doc):
+        value = field_value(doc, field)
+        return (0,) if value is MISSING else (1, order_key(value))
+    return key
+
+
+def project(values, fields):
+    """
+    Keep some fields of a monode, the "notes.<key>" fields are kept in a dict of the notes (like get_monode(fields=...))
+    :param values: dict of MoNode field to value (with at least the kept keys of the notes)
+    :param fields: the fields to keep
+    :return: dict of field name to value
+    """
+    output = {f: values[f] for f in fields if not f.startswith("notes.")}
+    keys = [f[len("notes."):] for f in fields if f.startswith("notes.")]
+    if keys and "notes" not in output:
+        notes = values["notes"] if isinstance(values.get("notes"), dict) else {}
+        output["notes"] = {key: notes[key] for key in keys if key in notes}
+    return output
+
+
+def candidate_ids(collection, access):
+    """
+    Get the candidate documents of a plan
+    :param collection: the Collection
+    :param access: the chosen candidate plan (see plan)
+    :return: list of ids, sorted (in the order of the index for an ordered plan)
+    """
+    if access["plan"] == "hash":
+        ids = set()
+        for value in access["values"]:
+            ids.update(collection.find_by(access["field"], value))
+        return sorted(ids)
+    if access["plan"] == "inverted":
+        return collection.find_tags(all=access["all"], any=access["any"])
+    if access["plan"] == "ordered":
+        return collection.range(access["field"], access["lo"], access["hi"], access["reverse"])
+    return sorted(collection.ls_documents())
+
+
+def estimate(collection, candidate):
+    """
+    Estimate the number of candidate documents of a plan, a hash or inverted plan reads its index (a single bucket or
+    posting list), an ordered plan is not walked: the number of documents of the collection is used
+    :param collection: the Collection
+    :param candidate: the candidate plan (see plan)
+    :return: number of documents
+    """
+    if candidate["plan"] in ("hash", "inverted"):
+        return len(candidate_ids(collection, candidate))
+    return collection.stats()["count"]
+
+
+def execute(collection, filter, projection=None, sort=None, limit=None):
+    """
+    Run a query on a collection
+    :param collection: the Collection
+    :param filter: the filter
+    :param projection: the MoNode fields to return (None for every field)
+    :param sort: the sort (see parse_sort)
+    :param limit: max number of documents
+    :return: list of dict with the id and the projected fields
+    """
+    # the ids read to estimate a plan are kept so the plan picked is not read twice
+    found = []
+
+    def count(candidate):
+        if candidate["plan"] in ("hash", "inverted"):
+            found.append((candidate, candidate_ids(collection, candidate)))
+            return len(found[-1][1])
+        return estimate(collection, candidate)
+
+    query_plan = plan(filter, collection.ls_indexes(), sort, limit, count)
+    access = query_plan["access"]
+    projection = list(MONODE_FIELDS) if projection is None else list(projection)
+    ids = next((ids for candidate, ids in found if candidate is access), None)
+    if ids is None:
+        ids = candidate_ids(collection, access)
+
+    read_fields = sorted(set(query_plan["read_fields"]) | set(projection))
+    sort = parse_sort(sort)
+    stop_early = limit is not None and (not sort or query_plan["sort"] == "index")
+
+    output = []
+    for id in ids:
+        try:
+            doc = collection.get_monode(id, fields=read_fields)
+        except FileNotFoundError:
+            # deleted while the query was running
+            continue
+        if match(filter, doc):
+            doc["id"] = id
+            output.append(doc)
+            if stop_early and len(output) >= limit:
+                break
+
+    if sort and query_plan["sort"] == "memory":
+        # ties are broken on the id like an ordered index does
+        output.sort(key=lambda doc: doc["id"], reverse=sort[-1][1] == -1)
+        for field, direction in reversed(sort):
+            output.sort(key=sort_key(field), reverse=direction == -1)
+    if limit is not None:
+        output = output[:limit]
+
+    return [dict({"id": doc["id"]}, **project(doc, projection)) for doc in output]
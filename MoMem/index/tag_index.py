@@ -0,0 +1,291 @@
+"""
+tag_index.py
+Created on 2026-10-18 4:30:00 PM
+By: Will Selke
+
+This file contains the inverted tag index. Every document gets a document number (its position in an append only
+table of ids) and every tag gets a posting list, the sorted array of the numbers of the documents holding the tag.
+Updates are appended to a small log next to the posting list which is merged back once it grows, so saving a document
+never rewrites the posting list of a popular tag. Queries intersect the posting lists smallest first.
+"""
+import hashlib
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+
+from MoMem.basic_file_op import base_read_meta, base_write_meta, base_append_meta, base_del_meta, base_ls_meta, \
+    base_read_meta_from
+
+# names of the metadata files after the name of the index
+DOCS = ".docs"
+POSTINGS = ".p."
+LOG = ".l."
+
+# merge the log into the posting list once it has more entries than this (or than 1/8 of the posting list)
+LOG_MERGE = 1024
+
+# the document tables read so far by (database, collection, name of the index)
+_tables = {}
+_tables_lock = threading.RLock()
+
+
+def _to_disk(values: array) -> bytes:
+    """
+    arrays are stored little endian
+    """
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_disk(typecode, data) -> array:
+    """
+    read an array stored with _to_disk (a partial trailing item is ignored)
+    """
+    values = array(typecode)
+    values.frombytes(data[:len(data) - len(data) % values.itemsize])
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def intersect(small, big):
+    """
+    Intersect two sorted arrays by searching the items of the small one in the big one
+    :param small: sorted array
+    :param big: sorted array
+    :return: sorted array
+    """
+    output = array("I")
+    lo = 0
+    for x in small:
+        lo = bisect_left(big, x, lo)
+        if lo == len(big):
+            break
+        if big[lo] == x:
+            output.append(x)
+    return output
+
+
+class TagIndex:
+    """
+    # field : always "tags"
+    # name : The name of the index files (see index_build.IndexBuildJob)
+    """
+    TYPE = "inverted"
+
+    def __init__(self, database, collection, field="tags", name=None):
+        """
+        Create the index object (the index files are only written by build / add / remove)
+
+        :param database: name of the database
+        :param collection: name of the collection
+        :param field: the indexed field (only "tags" can be indexed)
+        :param name: the name of the index files (default the field)
+        """
+        if field != "tags":
+            raise ValueError(f"An inverted index can only be built on tags not {field}")
+        self.database = database
+        self.collection = collection
+        self.field = field
+        self.name = field if name is None else name
+
+    @property
+    def fields(self):
+        """
+        The MoNode fields to read from a document to update the index
+        """
+        return ["tags"]
+
+    @property
+    def settings(self):
+        """
+        The settings to store in the registry to open the index again
+        """
+        return {"type": self.TYPE, "name": self.name}
+
+    @staticmethod
+    def __tag_key(tag):
+        """
+        tags can hold any character so the files are named after a hash of the tag
+        """
+        return hashlib.sha1(str(tag).encode()).hexdigest()
+
+    def __table(self):
+        """
+        Get the document table, only the part appended since the last call is read
+        :return: [list of ids, dict of id to document number, bytes read]
+        """
+        with _tables_lock:
+            table = _tables.setdefault((self.database, self.collection, self.name), [[], {}, 0])
+            data = base_read_meta_from(self.name + DOCS, table[2], self.database, self.collection)
+            if data is None:
+                # the table was rebuilt
+                table[:] = [[], {}, 0]
+                data = base_read_meta_from(self.name + DOCS, 0, self.database, self.collection) or b""
+
+            # only take complete lines
+            data = data[:data.rfind(b"\n") + 1]
+            for id in data.decode().splitlines():
+                table[1][id] = len(table[0])
+                table[0].append(id)
+            table[2] += len(data)
+            return table
+
+    def __doc_numbers(self, ids, create):
+        """
+        Get the document numbers of ids
+        :param ids: list of ids
+        :param create: whether to give a number to the new documents
+        :return: dict of id to number (the documents without a number are left out)
+        """
+        with _tables_lock:
+            table = self.__table()
+            new = [id for id in dict.fromkeys(ids) if id not in table[1]]
+            if new and create:
+                base_append_meta(self.name + DOCS, "".join(id + "\n" for id in new).encode(), self.database,
+                                 self.collection)
+                table = self.__table()
+            return {id: table[1][id] for id in ids if id in table[1]}
+
+    def postings(self, tag):
+        """
+        Get the posting list of a tag
+        :param tag: the tag
+        :return: sorted array of document numbers
+        """
+        key = self.__tag_key(tag)
+        base = _from_disk("I", base_read_meta(self.name + POSTINGS + key, self.database, self.collection) or b"")
+        log = _from_disk("q", base_read_meta(self.name + LOG + key, self.database, self.collection) or b"")
+        if not log:
+            return base
+
+        # the log holds number + 1 for an add and -(number + 1) for a remove, the last entry wins
+        changes = {abs(x) - 1: x > 0 for x in log}
+        merged = {x for x in base if changes.get(x, True)}
+        merged.update(x for x, added in changes.items() if added)
+        output = array("I", sorted(merged))
+
+        if len(log) > max(LOG_MERGE, len(base) // 8):
+            base_write_meta(self.name + POSTINGS + key, _to_disk(output), self.database, self.collection)
+            base_del_meta(self.name + LOG + key, self.database, self.collection)
+        return output
+
+    def __log(self, entries):
+        """
+        append the entries to the log of each tag
+        :param entries: dict of tag to list of entries
+        """
+        for tag, values in entries.items():
+            base_append_meta(self.name + LOG + self.__tag_key(tag), _to_disk(array("q", values)), self.database,
+                             self.collection)
+
+    def build(self, documents):
+        """
+        Build the index from scratch
+        :param documents: iterable of (id, dict of MoNode field to value)
+        """
+        ids = []
+        postings = {}
+        for id, fields in documents:
+            for tag in set(fields.get("tags") or ()):
+                postings.setdefault(self.__tag_key(tag), array("I")).append(len(ids))
+            ids.append(id)
+
+        self.drop()
+        for key, values in postings.items():
+            base_write_meta(self.name + POSTINGS + key, _to_disk(values), self.database, self.collection)
+        base_write_meta(self.name + DOCS, "".join(id + "\n" for id in ids).encode(), self.database, self.collection)
+
+    def add(self, id, fields):
+        """
+        Add a document to the index
+        :param id: id of the document
+        :param fields: dict of MoNode field to value
+        """
+        self.add_many([(id, fields)])
+
+    def remove(self, id, fields):
+        """
+        Remove a document from the index
+        :param id: id of the document
+        :param fields: dict of MoNode field to value (as it was indexed)
+        """
+        self.remove_many([(id, fields)])
+
+    def add_many(self, documents):
+        """
+        Add documents to the index, the log of every tag is appended once
+        :param documents: iterable of (id, dict of MoNode field to value)
+        """
+        self.__update(documents, 1)
+
+    def remove_many(self, documents):
+        """
+        Remove documents from the index, the log of every tag is appended once
+        :param documents: iterable of (id, dict of MoNode field to value (as it was indexed))
+        """
+        self.__update(documents, -1)
+
+    def __update(self, documents, sign):
+        """
+        log the tags of the documents, the log holds number + 1 for an add and -(number + 1) for a remove
+        """
+        documents = [(id, fields.get("tags") or ()) for id, fields in documents]
+        numbers = self.__doc_numbers([id for id, tags in documents if tags], sign > 0)
+
+        entries = {}
+        for id, tags in documents:
+            if id in numbers:
+                for tag in set(tags):
+                    entries.setdefault(tag, []).append(sign * (numbers[id] + 1))
+        self.__log(entries)
+
+    def find(self, all=None, any=None, none=None, universe=None):
+        """
+        Find the documents by tags
+        :param all: the documents must have every one of these tags
+        :param any: the documents must have at least one of these tags
+        :param none: the documents must not have any of these tags
+        :param universe: function returning every id, used when neither all nor any is given
+        :return: sorted list of ids
+        """
+        ids = self.__table()[0]
+
+        lists = sorted((self.postings(tag) for tag in set(all or ())), key=len)
+        if any:
+            union = set()
+            for tag in set(any):
+                union.update(self.postings(tag))
+            lists.append(array("I", sorted(union)))
+            lists.sort(key=len)
+
+        if lists:
+            result = lists[0]
+            for values in lists[1:]:
+                if not result:
+                    break
+                result = intersect(result, values)
+            result = [ids[x] for x in result]
+        else:
+            result = sorted(universe())
+
+        if none:
+            excluded = set()
+            for tag in set(none):
+                excluded.update(ids[x] for x in self.postings(tag))
+            result = [id for id in result if id not in excluded]
+
+        return sorted(result)
+
+    def drop(self):
+        """
+        Delete every file of the index
+        """
+        with _tables_lock:
+            _tables.pop((self.database, self.collection, self.name), None)
+        for name in base_ls_meta(self.database, self.collection):
+            if name.startswith(self.name + "."):
+                base_del_meta(name, self.database, self.collection)
@@ -0,0 +1,707 @@
+"""
+backend.py
+Created on 2026-10-19 12:30:00 AM
+By: Will Selke
+
+This file contains the storage backends, the lowest layer of MoMem. Every file operation of MoMem (basic_file_op, the
+storage engines, the write-ahead log, Database and Collection) goes through the backend of the process, which maps the
+paths of MoMem (relative, "/" separated, e.g. "db/col/data/<id>") to where the bytes live:
+    DiskBackend : the folders and files under config.ROOT_DIR (the default)
+    MemoryBackend : dicts in the memory of the process, for ephemeral caches and benchmarks without the file system
+The backend is chosen for the whole process with set_backend, before any database is opened.
+
+A backend has SHARED (whether other processes see the same files) and the functions:
+    location (where a path is, e.g. the path on the disk), exists, isdir, mkdir, makedirs, listdir, rmdir, rmtree,
+    read, write, write_atomic, write_at, append, remove, replace, size, truncate, open (a Handle), sync and sync_dir
+"""
+import os
+import threading
+
+import MoMem.config.config as cfg
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+
+class DiskHandle:
+    """
+    Open file of the DiskBackend, for positioned reads and appends
+    """
+
+    def __init__(self, fd):
+        """
+        :param fd: the file descriptor
+        """
+        self.fd = fd
+
+    def read_at(self, offset, length):
+        """
+        Read length bytes at offset
+        :param offset: where to start reading
+        :param length: number of bytes to read
+        :return: the data (shorter than length at the end of the file)
+        """
+        # os.pread is not available on windows
+        if hasattr(os, "pread"):
+            return os.pread(self.fd, length, offset)
+        os.lseek(self.fd, offset, os.SEEK_SET)
+        return os.read(self.fd, length)
+
+    def append(self, data):
+        """
+        Append data to the end of the file (opened with append=True)
+        :param data: bytes-like object to append
+        """
+        view = memoryview(data)
+        while view:
+            view = view[os.write(self.fd, view):]
+
+    def size(self):
+        """
+        :return: the size of the file
+        """
+        return os.fstat(self.fd).st_size
+
+    def truncate(self, size):
+        """
+        Cut the file to size bytes
+        :param size: the new size of the file
+        """
+        os.ftruncate(self.fd, size)
+
+    def sync(self):
+        """
+        Flush the file to the disk (fsync)
+        """
+        os.fsync(self.fd)
+
+    def lock(self, wait=False, shared=False):
+        """
+        Lock the file against the other processes, the lock is released when the handle is closed (or unlock is called)
+        :param wait: wait for the other process to release the lock (windows gives up after about 10 seconds)
+        :param shared: take a lock shared with the other processes taking a shared lock (windows only has exclusive
+        locks)
+        :return: False if another process holds the lock
+        """
+        try:
+            if os.name == "nt":
+                # windows locks a byte range from the current position
+                os.lseek(self.fd, 0, os.SEEK_SET)
+                msvcrt.locking(self.fd, msvcrt.LK_LOCK if wait else msvcrt.LK_NBLCK, 1)
+            else:
+                kind = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+                fcntl.flock(self.fd, kind if wait else kind | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        return True
+
+    def unlock(self):
+        """
+        Release the lock of the file
+        """
+        if os.name == "nt":
+            os.lseek(self.fd, 0, os.SEEK_SET)
+            msvcrt.locking(self.fd, msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    def close(self):
+        """
+        Close the file
+        """
+        os.close(self.fd)
+
+    def __enter__(self):
+        """
+        Use the handle in a with, the file is closed at its end
+        :return: the handle
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """
+        Close the file at the end of the with
+        """
+        self.close()
+
+
+class DiskBackend:
+    """
+    # root : The folder holding the databases (None for config.ROOT_DIR, read at every call)
+    """
+    SHARED = True
+
+    def __init__(self, root=None):
+        """
+        :param root: the folder holding the databases (None for config.ROOT_DIR)
+        """
+        self.root = root
+
+    def __path(self, path):
+        """
+        path on the disk of a path of MoMem
+        """
+        return os.path.join(self.root or cfg.ROOT_DIR, *[part for part in path.split("/") if part])
+
+    def location(self, path):
+        """
+        Where a path is, for the messages and the tools working on the real files
+        :param path: path of MoMem
+        :return: the path on the disk
+        """
+        return self.__path(path)
+
+    def exists(self, path):
+        """
+        Check if a file or a folder exists
+        :param path: path of MoMem
+        :return: True if it exists
+        """
+        return os.path.exists(self.__path(path))
+
+    def isdir(self, path):
+        """
+        Check if a path is a folder
+        :param path: path of MoMem
+        :return: True if it is an existing folder
+        """
+        return os.path.isdir(self.__path(path))
+
+    def mkdir(self, path):
+        """
+        Create a folder, its parent must exist (FileExistsError if the path exists)
+        :param path: path of the folder
+        """
+        os.mkdir(self.__path(path))
+
+    def makedirs(self, path):
+        """
+        Create a folder and its missing parents (nothing happens if it exists)
+        :param path: path of the folder
+        """
+        os.makedirs(self.__path(path), exist_ok=True)
+
+    def listdir(self, path):
+        """
+        List the names of the entries of a folder
+        :param path: path of the folder
+        :return: list of names (not paths)
+        """
+        return os.listdir(self.__path(path))
+
+    def rmdir(self, path):
+        """
+        Delete an empty folder
+        :param path: path of the folder
+        """
+        os.rmdir(self.__path(path))
+
+    def rmtree(self, path):
+        """
+        Delete a folder and everything in it
+        :param path: path of the folder
+        """
+        for root, dirs, files in os.walk(self.__path(path), topdown=False):
+            for file in files:
+                os.remove(os.path.join(root, file))
+            for dir in dirs:
+                os.rmdir(os.path.join(root, dir))
+        os.rmdir(self.__path(path))
+
+    def read(self, path):
+        """
+        Read a whole file
+        :param path: path of the file
+        :return: the content of the file (bytes)
+        """
+        with open(self.__path(path), "rb") as f:
+            return f.read()
+
+    def write(self, path, data, exclusive=False):
+        """
+        Write a file, replacing its content
+        :param path: path of the file
+        :param data: bytes-like object, or iterable of bytes-like objects written one after the other
+        :param exclusive: raise FileExistsError if the file exists
+        """
+        # "xb" fails if the file exists
+        with open(self.__path(path), "xb" if exclusive else "wb") as f:
+            if isinstance(data, (bytes, bytearray, memoryview)):
+                f.write(data)
+            else:
+                f.writelines(data)
+
+    def write_atomic(self, path, data):
+        """
+        Write a file so a reader sees either its old or its new content, never half of it
+        :param path: path of the file
+        :param data: bytes-like object
+        """
+        # a reader never sees half of the file
+        with open(self.__path(path) + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(self.__path(path) + ".tmp", self.__path(path))
+
+    def write_at(self, path, offset, data):
+        """
+        Overwrite part of a file in place (the file is created if it does not exist)
+        :param path: path of the file
+        :param offset: where to write
+        :param data: bytes-like object
+        """
+        path = self.__path(path)
+        with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+            f.seek(offset)
+            f.write(data)
+
+    def append(self, path, data):
+        """
+        Append to a file (the file is created if it does not exist)
+        :param path: path of the file
+        :param data: bytes-like object
+        """
+        with open(self.__path(path), "ab") as f:
+            f.write(data)
+
+    def remove(self, path):
+        """
+        Delete a file
+        :param path: path of the file
+        """
+        os.remove(self.__path(path))
+
+    def replace(self, source, destination):
+        """
+        Move a file, the destination is replaced if it exists
+        :param source: path of the file
+        :param destination: its new path
+        """
+        os.replace(self.__path(source), self.__path(destination))
+
+    def size(self, path):
+        """
+        Get the size of a file
+        :param path: path of the file
+        :return: the size in bytes
+        """
+        return os.path.getsize(self.__path(path))
+
+    def truncate(self, path, size):
+        """
+        Cut a file
+        :param path: path of the file
+        :param size: the new size of the file
+        """
+        os.truncate(self.__path(path), size)
+
+    def open(self, path, append=False):
+        """
+        Open a file for positioned reads, or for appends too (the file is then created if it does not exist)
+        :param path: path of the file
+        :param append: open it for appends too
+        :return: DiskHandle, the caller must close it
+        """
+        flags = os.O_RDWR | os.O_CREAT | os.O_APPEND if append else os.O_RDONLY
+        return DiskHandle(os.open(self.__path(path), flags | getattr(os, "O_BINARY", 0)))
+
+    def sync(self, path):
+        """
+        Flush a file to the disk (fsync)
+        :param path: path of the file
+        """
+        # windows only flushes files opened for writing
+        fd = os.open(self.__path(path), os.O_RDWR | getattr(os, "O_BINARY", 0))
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def sync_dir(self, path):
+        """
+        Flush the entries of a folder to the disk, so the files created or renamed in it survive a crash
+        :param path: path of the folder
+        """
+        # folders cannot be opened on windows, their entries are flushed with the files
+        if os.name == "nt":
+            return
+        fd = os.open(self.__path(path), os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+class MemoryHandle:
+    """
+    Open file of the MemoryBackend (see DiskHandle)
+    """
+
+    def __init__(self, backend, path):
+        """
+        :param backend: the MemoryBackend holding the file
+        :param path: path of the file
+        """
+        self.backend = backend
+        self.path = path
+
+    def read_at(self, offset, length):
+        """
+        Read length bytes at offset
+        :param offset: where to start reading
+        :param length: number of bytes to read
+        :return: the data (shorter than length at the end of the file)
+        """
+        return self.backend.read_at(self.path, offset, length)
+
+    def append(self, data):
+        """
+        Append data to the end of the file
+        :param data: bytes-like object to append
+        """
+        self.backend.append(self.path, data)
+
+    def size(self):
+        """
+        :return: the size of the file
+        """
+        return self.backend.size(self.path)
+
+    def truncate(self, size):
+        """
+        Cut the file to size bytes
+        :param size: the new size of the file
+        """
+        self.backend.truncate(self.path, size)
+
+    def sync(self):
+        """
+        Nothing to flush, the memory is never on the disk
+        """
+
+    def lock(self, wait=False, shared=False):
+        """
+        No other process sees the memory of this one
+        :param wait: unused
+        :param shared: unused
+        :return: True
+        """
+        return True
+
+    def unlock(self):
+        """
+        Nothing to release
+        """
+
+    def close(self):
+        """
+        Nothing to close
+        """
+
+    def __enter__(self):
+        """
+        Use the handle in a with
+        :return: the handle
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """
+        Nothing to close at the end of the with
+        """
+        self.close()
+
+
+class MemoryBackend:
+    """
+    Folders and files kept in dicts, every operation holds one lock so the backend can be shared by threads (the data
+    is lost with the process)
+    """
+    SHARED = False
+
+    def __init__(self):
+        """
+        Create an empty backend holding only the root folder
+        """
+        # path -> bytearray, path -> set of the names in the folder
+        self.__files = {}
+        self.__dirs = {"": set()}
+        self.__lock = threading.RLock()
+
+    @staticmethod
+    def __split(path):
+        """
+        (parent, name) of a path
+        """
+        path = "/".join(part for part in path.split("/") if part)
+        parent, _, name = path.rpartition("/")
+        return path, parent, name
+
+    def __parent(self, path):
+        """
+        the entries of the parent folder of a path, raises if it does not exist
+        """
+        path, parent, name = self.__split(path)
+        if parent not in self.__dirs:
+            raise FileNotFoundError(f"Folder {parent} does not exist")
+        return path, self.__dirs[parent], name
+
+    def __file(self, path):
+        """
+        the content of a file, raises if it does not exist
+        """
+        path = self.__split(path)[0]
+        if path not in self.__files:
+            raise FileNotFoundError(f"File {path} does not exist")
+        return self.__files[path]
+
+    def location(self, path):
+        """
+        Where a path is, for the messages and the tools working on the real files
+        :param path: path of MoMem
+        :return: memory://<path>
+        """
+        return "memory://" + self.__split(path)[0]
+
+    def exists(self, path):
+        """
+        Check if a file or a folder exists
+        :param path: path of MoMem
+        :return: True if it exists
+        """
+        path = self.__split(path)[0]
+        with self.__lock:
+            return path in self.__files or path in self.__dirs
+
+    def isdir(self, path):
+        """
+        Check if a path is a folder
+        :param path: path of MoMem
+        :return: True if it is an existing folder
+        """
+        with self.__lock:
+            return self.__split(path)[0] in self.__dirs
+
+    def mkdir(self, path):
+        """
+        Create a folder, its parent must exist (FileExistsError if the path exists)
+        :param path: path of the folder
+        """
+        with self.__lock:
+            path, entries, name = self.__parent(path)
+            if path in self.__dirs or path in self.__files:
+                raise FileExistsError(f"{path} already exists")
+            self.__dirs[path] = set()
+            entries.add(name)
+
+    def makedirs(self, path):
+        """
+        Create a folder and its missing parents (nothing happens if it exists)
+        :param path: path of the folder
+        """
+        path = self.__split(path)[0]
+        with self.__lock:
+            parts = path.split("/")
+            for i in range(1, len(parts) + 1):
+                if "/".join(parts[:i]) not in self.__dirs:
+                    self.mkdir("/".join(parts[:i]))
+
+    def listdir(self, path):
+        """
+        List the names of the entries of a folder
+        :param path: path of the folder
+        :return: list of names (not paths)
+        """
+        path = self.__split(path)[0]
+        with self.__lock:
+            if path not in self.__dirs:
+                raise FileNotFoundError(f"Folder {path} does not exist")
+            return list(self.__dirs[path])
+
+    def rmdir(self, path):
+        """
+        Delete an empty folder
+        :param path: path of the folder
+        """
+        with self.__lock:
+            path, entries, name = self.__parent(path)
+            if path not in self.__dirs:
+                raise FileNotFoundError(f"Folder {path} does not exist")
+            if self.__dirs[path]:
+                raise OSError(f"Folder {path} is not empty")
+            del self.__dirs[path]
+            entries.discard(name)
+
+    def rmtree(self, path):
+        """
+        Delete a folder and everything in it
+        :param path: path of the folder
+        """
+        path = self.__split(path)[0]
+        with self.__lock:
+            for name in self.listdir(path):
+                child = f"{path}/{name}"
+                if child in self.__dirs:
+                    self.rmtree(child)
+                else:
+                    self.remove(child)
+            self.rmdir(path)
+
+    def read(self, path):
+        """
+        Read a whole file
+        :param path: path of the file
+        :return: the content of the file (bytes)
+        """
+        with self.__lock:
+            return bytes(self.__file(path))
+
+    def read_at(self, path, offset, length):
+        """
+        Read part of a file
+        :param path: path of the file
+        :param offset: where to start reading
+        :param length: number of bytes to read
+        :return: the data (shorter than length at the end of the file)
+        """
+        with self.__lock:
+            return bytes(self.__file(path)[offset:offset + length])
+
+    def write(self, path, data, exclusive=False):
+        """
+        Write a file, replacing its content
+        :param path: path of the file
+        :param data: bytes-like object, or iterable of bytes-like objects written one after the other
+        :param exclusive: raise FileExistsError if the file exists
+        """
+        content = bytearray(data) if isinstance(data, (bytes, bytearray, memoryview)) else bytearray(b"".join(data))
+        with self.__lock:
+            path, entries, name = self.__parent(path)
+            if path in self.__dirs or (exclusive and path in self.__files):
+                raise FileExistsError(f"{path} already exists")
+            self.__files[path] = content
+            entries.add(name)
+
+    def write_atomic(self, path, data):
+        """
+        Write a file so a reader sees either its old or its new content, never half of it
+        :param path: path of the file
+        :param data: bytes-like object
+        """
+        # every write is atomic for the readers as they hold the lock
+        self.write(path, data)
+
+    def write_at(self, path, offset, data):
+        """
+        Overwrite part of a file in place (the file is created if it does not exist, a gap before offset is filled with
+        zeros)
+        :param path: path of the file
+        :param offset: where to write
+        :param data: bytes-like object
+        """
+        with self.__lock:
+            path, entries, name = self.__parent(path)
+            content = self.__files.setdefault(path, bytearray())
+            entries.add(name)
+            if len(content) < offset:
+                content.extend(bytes(offset - len(content)))
+            content[offset:offset + len(data)] = data
+
+    def append(self, path, data):
+        """
+        Append to a file (the file is created if it does not exist)
+        :param path: path of the file
+        :param data: bytes-like object
+        """
+        with self.__lock:
+            path, entries, name = self.__parent(path)
+            self.__files.setdefault(path, bytearray()).extend(data)
+            entries.add(name)
+
+    def remove(self, path):
+        """
+        Delete a file
+        :param path: path of the file
+        """
+        with self.__lock:
+            path, entries, name = self.__parent(path)
+            self.__file(path)
+            del self.__files[path]
+            entries.discard(name)
+
+    def replace(self, source, destination):
+        """
+        Move a file, the destination is replaced if it exists
+        :param source: path of the file
+        :param destination: its new path
+        """
+        with self.__lock:
+            content = self.__file(source)
+            self.remove(source)
+            self.write(destination, content)
+
+    def size(self, path):
+        """
+        Get the size of a file
+        :param path: path of the file
+        :return: the size in bytes
+        """
+        with self.__lock:
+            return len(self.__file(path))
+
+    def truncate(self, path, size):
+        """
+        Cut a file
+        :param path: path of the file
+        :param size: the new size of the file
+        """
+        with self.__lock:
+            del self.__file(path)[size:]
+
+    def open(self, path, append=False):
+        """
+        Open a file for positioned reads, or for appends too (the file is then created if it does not exist)
+        :param path: path of the file
+        :param append: open it for appends too
+        :return: MemoryHandle
+        """
+        with self.__lock:
+            if append:
+                self.append(path, b"")
+            else:
+                self.__file(path)
+        return MemoryHandle(self, path)
+
+    def sync(self, path):
+        """
+        Nothing to flush, the memory is never on the disk
+        :param path: path of the file
+        """
+
+    def sync_dir(self, path):
+        """
+        Nothing to flush, the memory is never on the disk
+        :param path: path of the folder
+        """
+
+
+# the backend of the process
+_backend = DiskBackend()
+
+
+def get_backend():
+    """
+    :return: the backend of the process
+    """
+    return _backend
+
+
+def set_backend(backend):
+    """
+    Choose the backend of the process, before any database is opened (the databases of the previous backend are not
+    moved)
+    :param backend: DiskBackend() or MemoryBackend()
+    """
+    global _backend
+    _backend = backend
@@ -0,0 +1,107 @@
+"""
+blob_store.py
+Created on 2026-10-18 11:25:00 PM
+By: Will Selke
+
+This file contains the blob store of a database, where the data of the MoNodes of the collections with deduplication
+enabled is stored once, keyed by its sha256 digest (see Collection.set_dedup). Every blob has a reference count, saving
+data which is already stored only increments the count (nothing is written but the count) and deleting the last MoNode
+referencing a blob deletes it.
+
+The counts are changed holding a file lock, so the processes writing the database share them. They are not in the
+write-ahead log: a crash between a count and the write of its MoNode leaves a wrong count, so the recovery of the
+database counts the references of the stored MoNodes again (see rebuild).
+"""
+import hashlib
+
+from MoMem.MoNode.blob_ref import BlobRef
+from MoMem.basic_file_op import base_write_blob, base_read_blob, base_blob_size, base_read_blob_refs, \
+    base_write_blob_refs, base_del_blob, base_ls_blobs, base_lock_blobs
+
+
+class BlobStore:
+    """
+    # database : The name of the database
+    """
+
+    def __init__(self, database):
+        """
+        Create the blob store object of a database (the blobs are only written by put)
+
+        :param database: name of the database
+        """
+        self.database = database
+
+    def __lock(self):
+        """
+        the lock of the reference counts (shared by every collection of the database and every process)
+        """
+        return base_lock_blobs(self.database)
+
+    def put(self, data):
+        """
+        Store data, or add a reference to it if it is already stored
+        :param data: the data (bytes-like)
+        :return: BlobRef to store in place of the data
+        """
+        ref = BlobRef(hashlib.sha256(data).digest(), memoryview(data).nbytes)
+        with self.__lock():
+            count = base_read_blob_refs(ref.hex, self.database)
+            if count == 0 or base_blob_size(ref.hex, self.database) != ref.size:
+                base_write_blob(ref.hex, data, self.database)
+            base_write_blob_refs(ref.hex, count + 1, self.database)
+        return ref
+
+    def get(self, ref: BlobRef):
+        """
+        Read the data of a reference
+        :param ref: the BlobRef
+        :return: the data
+        """
+        return base_read_blob(ref.hex, self.database)
+
+    def release(self, ref: BlobRef):
+        """
+        Remove a reference to a blob, the blob is deleted with its last reference
+        :param ref: the BlobRef
+        """
+        with self.__lock():
+            count = base_read_blob_refs(ref.hex, self.database)
+            if count <= 1:
+                base_del_blob(ref.hex, self.database)
+            else:
+                base_write_blob_refs(ref.hex, count - 1, self.database)
+
+    def rebuild(self, count_refs):
+        """
+        Set the reference counts to the references of the stored MoNodes, the blobs no MoNode references are deleted
+        :param count_refs: function returning the count of every digest referenced by the MoNodes (dict of hex digest
+        to count), called holding the lock
+        """
+        with self.__lock():
+            counts = count_refs()
+            for digest in base_ls_blobs(self.database):
+                count = counts.get(digest, 0)
+                if count == 0:
+                    base_del_blob(digest, self.database)
+                elif count != base_read_blob_refs(digest, self.database):
+                    base_write_blob_refs(digest, count, self.database)
+
+    def stats(self):
+        """
+        Report how much the deduplication saves
+        :return: dict with the number of blobs, of references, the stored bytes, the bytes the MoNodes would take
+        without deduplication (logical_bytes), the saved bytes and the dedup ratio (logical / stored)
+        """
+        blobs = references = stored = logical = 0
+        with self.__lock():
+            for digest in base_ls_blobs(self.database):
+                size = base_blob_size(digest, self.database) or 0
+                count = base_read_blob_refs(digest, self.database)
+                blobs += 1
+                references += count
+                stored += size
+                logical += size * count
+
+        return {"blobs": blobs, "references": references, "stored_bytes": stored, "logical_bytes": logical,
+                "saved_bytes": logical - stored, "ratio": logical / stored if stored else 1.0}
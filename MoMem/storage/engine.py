@@ -0,0 +1,78 @@
+"""
+engine.py
+Created on 2026-10-18 9:35:00 PM
+By: Will Selke
+
+This file contains the choice of the storage engine of a collection. The engine stores the pickled MoNodes of a
+collection, it is chosen when the collection is created (see Database.create_collection) and its type is kept in the
+metadata of the collection. The large object chunks and the metadata files are not stored by the engine.
+
+A storage engine has a TYPE and the functions:
+    exists(id), write(id, data, overwrite, check), read(id, check), open(id, check) (an object with read_at(offset,
+    length) and close, usable in a with), delete(id), list(), count(), time_ids(lo, hi) (the sorted time ids between
+    two bounds, see monode_id.py), compact(), sync() (flush the writes to the disk) and close()
+The engines are opened once per process and collection (see get_engine) as they may keep state in memory.
+"""
+import threading
+
+from MoMem.DB_COL.collection_meta import read_meta, write_meta
+from MoMem.storage.file_engine import FileEngine
+from MoMem.storage.segment_engine import SegmentEngine
+
+# name of the metadata file holding the type of the engine
+ENGINE = "engine"
+
+# the engine classes by type
+ENGINE_TYPES = {
+    FileEngine.TYPE: FileEngine,
+    SegmentEngine.TYPE: SegmentEngine
+}
+
+# the engine of the collections without an engine metadata file (created before the engines)
+DEFAULT_ENGINE = FileEngine.TYPE
+
+# the opened engines by (database, collection, readonly)
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def set_engine(database, collection, type=None):
+    """
+    Choose the engine of a new collection
+    :param database: name of the database
+    :param collection: name of the collection
+    :param type: type of engine (see ENGINE_TYPES, default DEFAULT_ENGINE)
+    """
+    type = type or DEFAULT_ENGINE
+    if type not in ENGINE_TYPES:
+        raise ValueError(f"Unknown storage engine {type}")
+    write_meta(ENGINE, type, database, collection)
+
+
+def get_engine(database, collection, readonly=False):
+    """
+    Get the engine of a collection, opened on the first call of the process
+    :param database: name of the database
+    :param collection: name of the collection
+    :param readonly: get an engine which only reads (for the processes not owning the collection, e.g. index builds)
+    :return: the engine
+    """
+    with _engines_lock:
+        key = (database, collection, readonly)
+        if key not in _engines:
+            type = read_meta(ENGINE, database, collection, DEFAULT_ENGINE)
+            _engines[key] = ENGINE_TYPES[type](database, collection, readonly=readonly)
+        return _engines[key]
+
+
+def close_engine(database, collection):
+    """
+    Close the engines of a collection opened by the process (before deleting the collection)
+    :param database: name of the database
+    :param collection: name of the collection
+    """
+    with _engines_lock:
+        for readonly in (False, True):
+            engine = _engines.pop((database, collection, readonly), None)
+            if engine is not None:
+                engine.close()
@@ -0,0 +1,375 @@
+"""
+file_engine.py
+Created on 2026-10-18 9:40:00 PM
+By: Will Selke
+
+This file contains the file storage engine, where every MoNode is its own file named by its id (see engine.py for the
+interface of the storage engines). The files are laid out in one of two ways, chosen per collection:
+    "flat" : the original layout of MoMem, every file in <collection>/data
+    "sharded" : two levels of folders named by the start of the crc32 of the id, <collection>/shards/3f/a0/<id>, so no
+    folder holds more than a few entries at millions of MoNodes
+A flat collection is moved to the sharded layout while it is in use by migrate(), the MoNodes are then looked up in
+both layouts until every file is moved.
+
+The time ids written and deleted (see monode_id.py) are appended to a journal by every process, so time_ids bisects
+the sorted time ids kept in memory after reading the end of the journal instead of listing the folders. The folders are
+only listed to write the journal again, the first time and by compact() which drops the deleted ids.
+"""
+import bisect
+import os
+import threading
+import zlib
+
+from MoMem.DB_COL.collection_meta import collection_lock, read_meta, write_meta
+from MoMem.MoNode.monode_id import is_time_id
+from MoMem.basic_file_op import base_write, base_read, base_open, base_pread, base_del, base_sync, base_sync_dir, \
+    base_write_meta, base_read_meta_from, base_append_meta, base_lock_meta
+from MoMem.storage.backend import get_backend
+
+# name of the metadata file holding the layout of the files
+LAYOUT = "layout"
+
+# the folder of the collection holding the files of each layout
+LAYOUT_FOLDERS = {
+    "flat": "data",
+    "sharded": "shards"
+}
+
+# number of files moved by migrate() between two releases of the collection lock
+MIGRATE_BATCH = 1000
+
+# name of the metadata file journaling the time ids ("+<id>\n" written, "-<id>\n" deleted), of the one holding its
+# generation (changed when the journal is written again) and of the one locked while reading or writing it again
+TIME_IDS = "time_ids"
+TIME_IDS_GENERATION = "time_ids.gen"
+TIME_IDS_LOCK = "time_ids.lock"
+
+
+def set_layout(database, collection, layout):
+    """
+    Choose the layout of the files of a new collection
+    :param database: name of the database
+    :param collection: name of the collection
+    :param layout: "flat" or "sharded"
+    """
+    if layout not in LAYOUT_FOLDERS:
+        raise ValueError(f"Unknown layout {layout}, expected one of {list(LAYOUT_FOLDERS)}")
+    write_meta(LAYOUT, {"layout": layout, "from": None}, database, collection)
+
+
+def shard(id):
+    """
+    Get the path of a file in the sharded layout
+    :param id: id of the MoNode
+    :return: the path relative to the shards folder
+    """
+    digest = f"{zlib.crc32(id.encode()):08x}"
+    return f"{digest[:2]}/{digest[2:4]}/{id}"
+
+
+class FileReader:
+    """
+    Positioned reads in a stored MoNode (see FileEngine.open)
+    """
+
+    def __init__(self, handle):
+        """
+        :param handle: handle from base_open
+        """
+        self.handle = handle
+
+    def read_at(self, offset, length):
+        """
+        Read length bytes at offset of the MoNode
+        """
+        return base_pread(self.handle, length, offset)
+
+    def close(self):
+        """
+        Close the file
+        """
+        self.handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class FileEngine:
+    """
+    # layout : The layout of the files ("flat" or "sharded")
+    # migrating : The layout the files are being moved from (see migrate), None if they are not moving
+    """
+    TYPE = "files"
+
+    def __init__(self, database, collection, readonly=False):
+        """
+        Open the storage of a collection (USE engine.get_engine INSTEAD)
+
+        :param database: name of the database
+        :param collection: name of the collection
+        :param readonly: unused, the files can always be read by another process
+        """
+        self.database = database
+        self.collection = collection
+        self.path = f"{database}/{collection}"
+        backend = get_backend()
+
+        layout = read_meta(LAYOUT, database, collection, {"layout": "flat", "from": None})
+        self.layout = layout["layout"]
+        self.migrating = layout["from"]
+        for folder in {LAYOUT_FOLDERS[self.layout], LAYOUT_FOLDERS[self.migrating or self.layout]}:
+            if not readonly and not backend.exists(f"{self.path}/{folder}"):
+                backend.mkdir(f"{self.path}/{folder}")
+
+        # the files written since the last sync, (folder, name)
+        self.__dirty = set()
+        self.__dirty_lock = threading.Lock()
+
+        # the sorted time ids, the generation of the journal they were read from and the end of what was read
+        self.__time_ids = []
+        self.__time_generation = None
+        self.__time_offset = 0
+        self.__time_lock = threading.Lock()
+
+    """========================================LAYOUT FUNCTIONS========================================="""
+    @staticmethod
+    def __name(id, layout):
+        """
+        (folder, name of the file in the folder) of a MoNode in a layout
+        """
+        return LAYOUT_FOLDERS[layout], shard(id) if layout == "sharded" else id
+
+    def __locate(self, id):
+        """
+        find the file of a MoNode
+        :return: (folder, name), None if the MoNode is not stored
+        """
+        if self.migrating is None:
+            layouts = [self.layout]
+        else:
+            # looked up again in the new layout in case the file was moved meanwhile
+            layouts = [self.layout, self.migrating, self.layout]
+        for layout in layouts:
+            folder, name = self.__name(id, layout)
+            if get_backend().exists(f"{self.path}/{folder}/{name}"):
+                return folder, name
+        return None
+
+    def __list(self, layout):
+        """
+        the ids stored in a layout
+        """
+        path = f"{self.path}/{LAYOUT_FOLDERS[layout]}"
+        backend = get_backend()
+        if not backend.exists(path):
+            return []
+        if layout == "flat":
+            return backend.listdir(path)
+        return [id for first in backend.listdir(path) for second in backend.listdir(f"{path}/{first}")
+                for id in backend.listdir(f"{path}/{first}/{second}") if not id.endswith(".tmp")]
+
+    def migrate(self, layout="sharded", batch_size=MIGRATE_BATCH):
+        """
+        Move the files to another layout while the collection stays usable, the collection lock is only held while a
+        batch of files is moved (the saves and deletes of the collection wait for it)
+        :param layout: the new layout
+        :param batch_size: number of files moved by batch
+        :return: the number of moved files
+        """
+        if layout not in LAYOUT_FOLDERS:
+            raise ValueError(f"Unknown layout {layout}, expected one of {list(LAYOUT_FOLDERS)}")
+
+        lock = collection_lock(self.database, self.collection)
+        backend = get_backend()
+        with lock:
+            if layout == self.layout and self.migrating is None:
+                return 0
+            if self.migrating is None:
+                self.migrating = self.layout
+            self.layout = layout
+            backend.makedirs(f"{self.path}/{LAYOUT_FOLDERS[layout]}")
+            write_meta(LAYOUT, {"layout": self.layout, "from": self.migrating}, self.database, self.collection)
+
+        moved = 0
+        ids = self.__list(self.migrating)
+        for start in range(0, len(ids), batch_size):
+            with lock:
+                for id in ids[start:start + batch_size]:
+                    old = "/".join((self.path,) + self.__name(id, self.migrating))
+                    new = "/".join((self.path,) + self.__name(id, self.layout))
+                    if not backend.exists(old):
+                        continue
+                    if backend.exists(new):
+                        # saved again since the migration started
+                        backend.remove(old)
+                        continue
+                    backend.makedirs(new.rpartition("/")[0])
+                    backend.replace(old, new)
+                    moved += 1
+
+        with lock:
+            self.migrating = None
+            write_meta(LAYOUT, {"layout": self.layout, "from": None}, self.database, self.collection)
+        return moved
+
+    """========================================MONODES FUNCTIONS========================================="""
+    def exists(self, id):
+        """
+        :return: whether the MoNode is stored
+        """
+        return self.__locate(id) is not None
+
+    def write(self, id, data, overwrite=False, check=True):
+        """
+        Store a pickled MoNode (bytes or a list of bytes chunks)
+        """
+        folder, name = self.__name(id, self.layout)
+        if self.migrating is not None and not overwrite and self.exists(id):
+            raise FileExistsError(f"File {id} already exists")
+        if self.layout == "sharded":
+            get_backend().makedirs(f"{self.path}/{folder}/{name.rpartition('/')[0]}")
+
+        base_write(name, data, self.database, self.collection, overwrite=overwrite, check=check, folder=folder)
+        with self.__dirty_lock:
+            self.__dirty.add((folder, name))
+        if is_time_id(id):
+            self.__journal(b"+", id)
+
+        # the old copy would hide nothing but would be moved over the new one
+        if self.migrating is not None:
+            old_folder, old_name = self.__name(id, self.migrating)
+            if get_backend().exists(f"{self.path}/{old_folder}/{old_name}"):
+                base_del(old_name, self.database, self.collection, folder=old_folder)
+
+    def read(self, id, check=True):
+        """
+        :return: the pickled MoNode
+        """
+        folder, name = self.__locate(id) or self.__name(id, self.layout)
+        return base_read(name, self.database, self.collection, check=check, folder=folder)
+
+    def open(self, id, check=True):
+        """
+        :return: FileReader to read parts of the pickled MoNode
+        """
+        folder, name = self.__locate(id) or self.__name(id, self.layout)
+        return FileReader(base_open(name, self.database, self.collection, check=check, folder=folder))
+
+    def delete(self, id):
+        """
+        Delete a MoNode
+        """
+        folder, name = self.__locate(id) or self.__name(id, self.layout)
+        base_del(name, self.database, self.collection, folder=folder)
+        with self.__dirty_lock:
+            self.__dirty.discard((folder, name))
+        if is_time_id(id):
+            self.__journal(b"-", id)
+
+    def list(self):
+        """
+        :return: list of the ids
+        """
+        if self.migrating is None:
+            return self.__list(self.layout)
+        return list(set(self.__list(self.layout)) | set(self.__list(self.migrating)))
+
+    def count(self):
+        """
+        :return: the number of MoNodes
+        """
+        return len(self.list())
+
+    def time_ids(self, lo=None, hi=None):
+        """
+        List the time ids between two bounds (see monode_id.py), found by bisecting the sorted time ids kept in memory
+        once the records appended to the journal since the last call are read
+        :param lo: the lowest id included (None for no bound)
+        :param hi: the id excluded (None for no bound)
+        :return: sorted list of ids
+        """
+        with self.__time_lock:
+            with base_lock_meta(TIME_IDS_LOCK, self.database, self.collection):
+                self.__follow()
+            start = 0 if lo is None else bisect.bisect_left(self.__time_ids, lo)
+            end = len(self.__time_ids) if hi is None else bisect.bisect_left(self.__time_ids, hi)
+            return self.__time_ids[start:end]
+
+    def compact(self):
+        """
+        Write the journal of the time ids again without the deleted ids (a deleted MoNode frees its file)
+        """
+        with base_lock_meta(TIME_IDS_LOCK, self.database, self.collection):
+            self.__rewrite()
+
+    """========================================TIME IDS FUNCTIONS========================================="""
+    def __journal(self, op, id):
+        """
+        append a record to the journal of the time ids (a single small append, the appends of the processes never
+        interleave)
+        """
+        base_append_meta(TIME_IDS, op + id.encode() + b"\n", self.database, self.collection)
+
+    def __follow(self):
+        """
+        read the records appended to the journal since the last call (hold the lock of the journal)
+        """
+        generation = read_meta(TIME_IDS_GENERATION, self.database, self.collection)
+        if generation is None:
+            generation = self.__rewrite()
+        if generation != self.__time_generation:
+            self.__time_ids, self.__time_generation, self.__time_offset = [], generation, 0
+
+        data = base_read_meta_from(TIME_IDS, self.__time_offset, self.database, self.collection) or b""
+        # a record being appended is read once it is whole
+        end = data.rfind(b"\n") + 1
+        for record in data[:end].splitlines():
+            id = record[1:].decode()
+            index = bisect.bisect_left(self.__time_ids, id)
+            found = index < len(self.__time_ids) and self.__time_ids[index] == id
+            # the new time ids are the highest, inserting them is an append
+            if record[:1] == b"+" and not found:
+                self.__time_ids.insert(index, id)
+            elif record[:1] == b"-" and found:
+                del self.__time_ids[index]
+        self.__time_offset += end
+
+    def __rewrite(self):
+        """
+        write the journal of the time ids again from the stored MoNodes (hold the lock of the journal)
+        :return: the new generation
+        """
+        listed = {id for id in self.list() if is_time_id(id)}
+        base_write_meta(TIME_IDS, b"".join(b"+" + id.encode() + b"\n" for id in sorted(listed)), self.database,
+                        self.collection)
+        # the MoNodes written or deleted while the folders were listed may be journaled in the replaced file
+        again = {id for id in self.list() if is_time_id(id)}
+        for id in sorted(again - listed):
+            self.__journal(b"+", id)
+        for id in listed - again:
+            self.__journal(b"-", id)
+
+        generation = os.urandom(8).hex()
+        write_meta(TIME_IDS_GENERATION, generation, self.database, self.collection)
+        return generation
+
+    def sync(self):
+        """
+        Flush the files written since the last sync and their folders to the disk
+        """
+        with self.__dirty_lock:
+            dirty = self.__dirty
+            self.__dirty = set()
+        for folder, name in dirty:
+            base_sync(name, self.database, self.collection, folder=folder)
+        for folder in {f"{folder}/{name}".rpartition("/")[0] for folder, name in dirty} | \
+                {LAYOUT_FOLDERS[self.layout]}:
+            base_sync_dir(self.database, self.collection, folder)
+
+    def close(self):
+        """
+        Nothing to close, the files are opened by every read and write
+        """
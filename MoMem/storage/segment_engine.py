@@ -0,0 +1,444 @@
+"""
+segment_engine.py
+Created on 2026-10-18 9:55:00 PM
+By: Will Selke
+
+This file contains the log-structured storage engine. The pickled MoNodes are appended to large segment files in
+<collection>/segments instead of getting a file each, so millions of small MoNodes cost a few files instead of millions
+of inodes and directory entries. A delete appends a tombstone, an overwrite appends the new version.
+
+The engine keeps the location (segment, offset, length) of every MoNode in memory, the map is saved as a checkpoint in
+the metadata of the collection every CHECKPOINT_EVERY writes and when the engine is closed, opening the engine loads
+the checkpoint and replays the records appended after it. A record torn by a crash (bad magic, short or bad crc) ends
+the replay of its segment and is cut off.
+
+The segments of a collection are written by one process at a time: the first engine opened holds the owner lock (a
+metadata file locked until the engine is closed) and is the only one appending, cutting off torn records and
+compacting. The engines of the other processes only read, they follow the records appended by the owner before every
+lookup (a record the owner is still appending looks torn, it is read once it is whole).
+
+The space of the overwritten and deleted MoNodes is given back by the compaction: a full segment holding more than
+COMPACT_RATIO of dead bytes has its live records copied to the end of the log and is then deleted. The compaction runs
+on a background thread started by the writes which leave a segment above the ratio, or by compact().
+"""
+import bisect
+import struct
+import threading
+import zlib
+
+import MoMem.config.config as cfg
+from MoMem.MoNode.monode_id import is_time_id
+from MoMem.DB_COL.collection_meta import read_meta, write_meta
+from MoMem.basic_file_op import base_ls_segments, base_append_segment, base_open_segment, base_truncate_segment, \
+    base_del_segment, base_pread, base_lock_meta
+
+# name of the metadata file of the checkpoint
+CHECKPOINT = "segments"
+
+# name of the metadata file locked by the process owning the segments
+OWNER_LOCK = "segments.lock"
+
+# magic, kind, id length, payload length, crc32 of the id and the payload
+RECORD = struct.Struct("<2sBHQI")
+MAGIC = b"sg"
+PUT = 1
+TOMBSTONE = 0
+
+# number of writes between two checkpoints
+CHECKPOINT_EVERY = 1024
+
+# part of dead bytes above which a full segment is compacted
+COMPACT_RATIO = 0.5
+
+
+class SegmentReader:
+    """
+    Positioned reads in a stored MoNode (see SegmentEngine.open)
+    """
+
+    def __init__(self, handle, offset, length):
+        """
+        :param handle: handle of the segment
+        :param offset: offset of the MoNode in the segment
+        :param length: length of the MoNode
+        """
+        self.handle = handle
+        self.offset = offset
+        self.length = length
+
+    def read_at(self, offset, length):
+        """
+        Read length bytes at offset of the MoNode
+        """
+        length = max(0, min(length, self.length - offset))
+        return base_pread(self.handle, length, self.offset + offset)
+
+    def close(self):
+        """
+        Close the segment
+        """
+        self.handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def _scan(handle, start):
+    """
+    read the records of a segment
+    :param handle: handle of the segment
+    :param start: offset of the first record
+    :return: generator of (offset of the record, kind, id, offset of the payload, payload length), ends at the end of the
+    segment or at the first torn record
+    """
+    size = handle.size()
+    position = start
+    while position + RECORD.size <= size:
+        magic, kind, id_length, length, crc = RECORD.unpack(base_pread(handle, RECORD.size, position))
+        end = position + RECORD.size + id_length + length
+        if magic != MAGIC or end > size:
+            return
+        body = base_pread(handle, id_length + length, position + RECORD.size)
+        if zlib.crc32(body) != crc:
+            return
+        yield position, kind, body[:id_length].decode(), position + RECORD.size + id_length, length
+        position = end
+
+
+class SegmentEngine:
+    """
+    # segment_size : The size above which a new segment is started
+    # readonly : Whether the engine only reads (asked for, or another process owns the segments), nothing is written or
+    cut off
+    """
+    TYPE = "segments"
+
+    def __init__(self, database, collection, readonly=False, segment_size=None):
+        """
+        Open the storage of a collection (USE engine.get_engine INSTEAD)
+
+        :param database: name of the database
+        :param collection: name of the collection
+        :param readonly: only read the log (for the worker processes), the engine is also read only if another process
+        owns the segments
+        :param segment_size: size above which a new segment is started (default config.SEGMENT_SIZE)
+        """
+        self.database = database
+        self.collection = collection
+        self.segment_size = segment_size or cfg.SEGMENT_SIZE
+        self.__lock = threading.RLock()
+        self.__file = None
+        self.__writes = 0
+        self.__compactor = None
+        self.__owner = None if readonly else base_lock_meta(OWNER_LOCK, database, collection, wait=False)
+        self.readonly = self.__owner is None
+        self.__load()
+
+    """========================================LOG FUNCTIONS========================================="""
+    def __load(self):
+        """
+        load the checkpoint and replay the records appended since
+        """
+        checkpoint = read_meta(CHECKPOINT, self.database, self.collection,
+                               {"map": {}, "sizes": {}, "garbage": {}, "active": 0})
+        # id -> (segment, offset of the payload, length of the payload)
+        self.__map = checkpoint["map"]
+        # segment -> size / dead bytes
+        self.__sizes = checkpoint["sizes"]
+        self.__garbage = checkpoint["garbage"]
+        self.__active = checkpoint["active"]
+        # the sorted time ids, built by the first time_ids call and then kept up to date by __apply
+        self.__time_ids = None
+        self.__replay()
+
+    def __refresh(self):
+        """
+        apply the records appended by the owner of the segments since the last lookup (only for the read only engines)
+        """
+        if not self.readonly:
+            return
+        with self.__lock:
+            segment = self.__active
+            while True:
+                try:
+                    handle = base_open_segment(segment, self.database, self.collection)
+                except FileNotFoundError:
+                    if segment == self.__active and segment in self.__sizes:
+                        # compacted by the owner since, the map is loaded again
+                        self.__load()
+                    return
+                with handle:
+                    for position, kind, id, offset, length in _scan(handle, self.__sizes.get(segment, 0)):
+                        self.__apply(segment, kind, id, offset, length)
+                self.__sizes.setdefault(segment, 0)
+                self.__active = segment
+                segment += 1
+
+    def __replay(self):
+        """
+        apply the records appended since the checkpoint
+        """
+        for segment in base_ls_segments(self.database, self.collection):
+            if segment < self.__active:
+                # left by a compaction stopped between its checkpoint and the deletion of the segment
+                if segment not in self.__sizes and not self.readonly:
+                    base_del_segment(segment, self.database, self.collection)
+                continue
+            with base_open_segment(segment, self.database, self.collection) as handle:
+                end = self.__sizes.get(segment, 0)
+                for position, kind, id, offset, length in _scan(handle, end):
+                    self.__apply(segment, kind, id, offset, length)
+                    end = offset + length
+                if not self.readonly and end < handle.size():
+                    base_truncate_segment(segment, end, self.database, self.collection)
+            self.__sizes[segment] = end
+            self.__active = segment
+
+    def __apply(self, segment, kind, id, offset, length):
+        """
+        update the map with a record
+        """
+        size = RECORD.size + len(id.encode()) + length
+        self.__sizes[segment] = offset + length
+        old = self.__map.pop(id, None)
+        if old is not None:
+            self.__garbage[old[0]] = self.__garbage.get(old[0], 0) + self.__record_size(id, old)
+        if kind == PUT:
+            self.__map[id] = (segment, offset, length)
+        else:
+            self.__garbage[segment] = self.__garbage.get(segment, 0) + size
+
+        if self.__time_ids is not None and (old is None) == (kind == PUT) and is_time_id(id):
+            # the new time ids are the highest, inserting them is an append
+            if kind == PUT:
+                bisect.insort(self.__time_ids, id)
+            else:
+                del self.__time_ids[bisect.bisect_left(self.__time_ids, id)]
+
+    @staticmethod
+    def __record_size(id, location):
+        """
+        size of the record of a location
+        """
+        return RECORD.size + len(id.encode()) + location[2]
+
+    def __append(self, kind, id, chunks):
+        """
+        append a record to the active segment (hold the lock)
+        :return: (segment, offset of the payload, length of the payload)
+        """
+        if self.readonly:
+            raise PermissionError("The storage engine is read only (or another process owns the segments)")
+
+        if self.__sizes.get(self.__active, 0) >= self.segment_size:
+            if self.__file is not None:
+                # a full segment is flushed once, sync() only flushes the active one
+                self.__file.sync()
+                self.__file.close()
+                self.__file = None
+            self.__active += 1
+        if self.__file is None:
+            self.__file = base_append_segment(self.__active, self.database, self.collection)
+            self.__sizes[self.__active] = self.__file.size()
+
+        encoded = id.encode()
+        length = sum(len(chunk) for chunk in chunks)
+        crc = zlib.crc32(encoded)
+        for chunk in chunks:
+            crc = zlib.crc32(chunk, crc)
+
+        position = self.__sizes[self.__active]
+        # the payload is not copied into the record, a reader sees the record once it is whole (see _scan)
+        self.__file.append(RECORD.pack(MAGIC, kind, len(encoded), length, crc) + encoded)
+        for chunk in chunks:
+            self.__file.append(chunk)
+
+        offset = position + RECORD.size + len(encoded)
+        self.__apply(self.__active, kind, id, offset, length)
+
+        self.__writes += 1
+        if self.__writes >= CHECKPOINT_EVERY:
+            self.checkpoint()
+        return self.__active, offset, length
+
+    def checkpoint(self):
+        """
+        Save the map of the MoNodes so the next opening only replays the records appended after it
+        """
+        if self.readonly:
+            return
+        with self.__lock:
+            write_meta(CHECKPOINT, {"map": self.__map, "sizes": self.__sizes, "garbage": self.__garbage,
+                                    "active": self.__active}, self.database, self.collection)
+            self.__writes = 0
+
+    def sync(self):
+        """
+        Flush the active segment to the disk and write a checkpoint
+        """
+        if self.readonly:
+            return
+        with self.__lock:
+            if self.__file is not None:
+                self.__file.sync()
+            self.checkpoint()
+
+    def close(self):
+        """
+        Write a checkpoint, close the active segment and give up the ownership of the segments
+        """
+        with self.__lock:
+            self.checkpoint()
+            if self.__file is not None:
+                self.__file.close()
+                self.__file = None
+            if self.__owner is not None:
+                self.__owner.close()
+                self.__owner = None
+
+    """========================================MONODES FUNCTIONS========================================="""
+    def exists(self, id):
+        """
+        :return: whether the MoNode is stored
+        """
+        self.__refresh()
+        return id in self.__map
+
+    def write(self, id, data, overwrite=False, check=True):
+        """
+        Store a pickled MoNode (bytes or a list of bytes chunks)
+        """
+        chunks = [data] if isinstance(data, (bytes, bytearray, memoryview)) else list(data)
+        with self.__lock:
+            if not overwrite and id in self.__map:
+                raise FileExistsError(f"File {id} already exists")
+            old = self.__map.get(id)
+            self.__append(PUT, id, chunks)
+        if old is not None:
+            self.__maybe_compact()
+
+    def read(self, id, check=True):
+        """
+        :return: the pickled MoNode
+        """
+        with self.open(id, check) as reader:
+            return reader.read_at(0, reader.length)
+
+    def open(self, id, check=True):
+        """
+        :return: SegmentReader to read parts of the pickled MoNode
+        """
+        self.__refresh()
+        # the segment cannot be compacted away between the lookup and the opening (by this process)
+        with self.__lock:
+            location = self.__map.get(id)
+            if location is None:
+                raise FileNotFoundError(f"File {id} does not exist")
+            try:
+                return SegmentReader(base_open_segment(location[0], self.database, self.collection), *location[1:])
+            except FileNotFoundError:
+                if not self.readonly:
+                    raise
+            # compacted by the owner since the last lookup
+            self.__load()
+            location = self.__map.get(id)
+            if location is None:
+                raise FileNotFoundError(f"File {id} does not exist")
+            return SegmentReader(base_open_segment(location[0], self.database, self.collection), *location[1:])
+
+    def delete(self, id):
+        """
+        Delete a MoNode
+        """
+        with self.__lock:
+            if id not in self.__map:
+                raise FileNotFoundError(f"File {id} does not exist")
+            self.__append(TOMBSTONE, id, [])
+        self.__maybe_compact()
+
+    def list(self):
+        """
+        :return: list of the ids
+        """
+        self.__refresh()
+        with self.__lock:
+            return list(self.__map)
+
+    def count(self):
+        """
+        :return: the number of MoNodes
+        """
+        self.__refresh()
+        return len(self.__map)
+
+    def time_ids(self, lo=None, hi=None):
+        """
+        List the time ids between two bounds (see monode_id.py), found by bisecting the sorted time ids kept in memory
+        :param lo: the lowest id included (None for no bound)
+        :param hi: the id excluded (None for no bound)
+        :return: sorted list of ids
+        """
+        self.__refresh()
+        with self.__lock:
+            if self.__time_ids is None:
+                self.__time_ids = sorted(id for id in self.__map if is_time_id(id))
+            start = 0 if lo is None else bisect.bisect_left(self.__time_ids, lo)
+            end = len(self.__time_ids) if hi is None else bisect.bisect_left(self.__time_ids, hi)
+            return self.__time_ids[start:end]
+
+    """========================================COMPACTION FUNCTIONS========================================="""
+    def __candidates(self, ratio):
+        """
+        the full segments with more than ratio of dead bytes
+        """
+        with self.__lock:
+            return [segment for segment, size in sorted(self.__sizes.items())
+                    if segment != self.__active and size and self.__garbage.get(segment, 0) / size >= ratio]
+
+    def __maybe_compact(self):
+        """
+        start the background compaction if a segment needs it
+        """
+        if self.readonly or not self.__candidates(COMPACT_RATIO):
+            return
+        with self.__lock:
+            if self.__compactor is None or not self.__compactor.is_alive():
+                self.__compactor = threading.Thread(target=self.compact, name=f"MoMem-compact-{self.collection}",
+                                                    daemon=True)
+                self.__compactor.start()
+
+    def compact(self, ratio=COMPACT_RATIO):
+        """
+        Copy the live records of the full segments with more than ratio of dead bytes to the end of the log and delete
+        the segments
+        :param ratio: part of dead bytes above which a segment is compacted (0 to compact every full segment)
+        :return: the number of deleted segments
+        """
+        if self.readonly:
+            return 0
+
+        done = 0
+        for segment in self.__candidates(ratio):
+            with base_open_segment(segment, self.database, self.collection) as handle:
+                for position, kind, id, offset, length in _scan(handle, 0):
+                    with self.__lock:
+                        if kind == PUT and self.__map.get(id) == (segment, offset, length):
+                            self.__append(PUT, id, [base_pread(handle, length, offset)])
+                        # a tombstone is kept while an older segment may still hold a version of the MoNode
+                        elif kind == TOMBSTONE and id not in self.__map and min(self.__sizes) < segment:
+                            self.__append(TOMBSTONE, id, [])
+
+            with self.__lock:
+                del self.__sizes[segment]
+                self.__garbage.pop(segment, None)
+                # the copies must be on the disk and the checkpoint must not point to the segment anymore before it is
+                # deleted
+                if self.__file is not None:
+                    self.__file.sync()
+                self.checkpoint()
+                base_del_segment(segment, self.database, self.collection)
+            done += 1
+        return done
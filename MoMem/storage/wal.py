@@ -0,0 +1,386 @@
+"""
+wal.py
+Created on 2026-10-18 10:40:00 PM
+By: Will Selke
+
+This file contains the write-ahead log of a database. Every save and delete of a MoNode is appended to the log (a single
+file per database, <database>/.wal) before the storage engine of its collection is touched, so a crash in the middle of
+a write is repaired by replaying the log when the database is opened again (see Database.get_database).
+
+The durability modes:
+    "none" : nothing is logged, a crash can leave a torn MoNode (the default)
+    "batched" : the log is flushed to the disk (fsync) every WAL_INTERVAL seconds by a background thread, a crash of the
+    process loses nothing, a power loss may lose the writes of the last interval
+    "strict" : a write returns once its record is on the disk
+A logged write is written twice, the whole pickled MoNode goes to the log and then to its storage engine, so "batched"
+and "strict" double the bytes written by the saves (the log is what repairs a torn MoNode, it cannot hold less). They
+are for the databases where a torn MoNode costs more than the write bandwidth.
+The fsync is shared by every write waiting for it (group commit): the first writer flushes the log for all the records
+appended so far, the others just wait for it, so concurrent writers pay one fsync per group instead of one each.
+
+When the log gets bigger than WAL_SIZE the storage engines written since the last checkpoint are flushed to the disk and
+the log is emptied. Closing the log (Database.close, or the exit of the process) empties it too and leaves a clean
+shutdown marker, so the next run only replays the log after a crash.
+
+The log of a database is shared by the processes writing it. An append holds the lock of a second file
+(<database>/.wal.lock) so the records of two processes never interleave, and a process holds a shared lock of the log
+from its first append to the next checkpoint, while the log has records of the process not yet flushed by their storage
+engines. The log is emptied by a checkpoint only when no other process holds it, and replayed only by a process opening
+it when no other process holds it (the others wait for the end of the replay to append). The lock file also holds one
+byte per process holding the log: the byte of a process which crashed is left, so its records are not emptied before the
+next opening replays them. Windows has no shared locks, there the processes take turns.
+"""
+import atexit
+import struct
+import threading
+import time
+import zlib
+
+import MoMem.config.config as cfg
+from MoMem.basic_file_op import base_open_wal, base_pread
+from MoMem.storage.backend import get_backend
+from MoMem.storage.engine import get_engine
+
+DURABILITY_MODES = ("none", "batched", "strict")
+
+# magic, operation, collection length, id length, payload length, crc32 of the collection, id and payload
+RECORD = struct.Struct("<2sBHHQI")
+MAGIC = b"wl"
+PUT = 1
+DELETE = 0
+CLEAN = 2
+
+# the record left alone in the log by a clean shutdown
+CLEAN_RECORD = RECORD.pack(MAGIC, CLEAN, 0, 0, 0, 0)
+
+# the size of the blocks read to find the record after a torn one
+SEARCH_BLOCK = 64 * 1024
+
+# the opened logs by database
+_logs = {}
+_logs_lock = threading.Lock()
+
+
+def check_mode(mode):
+    """
+    Check a durability mode
+    :param mode: the durability mode
+    """
+    if mode not in DURABILITY_MODES:
+        raise ValueError(f"Unknown durability mode {mode}, expected one of {DURABILITY_MODES}")
+
+
+def get_wal(database):
+    """
+    Get the log of a database, opened on the first call of the process
+    :param database: name of the database
+    :return: WriteAheadLog
+    """
+    with _logs_lock:
+        if database not in _logs:
+            _logs[database] = WriteAheadLog(database)
+        return _logs[database]
+
+
+def close_wal(database):
+    """
+    Close the log of a database opened by the process (before deleting the database)
+    :param database: name of the database
+    """
+    with _logs_lock:
+        log = _logs.pop(database, None)
+    if log is not None:
+        log.close()
+
+
+def close_all():
+    """
+    Close every log opened by the process (registered to run at exit)
+    """
+    with _logs_lock:
+        logs = list(_logs.values())
+        _logs.clear()
+    for log in logs:
+        try:
+            log.close()
+        except OSError:
+            # the database was deleted meanwhile
+            pass
+
+
+atexit.register(close_all)
+
+
+class WriteAheadLog:
+    """
+    # mode : The durability mode (see DURABILITY_MODES)
+    # recovered : Whether the records left by the last run were replayed (see records / checkpoint)
+    """
+
+    def __init__(self, database, mode=None):
+        """
+        Open the log of a database (USE get_wal INSTEAD)
+
+        :param database: name of the database
+        :param mode: the durability mode (default config.DURABILITY)
+        """
+        self.database = database
+        self.mode = mode or cfg.DURABILITY
+        check_mode(self.mode)
+
+        self.__handle = base_open_wal(database)
+        self.__appends = base_open_wal(database, lock=True)
+        # whether the process holds the log (see the header)
+        self.__holding = False
+        # the positions in the log only grow, the file holds the records from start to end
+        self.__end = self.__handle.size()
+        self.__start = 0
+        # an empty log or a clean shutdown marker has nothing to replay, the log held by another process is not ours to
+        # replay, a log to replay stays locked until the checkpoint ending the replay
+        alone = self.__handle.lock()
+        self.recovered = not alone or self.__end == 0 or (
+            self.__end == RECORD.size and base_pread(self.__handle, RECORD.size, 0) == CLEAN_RECORD)
+        if alone and self.recovered:
+            self.__handle.unlock()
+
+        self.__lock = threading.Condition()
+        # number of records appended but not yet applied to their storage engine
+        self.__pending = 0
+        self.__checkpointing = False
+        # the collections written since the last checkpoint
+        self.__dirty = set()
+
+        self.__synced = self.__end
+        self.__syncing = False
+        self.__sync_lock = threading.Condition()
+        self.__flusher = None
+
+    """========================================WRITE FUNCTIONS========================================="""
+    def append(self, op, collection, id, chunks=()):
+        """
+        Append a record, the write must then be applied and done() called
+        :param op: PUT or DELETE
+        :param collection: name of the collection
+        :param id: id of the MoNode
+        :param chunks: list of bytes chunks of the pickled MoNode (for PUT)
+        :return: the position of the end of the record (see commit)
+        """
+        body = [collection.encode() + id.encode()] + list(chunks)
+        crc = 0
+        for chunk in body:
+            crc = zlib.crc32(chunk, crc)
+        length = sum(len(chunk) for chunk in body[1:])
+        header = RECORD.pack(MAGIC, op, len(collection.encode()), len(id.encode()), length, crc)
+
+        with self.__lock:
+            while self.__checkpointing:
+                self.__lock.wait()
+            if not self.__holding:
+                self.__hold()
+            # the chunks are appended one after the other so the payload is never copied into one record, a record
+            # torn by a crash is skipped by records
+            self.__appends.lock(wait=True)
+            try:
+                self.__handle.append(header)
+                for chunk in body:
+                    self.__handle.append(chunk)
+            finally:
+                self.__appends.unlock()
+            self.__end += len(header) + len(body[0]) + length
+            self.__pending += 1
+            self.__dirty.add(collection)
+            end = self.__end
+
+        if self.mode == "batched" and self.__flusher is None:
+            self.__start_flusher()
+        return end
+
+    def commit(self, end):
+        """
+        Wait for the log to be on the disk up to end, one fsync is shared by all the waiting writers
+        :param end: position returned by append
+        """
+        with self.__sync_lock:
+            while self.__synced < end:
+                if self.__syncing:
+                    self.__sync_lock.wait()
+                    continue
+
+                # this writer flushes the records of every writer
+                self.__syncing = True
+                target = self.__end
+                self.__sync_lock.release()
+                try:
+                    self.__handle.sync()
+                finally:
+                    self.__sync_lock.acquire()
+                    self.__syncing = False
+                    self.__sync_lock.notify_all()
+                self.__synced = max(self.__synced, target)
+
+    def done(self):
+        """
+        Tell the log a write was applied to its storage engine (or failed), empties the log when it is too big
+        """
+        with self.__lock:
+            self.__pending -= 1
+            self.__lock.notify_all()
+            full = self.__end - self.__start >= cfg.WAL_SIZE and not self.__checkpointing
+        if full:
+            self.checkpoint()
+
+    def __start_flusher(self):
+        """
+        start the thread flushing the log every WAL_INTERVAL seconds (batched mode)
+        """
+        with self.__lock:
+            if self.__flusher is not None:
+                return
+            self.__flusher = threading.Thread(target=self.__flush, name=f"MoMem-wal-{self.database}", daemon=True)
+            self.__flusher.start()
+
+    def __flush(self):
+        """
+        body of the flushing thread
+        """
+        while self.__handle is not None:
+            time.sleep(cfg.WAL_INTERVAL)
+            try:
+                if self.mode != "none" and self.__synced < self.__end:
+                    self.commit(self.__end)
+            except (OSError, AttributeError):
+                # closed meanwhile
+                return
+
+    def __hold(self):
+        """
+        hold the log until the next checkpoint, its records cannot be emptied meanwhile (hold the lock)
+        """
+        if not self.__handle.lock(wait=True, shared=True):
+            raise OSError(f"The write-ahead log of {self.database} is locked by another process")
+        self.__appends.lock(wait=True)
+        try:
+            self.__appends.append(b"\0")
+        finally:
+            self.__appends.unlock()
+        self.__holding = True
+
+    def __release(self):
+        """
+        stop holding the log, once its records are flushed by their storage engines (hold the lock)
+        """
+        if not self.__holding:
+            return
+        self.__appends.lock(wait=True)
+        try:
+            self.__appends.truncate(self.__appends.size() - 1)
+        finally:
+            self.__appends.unlock()
+        self.__handle.unlock()
+        self.__holding = False
+
+    def __empty(self):
+        """
+        empty the log if no other process holds it (hold the lock)
+        """
+        # the log replayed by the recovery is still locked
+        if self.recovered and not self.__handle.lock():
+            return
+        try:
+            # a byte left by a process which crashed, its records are replayed by the next opening
+            if self.recovered and self.__appends.size():
+                return
+            self.__handle.truncate(0)
+            self.__handle.sync()
+            self.__appends.truncate(0)
+        finally:
+            self.__handle.unlock()
+
+    def checkpoint(self, collections=()):
+        """
+        Flush the storage engines written since the last checkpoint to the disk and empty the log (if no other process
+        holds it)
+        :param collections: other collections to flush (the ones written by the recovery)
+        """
+        with self.__lock:
+            if self.__checkpointing:
+                return
+            self.__checkpointing = True
+            try:
+                # the writes being applied must reach their storage engine first
+                while self.__pending:
+                    self.__lock.wait()
+
+                for collection in self.__dirty | set(collections):
+                    if get_backend().exists(f"{self.database}/{collection}"):
+                        get_engine(self.database, collection).sync()
+                self.__release()
+                self.__empty()
+                self.__dirty.clear()
+                with self.__sync_lock:
+                    self.__start = self.__end
+                    self.__synced = self.__end
+                self.recovered = True
+            finally:
+                self.__checkpointing = False
+                self.__lock.notify_all()
+
+    def close(self):
+        """
+        Empty the log, leave the clean shutdown marker and close it (if no other process holds the log)
+        """
+        if self.__handle is not None:
+            self.checkpoint()
+        with self.__lock:
+            handle, self.__handle = self.__handle, None
+        if handle is None:
+            return
+        try:
+            if handle.lock() and handle.size() == 0:
+                handle.append(CLEAN_RECORD)
+                handle.sync()
+        finally:
+            handle.close()
+            self.__appends.close()
+
+    """========================================RECOVERY FUNCTIONS========================================="""
+    def records(self):
+        """
+        Read the records left in the log by the last run (a record torn by a crash is skipped, the records of the other
+        processes may follow it)
+        :return: list of (op, collection, id, payload) in the order of the log
+        """
+        output = []
+        size = self.__handle.size()
+        position = 0
+        while position + RECORD.size <= size:
+            magic, op, collection_length, id_length, length, crc = RECORD.unpack(
+                base_pread(self.__handle, RECORD.size, position))
+            end = position + RECORD.size + collection_length + id_length + length
+            body = base_pread(self.__handle, end - position - RECORD.size, position + RECORD.size) \
+                if magic == MAGIC and end <= size else None
+            if body is None or zlib.crc32(body) != crc:
+                # the next record starts after the torn one, at a magic
+                position = self.__next_magic(position + 1, size)
+                continue
+            position = end
+            if op == CLEAN:
+                continue
+            collection = body[:collection_length].decode()
+            id = body[collection_length:collection_length + id_length].decode()
+            output.append((op, collection, id, body[collection_length + id_length:]))
+        return output
+
+    def __next_magic(self, position, size):
+        """
+        find the next magic of a record in the log
+        :return: its position (size if there is none)
+        """
+        while position < size:
+            block = base_pread(self.__handle, min(SEARCH_BLOCK, size - position), position)
+            found = block.find(MAGIC)
+            if found >= 0:
+                return position + found
+            # a magic may start at the last byte of the block
+            position += max(len(block) - len(MAGIC) + 1, 1)
+        return size
@@ -0,0 +1,85 @@
+"""
+test_async.py
+Created on 2026-10-19 6:00:00 AM
+By: Will Selke
+
+This file contains the tests of the asyncio front end (see async_database.py and async_collection.py): the monodes are
+decoded on the decode executor and come back like Collection.get_monode returns them.
+"""
+import asyncio
+import shutil
+import tempfile
+import unittest
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import MoMem.config.config as cfg
+from MoMem.DB_COL.async_database import AsyncDatabase
+from MoMem.MoNode.monode_basic import file_to_monode
+from MoMem.storage import wal
+
+
+class CountingExecutor(ThreadPoolExecutor):
+    """
+    thread pool counting the functions it runs
+    """
+    def __init__(self):
+        super().__init__(1)
+        self.functions = []
+
+    def submit(self, function, *args, **kwargs):
+        self.functions.append(function)
+        return super().submit(function, *args, **kwargs)
+
+
+class TestAsync(unittest.TestCase):
+    def setUp(self):
+        self.root_dir = cfg.ROOT_DIR
+        cfg.ROOT_DIR = tempfile.mkdtemp()
+        # every test has its own database as the engines and caches are kept per process
+        self.name = f"db_{uuid.uuid4().hex}"
+
+    def tearDown(self):
+        wal.close_wal(self.name)
+        shutil.rmtree(cfg.ROOT_DIR, ignore_errors=True)
+        cfg.ROOT_DIR = self.root_dir
+
+    async def save_and_get(self, decode_executor):
+        """
+        save a plain and a deduplicated monode and read them back
+        :return: [(saved monode, monode read)], the monode read with only some fields
+        """
+        async with await AsyncDatabase.create_database(self.name, decode_executor=decode_executor) as database:
+            collection = await database.create_collection("c")
+            plain = file_to_monode("plain.txt", b"plain data", note={"color": "orange"})
+            plain_id = await collection.save_monode(plain)
+            dedup = await database.create_collection("d", dedup=True)
+            shared = file_to_monode("shared.txt", b"shared data " * 1000)
+            shared_id = await dedup.save_monode(shared)
+
+            pairs = [(plain, await collection.get_monode(plain_id)), (shared, await dedup.get_monode(shared_id))]
+            return pairs, await collection.get_monode(plain_id, fields=["notes.color"])
+
+    def check(self, pairs, fields):
+        for saved, read in pairs:
+            self.assertEqual((read.name, read.data, read.notes), (saved.name, saved.data, saved.notes))
+        self.assertEqual(fields, {"notes": {"color": "orange"}})
+
+    def test_decode_executor(self):
+        executor = CountingExecutor()
+        try:
+            pairs, fields = asyncio.run(self.save_and_get(executor))
+        finally:
+            executor.shutdown()
+        self.check(pairs, fields)
+        # only the two whole monodes are decoded there
+        self.assertEqual(len(executor.functions), 2)
+
+    def test_process_pool(self):
+        with ProcessPoolExecutor(1) as executor:
+            pairs, fields = asyncio.run(self.save_and_get(executor))
+        self.check(pairs, fields)
+
+
+if __name__ == "__main__":
+    unittest.main()
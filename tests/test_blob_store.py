@@ -0,0 +1,93 @@
+"""
+test_blob_store.py
+Created on 2026-10-19 5:05:00 AM
+By: Will Selke
+
+This file contains the tests of the blob store (see blob_store.py): the reference counts are shared by the processes,
+and the recovery counts them again after a crash between a write and its count.
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+import uuid
+
+import MoMem.config.config as cfg
+from MoMem.DB_COL.database import Database
+from MoMem.MoNode.monode_basic import file_to_monode
+from MoMem.basic_file_op import base_lock_blobs
+from MoMem.storage import wal
+
+# the repository, so the child process imports this MoMem
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the data of the monodes, shared through the blob store
+DATA = b"shared data " * 1000
+
+# deletes the monode argv[3] and crashes before its blob is released
+DELETE = """
+import os, sys
+import MoMem.config.config as cfg
+cfg.ROOT_DIR = sys.argv[1]
+from MoMem.DB_COL.database import Database
+from MoMem.storage.blob_store import BlobStore
+database = Database.get_database(sys.argv[2])
+database.set_durability("strict")
+BlobStore.release = lambda self, ref: os._exit(0)
+database.get_collection("c").del_monode(sys.argv[3])
+"""
+
+# saves a monode holding DATA
+SAVE = """
+import sys
+import MoMem.config.config as cfg
+cfg.ROOT_DIR = sys.argv[1]
+from MoMem.DB_COL.database import Database
+from MoMem.MoNode.monode_basic import file_to_monode
+Database.get_database(sys.argv[2]).get_collection("c").save_monode(file_to_monode("child.txt", b"shared data " * 1000))
+"""
+
+
+class TestBlobStore(unittest.TestCase):
+    def setUp(self):
+        self.root_dir = cfg.ROOT_DIR
+        cfg.ROOT_DIR = tempfile.mkdtemp()
+        # every test has its own database as the logs are kept per process
+        self.name = f"db_{uuid.uuid4().hex}"
+        self.collection = Database.create_database(self.name).create_collection("c", dedup=True)
+
+    def tearDown(self):
+        wal.close_wal(self.name)
+        shutil.rmtree(cfg.ROOT_DIR, ignore_errors=True)
+        cfg.ROOT_DIR = self.root_dir
+
+    def test_recovery_counts_the_references(self):
+        ids = [self.collection.save_monode(file_to_monode(f"file{i}.txt", DATA)) for i in range(2)]
+        self.assertEqual(self.collection.dedup_stats()["references"], 2)
+        wal.close_wal(self.name)
+
+        subprocess.run([sys.executable, "-c", DELETE, cfg.ROOT_DIR, self.name, ids[0]], cwd=REPO, check=True)
+        collection = Database.get_database(self.name).get_collection("c")
+        self.assertEqual(collection.ls_documents(), ids[1:])
+        self.assertEqual(collection.dedup_stats()["references"], 1)
+
+        # the last reference deletes the blob
+        collection.del_monode(ids[1])
+        self.assertEqual(collection.dedup_stats()["blobs"], 0)
+
+    def test_counts_locked_against_other_processes(self):
+        self.collection.save_monode(file_to_monode("file.txt", DATA))
+        with base_lock_blobs(self.name):
+            child = subprocess.Popen([sys.executable, "-c", SAVE, cfg.ROOT_DIR, self.name], cwd=REPO)
+            time.sleep(0.5)
+            # the child waits for the lock to count its reference
+            self.assertIsNone(child.poll())
+        self.assertEqual(child.wait(), 0)
+        self.assertEqual(self.collection.dedup_stats()["references"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
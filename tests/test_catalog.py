@@ -0,0 +1,69 @@
+"""
+test_catalog.py
+Created on 2026-10-19 5:50:00 AM
+By: Will Selke
+
+This file contains the tests of the catalog (see catalog.py): a slot freed and reused by another process must not be
+freed again from the slots this process read before.
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+import uuid
+
+import MoMem.config.config as cfg
+from MoMem.DB_COL import catalog
+from MoMem.DB_COL.database import Database
+from MoMem.storage import wal
+
+# the repository, so the child process imports this MoMem
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the fields of every record
+FIELDS = {"name": "file.txt", "type": "text", "size": 1, "modi": None, "tags": []}
+
+# removes the record of the id argv[3] and adds the record of argv[4] in the freed slot
+REUSE = """
+import sys
+import MoMem.config.config as cfg
+cfg.ROOT_DIR = sys.argv[1]
+from MoMem.DB_COL import catalog
+records = catalog.Catalog(sys.argv[2], "c")
+records.remove(sys.argv[3])
+records.add(sys.argv[4], catalog.pack(sys.argv[4], {"name": "file.txt", "type": "text", "size": 1, "modi": None,
+                                                   "tags": []}))
+"""
+
+
+class TestCatalog(unittest.TestCase):
+    def setUp(self):
+        self.root_dir = cfg.ROOT_DIR
+        cfg.ROOT_DIR = tempfile.mkdtemp()
+        # every test has its own database as the catalog slots are kept per process
+        self.name = f"db_{uuid.uuid4().hex}"
+        Database.create_database(self.name).create_collection("c")
+
+    def tearDown(self):
+        wal.close_wal(self.name)
+        shutil.rmtree(cfg.ROOT_DIR, ignore_errors=True)
+        cfg.ROOT_DIR = self.root_dir
+
+    def test_remove_slot_reused_by_another_process(self):
+        records = catalog.Catalog(self.name, "c")
+        records.add("a", catalog.pack("a", FIELDS))
+        self.assertEqual([record["id"] for record in records.list()], ["a"])
+
+        subprocess.run([sys.executable, "-c", REUSE, cfg.ROOT_DIR, self.name, "a", "b"], cwd=REPO, check=True)
+        # the slots of this process still give the slot of "a", which now holds "b"
+        records.remove("a")
+        self.assertEqual([record["id"] for record in records.list()], ["b"])
+
+        records.add("c", catalog.pack("c", FIELDS))
+        self.assertEqual(sorted(record["id"] for record in records.list()), ["b", "c"])
+
+
+if __name__ == "__main__":
+    unittest.main()
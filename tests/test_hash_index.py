@@ -0,0 +1,68 @@
+"""
+test_hash_index.py
+Created on 2026-10-19 5:20:00 AM
+By: Will Selke
+
+This file contains the tests of the hash index (see hash_index.py): the values equal for the queries share a key, and
+the fields are named the same way by the indexes and by the queries.
+"""
+import shutil
+import tempfile
+import unittest
+import uuid
+
+import MoMem.config.config as cfg
+from MoMem.DB_COL.database import Database
+from MoMem.MoNode.monode_basic import file_to_monode
+from MoMem.index.hash_index import normal_key
+from MoMem.index.index import normalize_field
+from MoMem.storage import wal
+
+
+class TestNormalKey(unittest.TestCase):
+    def test_equal_values_share_a_key(self):
+        self.assertEqual(normal_key(1), normal_key(1.0))
+        self.assertEqual(normal_key(True), normal_key(1))
+        self.assertEqual(normal_key({"a": 1, "b": [2.0]}), normal_key({"b": [2], "a": 1}))
+        self.assertNotEqual(normal_key(1), normal_key("1"))
+        self.assertNotEqual(normal_key(1.5), normal_key(1))
+
+    def test_normalize_field(self):
+        for field in ("name", "type", "size", "modi", "desc", "tags", "notes.desc"):
+            self.assertEqual(normalize_field(field), field)
+        self.assertEqual(normalize_field("color"), "notes.color")
+
+
+class TestHashIndex(unittest.TestCase):
+    def setUp(self):
+        self.root_dir = cfg.ROOT_DIR
+        cfg.ROOT_DIR = tempfile.mkdtemp()
+        # every test has its own database as the engines and caches are kept per process
+        self.name = f"db_{uuid.uuid4().hex}"
+        self.collection = Database.create_database(self.name).create_collection("c")
+        self.ids = [self.collection.save_monode(file_to_monode(f"file{i}.txt", b"data", f"desc {i % 2}",
+                                                               note={"n": i % 3, "desc": "note"}))
+                    for i in range(6)]
+
+    def tearDown(self):
+        wal.close_wal(self.name)
+        shutil.rmtree(cfg.ROOT_DIR, ignore_errors=True)
+        cfg.ROOT_DIR = self.root_dir
+
+    def test_desc(self):
+        self.collection.create_index("desc")
+        self.assertIn("desc", self.collection.ls_indexes())
+        self.assertEqual(self.collection.explain({"desc": "desc 1"})["plan"], "hash")
+        self.assertEqual(self.collection.find_by("desc", "desc 1"), sorted(self.ids[1::2]))
+        self.assertEqual(sorted(doc["id"] for doc in self.collection.find({"desc": "desc 1"}, ["name"])),
+                         sorted(self.ids[1::2]))
+
+    def test_equal_numbers(self):
+        self.collection.create_index("n")
+        self.assertEqual(self.collection.find_by("n", 1.0), sorted(self.ids[1::3]))
+        self.assertEqual(sorted(doc["id"] for doc in self.collection.find({"n": True}, ["name"])),
+                         sorted(self.ids[1::3]))
+
+
+if __name__ == "__main__":
+    unittest.main()
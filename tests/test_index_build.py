@@ -0,0 +1,69 @@
+"""
+test_index_build.py
+Created on 2026-10-19 6:10:00 AM
+By: Will Selke
+
+This file contains the tests of the index builds (see index_build.py): a small collection is read without a process
+pool, and an index built again is only used by the queries once it is written.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+import uuid
+from unittest import mock
+
+import MoMem.config.config as cfg
+from MoMem.DB_COL.database import Database
+from MoMem.MoNode.monode_basic import file_to_monode
+from MoMem.basic_file_op import base_ls_meta
+from MoMem.index import index_build
+from MoMem.index.hash_index import HashIndex
+from MoMem.storage import wal
+
+
+class TestIndexBuild(unittest.TestCase):
+    def setUp(self):
+        self.root_dir = cfg.ROOT_DIR
+        cfg.ROOT_DIR = tempfile.mkdtemp()
+        # every test has its own database as the engines and caches are kept per process
+        self.name = f"db_{uuid.uuid4().hex}"
+        self.collection = Database.create_database(self.name).create_collection("c")
+        self.ids = sorted(self.collection.save_monode(file_to_monode(f"file{i}.txt", b"data", note={"color": "orange"}))
+                          for i in range(5))
+
+    def tearDown(self):
+        wal.close_wal(self.name)
+        shutil.rmtree(cfg.ROOT_DIR, ignore_errors=True)
+        cfg.ROOT_DIR = self.root_dir
+
+    def test_pool_threshold(self):
+        self.assertEqual(self.collection.create_index("color").workers, 0)
+        with mock.patch.object(index_build, "POOL_MIN_DOCUMENTS", len(self.ids)):
+            self.assertEqual(self.collection.create_index("color").workers, os.cpu_count())
+        self.assertEqual(self.collection.find_by("color", "orange"), self.ids)
+
+    def test_rebuild_keeps_the_old_index(self):
+        self.collection.create_index("color", workers=0)
+        seen = []
+        drop = HashIndex.drop
+
+        def drop_and_query(index):
+            # the new index is cleared before it is written, the queries must still use the old one
+            drop(index)
+            seen.append(self.collection.find_by("color", "orange"))
+
+        with mock.patch.object(HashIndex, "drop", autospec=True, side_effect=drop_and_query):
+            self.collection.create_index("color", workers=0)
+        self.assertEqual(seen[0], self.ids)
+        self.assertEqual(self.collection.find_by("color", "orange"), self.ids)
+
+        # only the files of the new index are left
+        name = self.collection.ls_indexes()["notes.color"]["name"]
+        self.assertNotEqual(name, "notes.color")
+        self.assertTrue(all(file.startswith(f"hash.{name}.")
+                            for file in base_ls_meta(self.name, "c") if file.startswith("hash.")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+"""
+test_large_object.py
+Created on 2026-10-19 5:10:00 AM
+By: Will Selke
+
+This file contains the tests of the large objects (see large_object.py): the chunks of a monode being overwritten must
+stay readable until the new monode is written, and be deleted once it is.
+"""
+import io
+import shutil
+import tempfile
+import unittest
+import uuid
+from unittest import mock
+
+import MoMem.config.config as cfg
+from MoMem.DB_COL.database import Database
+from MoMem.MoNode import monode_pickle
+from MoMem.MoNode.large_object import LargeObject
+from MoMem.MoNode.monode_basic import file_to_monode
+from MoMem.storage import wal
+from MoMem.storage.backend import get_backend
+from MoMem.storage.engine import get_engine
+
+OLD = b"old data " * 1000
+NEW = b"new data " * 2000
+
+
+class TestLargeObject(unittest.TestCase):
+    def setUp(self):
+        self.root_dir = cfg.ROOT_DIR
+        cfg.ROOT_DIR = tempfile.mkdtemp()
+        # every test has its own database as the engines and caches are kept per process
+        self.name = f"db_{uuid.uuid4().hex}"
+        self.collection = Database.create_database(self.name).create_collection("c")
+        self.id = self.collection.save_monode(file_to_monode("big.txt", io.BytesIO(OLD)))
+
+    def tearDown(self):
+        wal.close_wal(self.name)
+        shutil.rmtree(cfg.ROOT_DIR, ignore_errors=True)
+        cfg.ROOT_DIR = self.root_dir
+
+    def chunk_keys(self):
+        """
+        the keys of the chunks stored for the monode
+        """
+        path = f"{self.name}/c/chunks/{self.id}"
+        return sorted(get_backend().listdir(path)) if get_backend().exists(path) else []
+
+    def test_keyed_round_trip(self):
+        monode = file_to_monode("big.txt", b"")
+        monode.data = LargeObject(4, 3, 10, "0a1b2c")
+        for version in (1, 2):
+            with self.subTest(version=version):
+                self.assertEqual(monode_pickle.load(monode_pickle.dump(monode, version)).data, monode.data)
+
+    def test_overwrite(self):
+        key = self.chunk_keys()
+        self.collection.save_monode(file_to_monode("big.txt", io.BytesIO(NEW)), self.id, overwrite=True)
+        with self.collection.open_data(self.id) as data:
+            self.assertEqual(data.read(), NEW)
+        # only the chunks of the new monode are left
+        self.assertEqual(len(self.chunk_keys()), 1)
+        self.assertNotEqual(self.chunk_keys(), key)
+
+        self.collection.save_monode(file_to_monode("small.txt", b"small"), self.id, overwrite=True)
+        self.assertEqual(self.chunk_keys(), [])
+
+    def test_failed_overwrite_keeps_old_chunks(self):
+        key = self.chunk_keys()
+        engine = get_engine(self.name, "c")
+        with mock.patch.object(engine, "write", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                self.collection.save_monode(file_to_monode("big.txt", io.BytesIO(NEW)), self.id, overwrite=True)
+
+        # the monode still references its old chunks, the new ones are cleaned up
+        self.assertEqual(self.chunk_keys(), key)
+        with self.collection.open_data(self.id) as data:
+            self.assertEqual(data.read(), OLD)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+"""
+test_monode_format.py
+Created on 2026-10-19 4:40:00 AM
+By: Will Selke
+
+This file contains the round-trip tests of the MoNode formats (see monode_pickle.py and monode_pickle_v2.py): a MoNode
+written in one version and read back or converted to the other must not change, and the files written in version 1
+must still be read once version 2 is the default.
+"""
+import shutil
+import tempfile
+import unittest
+import uuid
+from datetime import datetime
+
+import MoMem.config.config as cfg
+from MoMem.DB_COL.database import Database
+from MoMem.MoNode import monode_pickle, monode_pickle_v2
+from MoMem.MoNode.monode_basic import file_to_monode
+from MoMem.storage import wal
+from MoMem.storage.engine import get_engine
+
+# notes nesting every container with keys which are not strings
+NOTES = {
+    "color": "orange",
+    "nested": {"list": [1, 2.5, "three", [4, {"deep": b"bytes"}]], "when": datetime(2020, 1, 2, 3, 4, 5)},
+    3: "int key",
+    1.5: {"float key": 7},
+}
+
+
+def make_monode(i=0):
+    """
+    a MoNode using every type of field
+    """
+    return file_to_monode(f"file{i}.txt", b"data %d" % i * 50, "a description", note=dict(NOTES, index=i),
+                          tags=["toffu", f"tag{i}"], modi=datetime(2021, 6, 7, 8, 9, 10))
+
+
+def fields_of(monode):
+    """
+    the fields of a MoNode (MoNode has no __eq__)
+    """
+    return {field: getattr(monode, field) for field in monode_pickle.MONODE_FIELDS}
+
+
+class TestRoundTrip(unittest.TestCase):
+    def test_each_version(self):
+        monode = make_monode()
+        for version in (1, 2):
+            with self.subTest(version=version):
+                data = monode_pickle.dump(monode, version)
+                self.assertEqual(monode_pickle.format_version(data), version)
+                self.assertEqual(fields_of(monode_pickle.load(data)), fields_of(monode))
+
+    def test_v1_to_v2_and_back(self):
+        monode = make_monode()
+        v1 = monode_pickle.dump(monode, 1)
+        v2 = monode_pickle.dump(monode_pickle.load(v1), 2)
+        self.assertEqual(v2, monode_pickle.dump(monode, 2))
+        self.assertEqual(monode_pickle.dump(monode_pickle.load(v2), 1), v1)
+
+    def test_partial_reads(self):
+        monode = make_monode()
+        for version in (1, 2):
+            with self.subTest(version=version):
+                data = monode_pickle.dump(monode, version)
+                fields = monode_pickle.load_fields(lambda offset, length: data[offset:offset + length],
+                                                   ["name", "notes.nested", "tags"])
+                self.assertEqual(fields, {"name": monode.name, "notes": {"nested": NOTES["nested"]},
+                                          "tags": monode.tags})
+                self.assertEqual(monode_pickle.get_note(data, 1.5), NOTES[1.5])
+                self.assertEqual(monode_pickle.get_note(data, 3), "int key")
+
+    def test_varint_boundaries(self):
+        for value in (0, 1, 127, 128, 16383, 16384, 2 ** 63 - 1):
+            with self.subTest(value=value):
+                encoded = monode_pickle_v2.varint(value)
+                self.assertEqual(len(encoded), monode_pickle_v2.varint_size(value))
+                self.assertEqual(monode_pickle_v2.read_varint(encoded, 0), (value, len(encoded)))
+
+        # elements whose lengths need one more byte of varint, negative ints and a double float
+        monode = file_to_monode("file.txt", b"x" * 16384, "d" * 127, note={"s": "s" * 128, "neg": -(2 ** 40),
+                                                                           "float": 0.1},
+                                tags=["t" * 16383, "t" * 16384])
+        self.assertEqual(fields_of(monode_pickle.load(monode_pickle.dump(monode, 2))), fields_of(monode))
+
+    def test_v2_headers_are_smaller(self):
+        monode = file_to_monode("file.txt", b"data", note={f"k{i}": i for i in range(20)},
+                                tags=[f"tag{i}" for i in range(50)])
+        self.assertLess(len(monode_pickle.dump(monode, 2)), len(monode_pickle.dump(monode, 1)) // 2)
+
+
+class TestCollectionFormat(unittest.TestCase):
+    def setUp(self):
+        self.root_dir = cfg.ROOT_DIR
+        cfg.ROOT_DIR = tempfile.mkdtemp()
+        # every test has its own database as the engines and caches are kept per process
+        self.name = f"db_{uuid.uuid4().hex}"
+        self.database = Database.create_database(self.name)
+
+    def tearDown(self):
+        wal.close_wal(self.name)
+        shutil.rmtree(cfg.ROOT_DIR, ignore_errors=True)
+        cfg.ROOT_DIR = self.root_dir
+
+    def test_read_v1_after_v2_default(self):
+        self.assertEqual(monode_pickle.VERSION, 2)
+        for engine in ("files", "segments"):
+            with self.subTest(engine=engine):
+                collection = self.database.create_collection(f"c_{engine}", engine=engine)
+                monodes = [make_monode(i) for i in range(5)]
+                ids = [collection.save_monode(monode) for monode in monodes]
+
+                # the files of a collection written before version 2
+                self.assertEqual(collection.convert_format(1), len(ids))
+                storage = get_engine(self.name, collection.name)
+                self.assertTrue(all(monode_pickle.format_version(storage.read(id, check=False)) == 1 for id in ids))
+
+                for id, monode in zip(ids, monodes):
+                    self.assertEqual(fields_of(collection.get_monode(id)), fields_of(monode))
+                    self.assertEqual(collection.get_monode(id, fields=["notes.color", "size"]),
+                                     {"notes": {"color": "orange"}, "size": monode.size})
+                self.assertEqual(sorted(doc["id"] for doc in collection.find({"notes.index": 3})), [ids[3]])
+
+                # a v1 monode saved again is written in the default version
+                collection.save_monode(monodes[0], ids[0], overwrite=True)
+                self.assertEqual(monode_pickle.format_version(storage.read(ids[0], check=False)), 2)
+                self.assertEqual(collection.convert_format(), len(ids) - 1)
+                for id, monode in zip(ids, monodes):
+                    self.assertEqual(fields_of(collection.get_monode(id)), fields_of(monode))
+
+
+if __name__ == "__main__":
+    unittest.main()
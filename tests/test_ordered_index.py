@@ -0,0 +1,80 @@
+"""
+test_ordered_index.py
+Created on 2026-10-19 5:30:00 AM
+By: Will Selke
+
+This file contains the tests of the ordered index (see ordered_index.py): a field holding values of mixed types is
+sorted by index.order_key when the index is built, when its log is merged and when a range is read.
+"""
+import shutil
+import tempfile
+import unittest
+import uuid
+from datetime import datetime
+from unittest import mock
+
+import MoMem.config.config as cfg
+from MoMem.DB_COL.database import Database
+from MoMem.MoNode.monode_basic import file_to_monode
+from MoMem.index import ordered_index
+from MoMem.storage import wal
+
+# values of mixed types, in the order of the index
+VALUES = [-1, 2.5, 3, "a", "b", b"bytes", datetime(2020, 1, 2), [1, "x"], {"k": 1}]
+
+
+class TestOrderedIndex(unittest.TestCase):
+    def setUp(self):
+        self.root_dir = cfg.ROOT_DIR
+        cfg.ROOT_DIR = tempfile.mkdtemp()
+        # every test has its own database as the engines and caches are kept per process
+        self.name = f"db_{uuid.uuid4().hex}"
+        self.collection = Database.create_database(self.name).create_collection("c")
+
+    def tearDown(self):
+        wal.close_wal(self.name)
+        shutil.rmtree(cfg.ROOT_DIR, ignore_errors=True)
+        cfg.ROOT_DIR = self.root_dir
+
+    def save(self, values):
+        """
+        save a monode per value (in reverse so the ids are not in the order of the values)
+        :return: the ids in the order of the values
+        """
+        results = self.collection.save_many([file_to_monode(f"file{i}.txt", b"data", note={"v": value})
+                                             for i, value in reversed(list(enumerate(values)))])
+        for result in results:
+            self.assertIsNone(result.error)
+        return [result.id for result in reversed(results)]
+
+    def check(self, ids):
+        """
+        check the order of the index and the ranges of every type
+        """
+        self.assertEqual(self.collection.range("v"), ids)
+        self.assertEqual(self.collection.range("v", reverse=True), ids[::-1])
+        self.assertEqual(self.collection.range("v", lo=2), ids[1:3])
+        self.assertEqual(self.collection.range("v", hi=2), ids[:1])
+        self.assertEqual(self.collection.range("v", lo="a", hi="z"), ids[3:5])
+        self.assertEqual(self.collection.range("v", lo=datetime(2019, 1, 1)), ids[6:7])
+        self.assertEqual(self.collection.range("v", lo=1, hi="z"), [])
+
+    def test_build(self):
+        ids = self.save(VALUES)
+        self.collection.create_index("v", "ordered", workers=0)
+        self.check(ids)
+
+    def test_log(self):
+        self.collection.create_index("v", "ordered", workers=0)
+        self.check(self.save(VALUES))
+
+    def test_merge(self):
+        self.collection.create_index("v", "ordered", workers=0)
+        with mock.patch.object(ordered_index, "LOG_MERGE", 1):
+            ids = self.save(VALUES[:4])
+            ids += self.save(VALUES[4:])
+        self.check(ids)
+
+
+if __name__ == "__main__":
+    unittest.main()
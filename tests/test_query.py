@@ -0,0 +1,74 @@
+"""
+test_query.py
+Created on 2026-10-19 5:40:00 AM
+By: Will Selke
+
+This file contains the tests of the query engine (see query.py): every plan returns the documents a scan returns, in
+the same form.
+"""
+import shutil
+import tempfile
+import unittest
+import uuid
+
+import MoMem.config.config as cfg
+from MoMem.DB_COL.database import Database
+from MoMem.MoNode.monode_basic import file_to_monode
+from MoMem.storage import wal
+
+
+class TestQuery(unittest.TestCase):
+    def setUp(self):
+        self.root_dir = cfg.ROOT_DIR
+        cfg.ROOT_DIR = tempfile.mkdtemp()
+        # every test has its own database as the engines and caches are kept per process
+        self.name = f"db_{uuid.uuid4().hex}"
+        self.collection = Database.create_database(self.name).create_collection("c")
+        # the sizes are 10, 20, ... 50, the weight is a number or a string
+        self.ids = [self.collection.save_monode(file_to_monode(f"file{i}.txt", b"x" * 10 * i,
+                                                               note={"color": "orange" if i % 2 else "blue",
+                                                                     "weight": i if i < 4 else f"w{i}"}))
+                    for i in range(1, 6)]
+
+    def tearDown(self):
+        wal.close_wal(self.name)
+        shutil.rmtree(cfg.ROOT_DIR, ignore_errors=True)
+        cfg.ROOT_DIR = self.root_dir
+
+    def find(self, filter, projection=None, sort=None, limit=None):
+        """
+        run a query with the indexes and with none, the results must be the same
+        :return: the results
+        """
+        indexes = {"notes.color": "hash", "notes.weight": "ordered", "size": "ordered"}
+        for field in set(indexes) & set(self.collection.ls_indexes()):
+            self.collection.drop_index(field)
+        self.assertEqual(self.collection.explain(filter, sort, limit)["plan"], "scan")
+        scan = self.collection.find(filter, projection, sort, limit)
+
+        for field, type in indexes.items():
+            self.collection.create_index(field, type, workers=0)
+        self.assertNotEqual(self.collection.explain(filter, sort, limit)["plan"], "scan")
+        indexed = self.collection.find(filter, projection, sort, limit)
+        self.assertEqual(indexed if sort else sorted(indexed, key=lambda doc: doc["id"]),
+                         scan if sort else sorted(scan, key=lambda doc: doc["id"]))
+        return scan
+
+    def test_dotted_projection(self):
+        results = self.find({"color": "orange"}, ["name", "notes.color"], sort="size")
+        self.assertEqual(results, [{"id": self.ids[i], "name": f"file{i + 1}.txt", "notes": {"color": "orange"}}
+                                   for i in (0, 2, 4)])
+
+    def test_bound_of_another_type(self):
+        self.assertEqual(self.find({"size": {"$gte": "a"}}), [])
+        self.assertEqual(self.find({"weight": {"$gte": 2}}, ["name"]),
+                         [{"id": self.ids[i], "name": f"file{i + 1}.txt"} for i in sorted((1, 2),
+                                                                                          key=lambda i: self.ids[i])])
+
+    def test_sort_mixed_types(self):
+        results = self.find({"size": {"$gte": 0}}, ["notes.weight"], sort="weight")
+        self.assertEqual([doc["notes"]["weight"] for doc in results], [1, 2, 3, "w4", "w5"])
+
+
+if __name__ == "__main__":
+    unittest.main()
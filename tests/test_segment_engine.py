@@ -0,0 +1,159 @@
+"""
+test_segment_engine.py
+Created on 2026-10-19 4:55:00 AM
+By: Will Selke
+
+This file contains the tests of the segment engine (see segment_engine.py): a torn record is cut off by the process
+owning the segments only, the other processes follow its writes, and a compaction flushes its copies before deleting a
+segment.
+"""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+import uuid
+from unittest import mock
+
+import MoMem.config.config as cfg
+from MoMem.DB_COL.database import Database
+from MoMem.storage import segment_engine, wal
+from MoMem.storage.backend import DiskHandle, get_backend
+from MoMem.storage.engine import close_engine
+from MoMem.storage.segment_engine import SegmentEngine
+
+# the repository, so the child process imports this MoMem
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# saves count monodes without the write-ahead log and exits without closing anything, prints the ids
+CRASH = """
+import json, os, sys
+import MoMem.config.config as cfg
+cfg.ROOT_DIR = sys.argv[1]
+from MoMem.DB_COL.database import Database
+from MoMem.MoNode.monode_basic import file_to_monode
+database = Database.get_database(sys.argv[2])
+database.set_durability("none")
+collection = database.get_collection(sys.argv[3])
+ids = [collection.save_monode(file_to_monode(f"file{i}.txt", b"data %d" % i * 100, note={"i": i}))
+       for i in range(int(sys.argv[4]))]
+print(json.dumps(ids))
+sys.stdout.flush()
+os._exit(0)
+"""
+
+
+class TestSegmentEngine(unittest.TestCase):
+    def setUp(self):
+        self.root_dir = cfg.ROOT_DIR
+        cfg.ROOT_DIR = tempfile.mkdtemp()
+        # every test has its own database as the engines and logs are kept per process
+        self.name = f"db_{uuid.uuid4().hex}"
+        Database.create_database(self.name).create_collection("c", engine="segments")
+        # the engines of the tests own the segments
+        close_engine(self.name, "c")
+        self.segment = f"{self.name}/c/segments/{0:08d}.seg"
+
+    def tearDown(self):
+        close_engine(self.name, "c")
+        wal.close_wal(self.name)
+        shutil.rmtree(cfg.ROOT_DIR, ignore_errors=True)
+        cfg.ROOT_DIR = self.root_dir
+
+    def test_replay_after_truncation(self):
+        wal.close_wal(self.name)
+        output = subprocess.run([sys.executable, "-c", CRASH, cfg.ROOT_DIR, self.name, "c", "3"], cwd=REPO,
+                                capture_output=True, check=True, text=True).stdout
+        ids = json.loads(output)
+        backend = get_backend()
+        size = backend.size(self.segment)
+        backend.truncate(self.segment, size - 5)
+
+        # the torn record is cut off, the others are replayed from the segment
+        collection = Database.get_database(self.name).get_collection("c")
+        self.assertEqual(sorted(collection.ls_documents()), sorted(ids[:-1]))
+        self.assertLess(backend.size(self.segment), size - 5)
+        for i, id in enumerate(ids[:-1]):
+            self.assertEqual(collection.get_monode(id).notes, {"i": i})
+
+        # the log goes on after the last whole record
+        id = collection.save_monode(collection.get_monode(ids[0]))
+        self.assertEqual(collection.get_monode(id).data, b"data 0" * 100)
+        self.assertEqual(len(collection.ls_documents()), len(ids))
+
+    def test_only_the_owner_cuts_off(self):
+        owner = SegmentEngine(self.name, "c")
+        owner.write("a", b"first")
+        owner.sync()
+        # a record the owner is still appending looks torn
+        get_backend().append(self.segment, b"sg torn")
+        size = get_backend().size(self.segment)
+
+        reader = SegmentEngine(self.name, "c")
+        try:
+            self.assertFalse(owner.readonly)
+            self.assertTrue(reader.readonly)
+            self.assertEqual(get_backend().size(self.segment), size)
+            self.assertEqual(reader.list(), ["a"])
+            self.assertRaises(PermissionError, reader.write, "b", b"second")
+        finally:
+            reader.close()
+            owner.close()
+
+        # the next owner cuts it off
+        SegmentEngine(self.name, "c").close()
+        self.assertLess(get_backend().size(self.segment), size)
+
+    def test_reader_follows_the_owner(self):
+        owner = SegmentEngine(self.name, "c", segment_size=64)
+        reader = SegmentEngine(self.name, "c")
+        try:
+            owner.write("a", b"first" * 20)
+            owner.write("b", b"second" * 20)
+            self.assertEqual(sorted(reader.list()), ["a", "b"])
+            self.assertEqual(reader.read("b"), b"second" * 20)
+
+            # the segment of "a" is compacted away after the reader opened it
+            owner.write("a", b"third" * 20, overwrite=True)
+            self.assertEqual(owner.compact(0), 2)
+            self.assertEqual(reader.read("a"), b"third" * 20)
+            owner.delete("b")
+            self.assertFalse(reader.exists("b"))
+            self.assertEqual(reader.count(), 1)
+        finally:
+            reader.close()
+            owner.close()
+
+    def test_compaction_flushes_before_deleting(self):
+        calls = []
+        sync = DiskHandle.sync
+        delete = segment_engine.base_del_segment
+
+        def record_sync(handle):
+            calls.append("sync")
+            sync(handle)
+
+        def record_delete(*args):
+            calls.append("delete")
+            delete(*args)
+
+        engine = SegmentEngine(self.name, "c", segment_size=64)
+        try:
+            engine.write("a", b"first" * 20)
+            engine.write("b", b"second" * 20)
+            engine.write("a", b"third" * 20, overwrite=True)
+            with mock.patch.object(DiskHandle, "sync", autospec=True, side_effect=record_sync), \
+                    mock.patch.object(segment_engine, "base_del_segment", side_effect=record_delete):
+                self.assertEqual(engine.compact(0), 2)
+            # a full segment is also flushed when the copies go on in a new one
+            self.assertEqual(calls.count("delete"), 2)
+            self.assertTrue(all(calls[i - 1] == "sync" for i, call in enumerate(calls) if call == "delete"))
+            self.assertEqual(engine.read("a"), b"third" * 20)
+        finally:
+            engine.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
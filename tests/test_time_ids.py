@@ -0,0 +1,79 @@
+"""
+test_time_ids.py
+Created on 2026-10-19 5:15:00 AM
+By: Will Selke
+
+This file contains the tests of the time ids (see monode_id.py): the files engine follows the journal of the time ids
+written by the other engines of the collection, and the functions of monode_basic.py save through the collection.
+"""
+import shutil
+import tempfile
+import unittest
+import uuid
+
+import MoMem.config.config as cfg
+from MoMem.DB_COL.database import Database
+from MoMem.MoNode.monode_basic import file_to_monode, save_as_monode, read_monode
+from MoMem.basic_file_op import base_del_meta
+from MoMem.storage import wal
+from MoMem.storage.file_engine import FileEngine, TIME_IDS, TIME_IDS_GENERATION
+
+
+class TestTimeIds(unittest.TestCase):
+    def setUp(self):
+        self.root_dir = cfg.ROOT_DIR
+        cfg.ROOT_DIR = tempfile.mkdtemp()
+        # every test has its own database as the engines and caches are kept per process
+        self.name = f"db_{uuid.uuid4().hex}"
+        self.collection = Database.create_database(self.name).create_collection("c")
+        self.collection.set_id_scheme("time")
+
+    def tearDown(self):
+        wal.close_wal(self.name)
+        shutil.rmtree(cfg.ROOT_DIR, ignore_errors=True)
+        cfg.ROOT_DIR = self.root_dir
+
+    def save(self, count):
+        """
+        :return: the ids of count new monodes
+        """
+        return [self.collection.save_monode(file_to_monode(f"file{i}.txt", b"data")) for i in range(count)]
+
+    def test_other_engine_follows_the_journal(self):
+        ids = self.save(3)
+        # another engine of the collection, like the one of another process
+        other = FileEngine(self.name, "c")
+        self.assertEqual(other.time_ids(), ids)
+
+        ids += self.save(2)
+        self.collection.del_monode(ids[1])
+        self.assertEqual(other.time_ids(), ids[:1] + ids[2:])
+        self.assertEqual(other.time_ids(ids[2], ids[4]), ids[2:4])
+        self.assertEqual(self.collection.scan_ids(reverse=True, limit=2), ids[:2:-1])
+
+    def test_journal_written_again(self):
+        ids = self.save(3)
+        other = FileEngine(self.name, "c")
+        self.assertEqual(other.time_ids(), ids)
+
+        # a collection saved before the journal, the folders are listed once
+        base_del_meta(TIME_IDS, self.name, "c")
+        base_del_meta(TIME_IDS_GENERATION, self.name, "c")
+        self.collection.del_monode(ids[0])
+        self.assertEqual(other.time_ids(), ids[1:])
+
+        # compact drops the deleted ids, the engines read the new journal from its start
+        self.collection.compact()
+        ids += self.save(1)
+        self.assertEqual(other.time_ids(), ids[1:])
+
+    def test_monode_basic_saves_through_the_collection(self):
+        id = save_as_monode("file.txt", b"data", self.name, "c", note={"color": "orange"})
+        self.assertEqual(self.collection.scan_ids(), [id])
+        self.assertEqual(self.collection.stats()["count"], 1)
+        self.assertEqual(read_monode(id[:-len(cfg.MONODE_EXTENSION)], self.name, "c").notes, {"color": "orange"})
+        self.assertRaises(FileNotFoundError, read_monode, id, self.name, "missing")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,169 @@
+"""
+test_wal.py
+Created on 2026-10-19 4:55:00 AM
+By: Will Selke
+
+This file contains the tests of the write-ahead log (see wal.py): the writes are made by a child process which exits
+without closing its databases (like a crash) or normally, the end of its log or of its last segment is cut off and the
+database is opened again, or the log is shared with this process.
+"""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+import uuid
+
+import MoMem.config.config as cfg
+from MoMem.DB_COL.database import Database
+from MoMem.MoNode.monode_basic import file_to_monode
+from MoMem.storage import wal
+from MoMem.storage.backend import get_backend
+from MoMem.storage.engine import close_engine
+
+# the repository, so the child process imports this MoMem
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# saves count monodes, prints the ids and exits without closing anything if asked (a crash)
+WRITE = """
+import json, os, sys
+import MoMem.config.config as cfg
+cfg.ROOT_DIR = sys.argv[1]
+from MoMem.DB_COL.database import Database
+from MoMem.MoNode.monode_basic import file_to_monode
+database = Database.get_database(sys.argv[2])
+database.set_durability(sys.argv[4])
+collection = database.get_collection(sys.argv[3])
+ids = [collection.save_monode(file_to_monode(f"file{i}.txt", b"data %d" % i * 100, note={"i": i}))
+       for i in range(int(sys.argv[5]))]
+print(json.dumps(ids))
+sys.stdout.flush()
+if sys.argv[6] == "crash":
+    os._exit(0)
+"""
+
+
+class TestWal(unittest.TestCase):
+    def setUp(self):
+        self.root_dir = cfg.ROOT_DIR
+        cfg.ROOT_DIR = tempfile.mkdtemp()
+        # every test has its own database as the engines and logs are kept per process
+        self.name = f"db_{uuid.uuid4().hex}"
+        self.log = f"{self.name}/{cfg.WAL_FILE}"
+
+    def tearDown(self):
+        wal.close_wal(self.name)
+        shutil.rmtree(cfg.ROOT_DIR, ignore_errors=True)
+        cfg.ROOT_DIR = self.root_dir
+
+    def create(self, engine="files"):
+        """
+        create the collection "c", the engine must be opened again to see the writes of the children
+        """
+        Database.create_database(self.name).create_collection("c", engine=engine)
+        close_engine(self.name, "c")
+
+    def write(self, durability, count=3, crash=True):
+        """
+        let a child process save count monodes in the collection "c"
+        :return: the ids
+        """
+        output = subprocess.run([sys.executable, "-c", WRITE, cfg.ROOT_DIR, self.name, "c", durability, str(count),
+                                 "crash" if crash else "exit"], cwd=REPO, capture_output=True, check=True,
+                                text=True).stdout
+        return json.loads(output)
+
+    @staticmethod
+    def cut(path, length):
+        """
+        cut length bytes off the end of a file
+        """
+        backend = get_backend()
+        backend.truncate(path, backend.size(path) - length)
+
+    def test_torn_wal_tail(self):
+        self.create()
+        wal.close_wal(self.name)
+        ids = self.write("strict")
+        self.cut(self.log, 5)
+
+        log = wal.get_wal(self.name)
+        self.assertFalse(log.recovered)
+        records = log.records()
+        self.assertEqual([(op, collection, id) for op, collection, id, _ in records],
+                         [(wal.PUT, "c", id) for id in ids[:-1]])
+
+        # the monodes applied before the crash are still there, the log is emptied by the recovery
+        collection = Database.get_database(self.name).get_collection("c")
+        self.assertTrue(log.recovered)
+        self.assertEqual(sorted(collection.ls_documents()), sorted(ids))
+        self.assertEqual(collection.get_monode(ids[0]).data, b"data 0" * 100)
+        wal.close_wal(self.name)
+        self.assertEqual(get_backend().read(self.log), wal.CLEAN_RECORD)
+
+    def test_torn_segment_replayed_from_wal(self):
+        self.create("segments")
+        wal.close_wal(self.name)
+        ids = self.write("strict")
+        self.cut(f"{self.name}/c/segments/{0:08d}.seg", 5)
+
+        # the torn monode is written again from its record in the write-ahead log
+        collection = Database.get_database(self.name).get_collection("c")
+        self.assertEqual(sorted(collection.ls_documents()), sorted(ids))
+        for i, id in enumerate(ids):
+            self.assertEqual(collection.get_monode(id).data, b"data %d" % i * 100)
+
+    def test_torn_record_between_records(self):
+        self.create()
+        log = wal.get_wal(self.name)
+        log.append(wal.PUT, "c", "a", [b"first"])
+        log.done()
+        # the header of a record torn by the crash of another process, then the records of this one go on
+        get_backend().append(self.log, wal.RECORD.pack(wal.MAGIC, wal.PUT, 1, 1, 100, 0) + b"cb" + b"torn")
+        log.append(wal.PUT, "c", "c", [b"second"])
+        log.done()
+        self.assertEqual(log.records(), [(wal.PUT, "c", "a", b"first"), (wal.PUT, "c", "c", b"second")])
+
+    def test_two_processes(self):
+        self.create()
+        database = Database.get_database(self.name)
+        database.set_durability("batched")
+        collection = database.get_collection("c")
+        ids = [collection.save_monode(file_to_monode(f"mine{i}.txt", b"mine")) for i in range(2)]
+
+        # the child writes with the log held by this process, its exit does not empty the records of this process
+        ids += self.write("batched", crash=False)
+        self.assertNotIn(get_backend().read(self.log), (b"", wal.CLEAN_RECORD))
+        self.assertEqual(sorted(collection.ls_documents()), sorted(ids))
+        self.assertEqual(collection.stats()["count"], len(ids))
+
+        # the last process leaves the log clean
+        database.close()
+        self.assertEqual(get_backend().read(self.log), wal.CLEAN_RECORD)
+
+    def test_crash_of_another_process(self):
+        self.create()
+        database = Database.get_database(self.name)
+        database.set_durability("batched")
+        database.get_collection("c").save_monode(file_to_monode("mine.txt", b"mine"))
+
+        # the records of the crashed child are kept by the checkpoints of this process, the next opening replays them
+        ids = self.write("strict")
+        wal.get_wal(self.name).checkpoint()
+        database.close()
+        log = wal.get_wal(self.name)
+        self.assertFalse(log.recovered)
+        self.assertEqual([id for op, collection, id, _ in log.records() if id in ids], ids)
+
+        close_engine(self.name, "c")
+        collection = Database.get_database(self.name).get_collection("c")
+        self.assertTrue(log.recovered)
+        self.assertEqual(len(collection.ls_documents()), len(ids) + 1)
+        wal.close_wal(self.name)
+        self.assertEqual(get_backend().read(self.log), wal.CLEAN_RECORD)
+
+
+if __name__ == "__main__":
+    unittest.main()